@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Reguły alertów definiowane w pliku konfiguracyjnym (JSON).
+
+Każda reguła jest raz kompilowana do predykatu działającego na tablicach wszystkich tickerów
+giełdy naraz (cena, poprzednie zamknięcie, otwarcie, wolumen sesji oraz cechy z historii
+dziennej), więc kolejne reguły nie dokładają pętli po tickerach. Cechy historyczne (SMA,
+średni wolumen, minimum/maksimum okresu) liczone są z zakończonych sesji - raz na sesję.
+
+Plik (ALERT_RULES_PATH, domyślnie data/alert_rules.json) - lista reguł albo {"rules": [...]}:
+
+    [
+      {"name": "Wzrost ≥ 8%", "type": "change_above", "value": 8},
+      {"name": "Przebicie SMA(50) w górę", "type": "cross_above_sma", "period": 50},
+      {"name": "Wolumen 3× średnia", "type": "volume_above_avg", "multiple": 3, "period": 20},
+      {"name": "Nowe 52-tyg. minimum", "type": "new_low", "period": 252, "priority": "czerwony"},
+      {"name": "Luka spadkowa ≥ 4%", "type": "gap_down", "value": 4, "markets": ["GPW"]}
+    ]
+
+Pola wspólne: name (nagłówek alertu i klucz deduplikacji), type, priority (czerwony / zolty /
+zielony / info; domyślnie zielony), markets i tickers (opcjonalne zawężenie reguły).
+"""
+import json
+import os
+import warnings
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from notifications import PRIORITY_RED, PRIORITY_YELLOW, PRIORITY_GREEN, PRIORITY_INFO
+
+ALERT_RULES_PATH = os.getenv("ALERT_RULES_PATH", os.path.join("data", "alert_rules.json"))
+
+RULE_PRIORITIES = {
+    "czerwony": PRIORITY_RED,
+    "zolty": PRIORITY_YELLOW,
+    "zielony": PRIORITY_GREEN,
+    "info": PRIORITY_INFO,
+}
+
+RULE_TYPES = {}
+
+
+def register_rule_type(name, build, params, history=None, describe=None):
+    """
+    Rejestruje typ reguły.
+
+    Args:
+        name: nazwa typu w pliku konfiguracyjnym (np. 'change_above')
+        build: funkcja (**params) -> predykat RuleInputs -> tablica bool (jedna wartość na ticker)
+        params: dict parametrów z wartościami domyślnymi (None = parametr wymagany)
+        history: funkcja params -> liczba zakończonych sesji potrzebnych regule (domyślnie 0)
+        describe: funkcja params -> opis warunku do wiadomości
+    """
+    RULE_TYPES[name] = {
+        'build': build,
+        'params': dict(params),
+        'history': history or (lambda p: 0),
+        'describe': describe or (lambda p: name),
+    }
+
+
+# ----------------------
+# DANE WEJŚCIOWE
+# ----------------------
+
+class SessionHistory:
+    """
+    Zakończone sesje (świece dzienne) tickerów giełdy i cechy z nich liczone.
+
+    Cechy są zapamiętywane, więc przy stałej historii (jedna sesja) każda liczona jest raz,
+    a kolejne cykle tylko porównują je z bieżącymi cenami.
+    """
+
+    def __init__(self, panel, tickers, session=None):
+        """
+        Args:
+            panel: OHLCVPanel ze świecami dziennymi
+            tickers: kolejność tickerów w tablicach wynikowych
+            session: data bieżącej sesji - świece od tej daty są pomijane (niezakończone)
+        """
+        index = panel.index
+        if index.tz is not None:
+            # świece dzienne - data sesji w czasie lokalnym giełdy
+            panel = type(panel)(panel.data, index.tz_localize(None), panel.symbols)
+        if session is not None:
+            panel = panel.before(pd.Timestamp(session))
+        self.tickers = list(tickers)
+        self.bars = len(panel)
+        rows = np.array([panel.symbol_index.get(t, -1) for t in self.tickers], dtype=int)
+        self.fields = {}
+        for field in ('High', 'Low', 'Close', 'Volume'):
+            values = np.full((len(self.tickers), self.bars), np.nan)
+            known = rows >= 0
+            values[known] = panel.field(field)[rows[known]]
+            self.fields[field] = values
+        self.features = {}
+
+    def feature(self, name, field, period, reduce):
+        """Redukcja (np. np.nanmean) pola po ostatnich `period` sesjach; NaN gdy historia jest krótsza."""
+        key = (name, period)
+        if key not in self.features:
+            if self.bars < period or period <= 0:
+                value = np.full(len(self.tickers), np.nan)
+            else:
+                window = self.fields[field][:, -period:]
+                with warnings.catch_warnings():
+                    # wiersze bez danych (same NaN) dają NaN - bez ostrzeżeń
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    value = reduce(window, axis=1)
+            self.features[key] = value
+        return self.features[key]
+
+    def sma(self, period):
+        return self.feature('sma', 'Close', period, np.nanmean)
+
+    def avg_volume(self, period):
+        return self.feature('avg_volume', 'Volume', period, np.nanmean)
+
+    def low(self, period):
+        return self.feature('low', 'Low', period, np.nanmin)
+
+    def high(self, period):
+        return self.feature('high', 'High', period, np.nanmax)
+
+
+class RuleInputs:
+    """Dane jednego cyklu dla wszystkich tickerów giełdy - tablice w kolejności `tickers`."""
+
+    def __init__(self, tickers, prev_close, price, open_price=None, volume=None, history=None):
+        n = len(tickers)
+        self.tickers = list(tickers)
+        self.prev_close = np.asarray(prev_close, dtype=float)
+        self.price = np.asarray(price, dtype=float)
+        self.open = np.full(n, np.nan) if open_price is None else np.asarray(open_price, dtype=float)
+        self.volume = np.full(n, np.nan) if volume is None else np.asarray(volume, dtype=float)
+        self.history = history
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # zmiana i luka w % względem wczorajszego zamknięcia
+            self.change = (self.price / self.prev_close - 1) * 100
+            self.gap = (self.open / self.prev_close - 1) * 100
+
+    def past(self, feature, *args):
+        """Cecha z historii sesji (NaN dla wszystkich, gdy historii brak)."""
+        if self.history is None:
+            return np.full(len(self.tickers), np.nan)
+        return getattr(self.history, feature)(*args)
+
+
+# ----------------------
+# TYPY REGUŁ
+# ----------------------
+
+register_rule_type(
+    'change_above', lambda value: lambda q: q.change >= value, {'value': None},
+    describe=lambda p: f"wzrost ≥ {p['value']}%")
+register_rule_type(
+    'change_below', lambda value: lambda q: q.change <= -value, {'value': None},
+    describe=lambda p: f"spadek ≥ {p['value']}%")
+register_rule_type(
+    'gap_up', lambda value: lambda q: q.gap >= value, {'value': None},
+    describe=lambda p: f"luka wzrostowa ≥ {p['value']}%")
+register_rule_type(
+    'gap_down', lambda value: lambda q: q.gap <= -value, {'value': None},
+    describe=lambda p: f"luka spadkowa ≥ {p['value']}%")
+register_rule_type(
+    'cross_above_sma',
+    lambda period: lambda q: (q.prev_close <= q.past('sma', period)) & (q.price > q.past('sma', period)),
+    {'period': 50}, history=lambda p: p['period'],
+    describe=lambda p: f"przebicie SMA({p['period']}) w górę")
+register_rule_type(
+    'cross_below_sma',
+    lambda period: lambda q: (q.prev_close >= q.past('sma', period)) & (q.price < q.past('sma', period)),
+    {'period': 50}, history=lambda p: p['period'],
+    describe=lambda p: f"przebicie SMA({p['period']}) w dół")
+register_rule_type(
+    'volume_above_avg',
+    lambda multiple, period: lambda q: q.volume > multiple * q.past('avg_volume', period),
+    {'multiple': None, 'period': 20}, history=lambda p: p['period'],
+    describe=lambda p: f"wolumen > {p['multiple']}× średnia {p['period']} sesji")
+register_rule_type(
+    'new_low', lambda period: lambda q: q.price < q.past('low', period),
+    {'period': 252}, history=lambda p: p['period'],
+    describe=lambda p: f"nowe minimum {p['period']} sesji")
+register_rule_type(
+    'new_high', lambda period: lambda q: q.price > q.past('high', period),
+    {'period': 252}, history=lambda p: p['period'],
+    describe=lambda p: f"nowe maksimum {p['period']} sesji")
+
+
+# ----------------------
+# KOMPILACJA I OCENA
+# ----------------------
+
+@dataclass(slots=True)
+class AlertRule:
+    name: str
+    type: str
+    description: str
+    priority: int
+    predicate: object
+    history_bars: int
+    markets: frozenset = None
+    tickers: frozenset = None
+    # maski tickerów per lista tickerów giełdy - liczone raz, a nie w każdym cyklu
+    masks: dict = field(default_factory=dict, repr=False, compare=False)
+
+    @property
+    def code(self):
+        """Kod alertu w AlertStore (deduplikacja per ticker i sesja)."""
+        return f"rule:{self.name}"
+
+    def applies(self, tickers, market=None):
+        """Maska tickerów, których dotyczy reguła."""
+        if self.markets is not None and market not in self.markets:
+            return np.zeros(len(tickers), dtype=bool)
+        if self.tickers is None:
+            return np.ones(len(tickers), dtype=bool)
+        key = tuple(tickers)
+        mask = self.masks.get(key)
+        if mask is None:
+            mask = self.masks[key] = np.isin(np.asarray(key, dtype=object), list(self.tickers))
+        return mask
+
+
+def compile_rule(spec):
+    """Sprawdza definicję reguły z pliku i buduje jej predykat."""
+    if 'type' not in spec or spec['type'] not in RULE_TYPES:
+        raise ValueError(f"Nieznany typ reguły: {spec.get('type')!r} (dostępne: {', '.join(RULE_TYPES)})")
+    rule_type = RULE_TYPES[spec['type']]
+    common = {'name', 'type', 'priority', 'markets', 'tickers'}
+    unknown = set(spec) - common - set(rule_type['params'])
+    if unknown:
+        raise ValueError(f"Reguła {spec.get('name', spec['type'])!r}: nieznane pola {sorted(unknown)}")
+
+    params = {key: spec.get(key, default) for key, default in rule_type['params'].items()}
+    missing = [key for key, value in params.items() if value is None]
+    if missing:
+        raise ValueError(f"Reguła {spec.get('name', spec['type'])!r}: brak wymaganych pól {missing}")
+    priority = spec.get('priority', 'zielony')
+    if priority not in RULE_PRIORITIES:
+        raise ValueError(f"Reguła {spec.get('name', spec['type'])!r}: nieznany priorytet {priority!r}")
+
+    description = rule_type['describe'](params)
+    return AlertRule(
+        name=spec.get('name', description),
+        type=spec['type'],
+        description=description,
+        priority=RULE_PRIORITIES[priority],
+        predicate=rule_type['build'](**params),
+        history_bars=int(rule_type['history'](params)),
+        markets=frozenset(spec['markets']) if 'markets' in spec else None,
+        tickers=frozenset(spec['tickers']) if 'tickers' in spec else None,
+    )
+
+
+class RuleSet:
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        names = [rule.name for rule in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError("Nazwy reguł muszą być unikalne (są kluczem deduplikacji alertów)")
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    @property
+    def history_bars(self):
+        """Ile zakończonych sesji historii potrzebują reguły (0 - wystarczą bieżące notowania)."""
+        return max((rule.history_bars for rule in self.rules), default=0)
+
+    def matrix(self, inputs, market=None):
+        """Macierz bool (reguły, tickery) - każda reguła liczona jednym wywołaniem dla całej giełdy."""
+        out = np.zeros((len(self.rules), len(inputs.tickers)), dtype=bool)
+        for r, rule in enumerate(self.rules):
+            mask = rule.applies(inputs.tickers, market)
+            if mask.any():
+                # porównania z NaN (brak danych) dają False
+                with np.errstate(invalid='ignore'):
+                    out[r] = rule.predicate(inputs) & mask
+        return out
+
+    def evaluate(self, inputs, market=None):
+        """Lista (reguła, indeksy tickerów spełniających regułę) - tylko reguły z trafieniami."""
+        hits = self.matrix(inputs, market)
+        return [(rule, np.flatnonzero(hits[r])) for r, rule in enumerate(self.rules) if hits[r].any()]
+
+
+def compile_rules(specs):
+    if isinstance(specs, dict):
+        specs = specs.get('rules', [])
+    return RuleSet(compile_rule(spec) for spec in specs)
+
+
+def load_rules(path=ALERT_RULES_PATH):
+    """Reguły z pliku JSON; brak pliku - pusty zestaw (tylko alerty spadkowe)."""
+    if not path or not os.path.exists(path):
+        return RuleSet()
+    with open(path, encoding="utf-8") as f:
+        try:
+            specs = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Błędny plik reguł {path}: {e}") from e
+    return compile_rules(specs)
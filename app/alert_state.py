@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Stan alertów per ticker: histereza i czas wyciszenia (cooldown).
+
+Sama deduplikacja (jeden alert danego koloru na sesję) nie pozwala ponowić alertu, gdy kurs
+odbije i spadnie ponownie, a sygnały wskaźników wysyłane są przy każdej zmianie oceny - także
+gdy ocena skacze tam i z powrotem. Tu stan wszystkich tickerów giełdy trzymany jest w tablicach
+i aktualizowany jednym przebiegiem na cykl:
+
+- LevelHysteresis (alerty progowe, np. spadek): poziom włącza się po przekroczeniu progu, a
+  wyłącza dopiero, gdy wartość zejdzie o `hysteresis` punktów poniżej progu. Wyższy poziom
+  zgłaszany jest od razu; ten sam lub niższy - ponownie dopiero po wyłączeniu i po `cooldown`.
+- SignalDebouncer (oceny wskaźników): nowa ocena zgłaszana jest, gdy utrzyma się przez
+  `confirm` kolejnych sprawdzeń i od poprzedniego alertu tickera minął `cooldown`.
+
+Kolejne zgłoszenia tego samego kodu w sesji dostają numer (episode_code), więc trwały magazyn
+alertów (AlertStore) nadal blokuje powtórkę po restarcie, a nie blokuje ponownego alertu.
+Po restarcie stan odtwarzany jest z alertów zapisanych w sesji (restore): liczniki epizodów,
+ostatni zgłoszony poziom/ocena i czas - kolejny epizod dostaje nowy numer, a nie numer już zapisany.
+"""
+import os
+import time
+
+import numpy as np
+
+from drop_alerts import DROP_THRESHOLDS, NO_ALERT, RED, drop_alert_levels
+
+# Histereza progów w punktach procentowych i wyciszenie ponownego alertu (sekundy)
+ALERT_HYSTERESIS = float(os.getenv("ALERT_HYSTERESIS", "1.0"))
+ALERT_COOLDOWN = float(os.getenv("ALERT_COOLDOWN", str(30 * 60)))
+# Ile kolejnych sprawdzeń musi utrzymać się nowa ocena wskaźników i wyciszenie między alertami
+SIGNAL_CONFIRM_CYCLES = int(os.getenv("SIGNAL_CONFIRM_CYCLES", "2"))
+SIGNAL_COOLDOWN = float(os.getenv("SIGNAL_COOLDOWN", str(60 * 60)))
+
+
+def episode_code(code, episode):
+    """Kod alertu w AlertStore - pierwszy raz bez numeru (jak dotąd), kolejne z numerem."""
+    return code if episode <= 1 else f"{code} #{episode}"
+
+
+def split_episode(code):
+    """Odwrotność episode_code: 'KOD #3' -> ('KOD', 3), 'KOD' -> ('KOD', 1)."""
+    base, sep, number = code.rpartition(" #")
+    if sep and number.isdigit():
+        return base, int(number)
+    return code, 1
+
+
+def stored_episodes(alerts, names):
+    """
+    Zapisane alerty jednego tickera ({kod: czas}) przypisane do stanów.
+
+    Args:
+        names: {stan (poziom / ocena): kod bez numeru}
+
+    Returns:
+        ({stan: najwyższy epizod}, ostatnio zgłoszony stan albo None, czas ostatniego alertu)
+    """
+    lookup = {name: key for key, name in names.items()}
+    episodes, last, last_time = {}, None, -np.inf
+    for code, sent_at in alerts.items():
+        base, episode = split_episode(code)
+        key = lookup.get(base)
+        if key is None:
+            continue
+        episodes[key] = max(episodes.get(key, 0), episode)
+        if sent_at > last_time:
+            last, last_time = key, sent_at
+    return episodes, last, last_time
+
+
+class LevelHysteresis:
+    """Poziomy alertów (NO_ALERT..RED) z histerezą i wyciszeniem - stan w tablicach per ticker."""
+
+    def __init__(self, n, thresholds=None, hysteresis=ALERT_HYSTERESIS, cooldown=ALERT_COOLDOWN):
+        self.thresholds = DROP_THRESHOLDS if thresholds is None else thresholds
+        self.hysteresis = hysteresis
+        self.cooldown = cooldown
+        self.active = np.zeros(n, dtype=np.int8)          # poziom aktualnie "włączony"
+        self.last_level = np.zeros(n, dtype=np.int8)      # poziom ostatniego alertu
+        self.last_time = np.full(n, -np.inf)              # czas ostatniego alertu
+        self.episodes = np.zeros((n, RED + 1), dtype=np.int32)
+
+    def step(self, values, now=None):
+        """
+        Aktualizuje stan dla wartości wszystkich tickerów (NaN - brak danych, stan bez zmian).
+
+        Returns:
+            tablica poziomów do zgłoszenia (NO_ALERT = bez alertu)
+        """
+        now = time.time() if now is None else now
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        raw = drop_alert_levels(values, self.thresholds)
+        # poziom trzyma się, dopóki wartość nie zejdzie o `hysteresis` poniżej jego progu
+        held = np.minimum(self.active, drop_alert_levels(values + self.hysteresis, self.thresholds))
+        target = np.where(valid, np.maximum(raw, held), self.active).astype(np.int8)
+
+        # w czasie wyciszenia zgłaszamy tylko poziom wyższy niż ostatnio zgłoszony
+        recent = np.where(now - self.last_time < self.cooldown, self.last_level, NO_ALERT)
+        rising = target > self.active
+        fire = rising & (target > recent)
+        # wstrzymany wzrost nie jest zapamiętywany - alert padnie po wyciszeniu, jeśli poziom się utrzyma
+        self.active = np.where(rising & ~fire, self.active, target).astype(np.int8)
+
+        fired = np.flatnonzero(fire)
+        self.last_level[fired] = target[fired]
+        self.last_time[fired] = now
+        self.episodes[fired, target[fired]] += 1
+        return np.where(fire, target, NO_ALERT).astype(np.int8)
+
+    def code(self, i, name):
+        """Kod alertu dla tickera i (name - nagłówek poziomu, np. ALERT_NAMES[level])."""
+        return episode_code(name, self.episodes[i, self.last_level[i]])
+
+    def restore(self, alerts, names):
+        """
+        Odtwarza stan z alertów zapisanych w sesji (po restarcie).
+
+        Args:
+            alerts: zapisane alerty per ticker ({kod: czas}, w kolejności tickerów)
+            names: {poziom: nagłówek} - jak w code()
+        """
+        for i, ticker_alerts in enumerate(alerts):
+            episodes, last, last_time = stored_episodes(ticker_alerts, names)
+            for level, episode in episodes.items():
+                self.episodes[i, level] = episode
+            if last is not None:
+                # ostatni poziom uznajemy za włączony - zejście poniżej progu wyłączy go w step()
+                self.active[i] = self.last_level[i] = last
+                self.last_time[i] = last_time
+        return self
+
+
+class SignalDebouncer:
+    """Zmiany ocen (np. -2..2) zgłaszane po potwierdzeniu i z wyciszeniem - stan w tablicach per ticker."""
+
+    def __init__(self, n, confirm=SIGNAL_CONFIRM_CYCLES, cooldown=SIGNAL_COOLDOWN, values=range(-2, 3)):
+        self.confirm = confirm
+        self.cooldown = cooldown
+        self.offset = -min(values)
+        self.reported = np.full(n, np.nan)   # ostatnio zgłoszona ocena
+        self.pending = np.full(n, np.nan)    # ocena z ostatniego sprawdzenia
+        self.streak = np.zeros(n, dtype=np.int32)
+        self.last_time = np.full(n, -np.inf)
+        self.episodes = np.zeros((n, len(values)), dtype=np.int32)
+
+    def step(self, values, now=None):
+        """
+        Aktualizuje stan dla ocen wszystkich tickerów (NaN - nie sprawdzano).
+
+        Returns:
+            maska tickerów, dla których trzeba wysłać alert (pierwsza ocena w sesji - od razu)
+        """
+        now = time.time() if now is None else now
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        self.streak = np.where(valid, np.where(values == self.pending, self.streak + 1, 1), self.streak)
+        self.pending = np.where(valid, values, self.pending)
+
+        first = valid & np.isnan(self.reported)
+        changed = valid & (self.pending != self.reported) & (self.streak >= self.confirm)
+        fire = first | (changed & (now - self.last_time >= self.cooldown))
+
+        fired = np.flatnonzero(fire)
+        self.reported[fired] = self.pending[fired]
+        self.last_time[fired] = now
+        self.episodes[fired, self.pending[fired].astype(int) + self.offset] += 1
+        return fire
+
+    def code(self, i, code):
+        """Kod alertu dla zgłoszonej oceny tickera i (code - np. '1s')."""
+        return episode_code(code, self.episodes[i, int(self.reported[i]) + self.offset])
+
+    def restore(self, alerts, names):
+        """
+        Odtwarza stan z alertów zapisanych w sesji (po restarcie).
+
+        Args:
+            alerts: zapisane alerty per ticker ({kod: czas}, w kolejności tickerów)
+            names: {ocena: kod bez numeru}, np. {1: '1s'}
+        """
+        for i, ticker_alerts in enumerate(alerts):
+            episodes, last, last_time = stored_episodes(ticker_alerts, names)
+            for value, episode in episodes.items():
+                self.episodes[i, value + self.offset] = episode
+            if last is not None:
+                self.reported[i] = self.pending[i] = last
+                self.last_time[i] = last_time
+        return self
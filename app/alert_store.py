@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Trwały magazyn wysłanych alertów (deduplikacja per sesja giełdy).
+
+Klucz: (ticker, data sesji giełdy, kod alertu). Data sesji liczona jest w strefie czasowej
+giełdy, więc otwarcie NYSE nie kasuje stanu GPW, a restart kontenera nie wysyła alertów ponownie.
+
+Zapis: SQLite (WAL), jeden INSERT na nowy alert - bez przepisywania tabeli. Odczyt: zbiór kluczy
+bieżących sesji w pamięci (O(1)), wczytany przy starcie, oraz alerty pogrupowane per sesja
+(session_alerts - odtwarzanie stanu alertów po restarcie). Stare sesje usuwa expire().
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytz
+
+ALERT_STORE_PATH = os.getenv("ALERT_STORE_PATH", os.path.join("data", "alerts.db"))
+# Ile dni sesji trzymać w magazynie
+ALERT_STORE_KEEP_DAYS = int(os.getenv("ALERT_STORE_KEEP_DAYS", "7"))
+
+EXCHANGE_TIMEZONES = {
+    "GPW": "Europe/Warsaw",
+    "NEWCONNECT": "Europe/Warsaw",
+    "NYSE": "US/Eastern",
+    "NASDAQ": "US/Eastern",
+}
+
+
+def session_date(exchange, now=None):
+    """Data sesji giełdy (czas lokalny giełdy) jako 'YYYY-MM-DD'."""
+    tz = pytz.timezone(EXCHANGE_TIMEZONES.get(exchange, "Europe/Warsaw"))
+    now = datetime.now(tz) if now is None else now.astimezone(tz)
+    return now.date().isoformat()
+
+
+class AlertStore:
+    """Wysłane alerty per (ticker, sesja, kod) - trwałe i bezpieczne wątkowo."""
+
+    def __init__(self, path=ALERT_STORE_PATH, keep_days=ALERT_STORE_KEEP_DAYS):
+        self.path = path
+        self.keep_days = keep_days
+        self.lock = threading.Lock()
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS alerts ("
+            " ticker TEXT NOT NULL, session TEXT NOT NULL, code TEXT NOT NULL, sent_at TEXT NOT NULL,"
+            " PRIMARY KEY (ticker, session, code)) WITHOUT ROWID")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS alerts_session ON alerts (session)")
+        self.conn.commit()
+        self.keys = set()
+        self.sessions = {}  # { sesja: { ticker: { kod: czas wysłania (epoka) } } }
+        self.expire()
+        for ticker, session, code, sent_at in self.conn.execute("SELECT ticker, session, code, sent_at FROM alerts"):
+            self._index(ticker, session, code, datetime.fromisoformat(sent_at).timestamp())
+
+    def _index(self, ticker, session, code, sent_at):
+        self.keys.add((ticker, session, code))
+        self.sessions.setdefault(session, {}).setdefault(ticker, {})[code] = sent_at
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def seen(self, ticker, session, code):
+        return (ticker, session, code) in self.keys
+
+    def add(self, ticker, session, code):
+        """Zapisuje alert; zwraca True jeśli jest nowy (trzeba wysłać), False jeśli już był."""
+        key = (ticker, session, code)
+        with self.lock:
+            if key in self.keys:
+                return False
+            now = datetime.now()
+            self.conn.execute("INSERT OR IGNORE INTO alerts VALUES (?, ?, ?, ?)",
+                              (*key, now.isoformat(timespec='seconds')))
+            self.conn.commit()
+            self._index(*key, now.timestamp())
+            return True
+
+    def session_alerts(self, session):
+        """Alerty wysłane w sesji: { ticker: { kod: czas wysłania (epoka) } } (kopia)."""
+        with self.lock:
+            return {ticker: dict(codes) for ticker, codes in self.sessions.get(session, {}).items()}
+
+    def expire(self, today=None):
+        """Usuwa sesje starsze niż keep_days; zwraca liczbę usuniętych wpisów."""
+        today = datetime.now().date() if today is None else today
+        cutoff = (today - timedelta(days=self.keep_days)).isoformat()
+        with self.lock:
+            deleted = self.conn.execute("DELETE FROM alerts WHERE session < ?", (cutoff,)).rowcount
+            self.conn.commit()
+            if deleted:
+                self.keys = {key for key in self.keys if key[1] >= cutoff}
+                self.sessions = {session: alerts for session, alerts in self.sessions.items() if session >= cutoff}
+        return deleted
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
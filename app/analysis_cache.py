@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Memoizacja wyników analizy technicznej.
+
+Ten sam ticker jest analizowany wielokrotnie na niezmienionych danych (/at od użytkowników,
+ticker jednocześnie w MY_TICKERS i OBSERVABLE_TICKERS, kolejne cykle bez nowej świecy dziennej).
+Wyniki są trzymane w cache LRU z kluczem:
+(funkcja, ticker, znacznik czasu ostatniej świecy, hash danych, parametry wskaźników).
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from ticker_analizer import getScore, indicator_params_key
+from moving_analizer import calculate_moving_averages_signals, DEFAULT_PERIODS
+
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "512"))
+
+
+class AnalysisCache:
+    """Prosty cache LRU z licznikiem trafień."""
+
+    def __init__(self, maxsize=ANALYSIS_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+
+        value = compute()
+
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hit_rate(), 4),
+        }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+analysis_cache = AnalysisCache()
+
+
+def data_fingerprint(df):
+    """(znacznik ostatniej świecy, hash całych danych) - zmiana dowolnej świecy zmienia klucz."""
+    last_bar = df.index[-1] if len(df) else None
+    hashed = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    digest = hashlib.blake2b(hashed.tobytes(), digest_size=16).hexdigest()
+    return last_bar, digest
+
+
+def cached_score(ticker, df, cache=analysis_cache):
+    """getScore z memoizacją (ScoreResult - surowe liczby, tekst renderowany dopiero przy wysyłce).
+    Zwrócony wynik jest współdzielony - nie modyfikować."""
+    last_bar, digest = data_fingerprint(df)
+    key = ('score', ticker, last_bar, digest, indicator_params_key())
+    return cache.get_or_compute(key, lambda: getScore(df))
+
+
+def cached_moving_averages_signals(ticker, df, periods=DEFAULT_PERIODS, cross_pairs=(),
+                                   cross_lookback=1, cache=analysis_cache):
+    """calculate_moving_averages_signals z memoizacją. Zwrócony wynik jest współdzielony - nie modyfikować."""
+    last_bar, digest = data_fingerprint(df)
+    params = (tuple(periods), tuple(tuple(pair) for pair in cross_pairs), cross_lookback)
+    key = ('moving', ticker, last_bar, digest, params)
+    return cache.get_or_compute(
+        key, lambda: calculate_moving_averages_signals(df, periods, cross_pairs, cross_lookback))
@@ -6,13 +6,13 @@ import math
 import io
 import csv
 import time
+import signal
+import threading
 import requests
-from datetime import datetime, time as dt_time, date, timedelta
-import pytz
+from datetime import datetime, date, timedelta
 import yfinance as yf
+import numpy as np
 import pandas as pd
-from ticker_analizer import getScoreWithDetails
-from moving_analizer import calculate_moving_averages_signals
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from telegram.ext import Application, CommandHandler
@@ -21,6 +21,24 @@ import multiprocessing
 from dotenv import load_dotenv
 load_dotenv()
 
+# Progi, wagi oceny i ustawienia obliczeń czytane z ENV przy imporcie - dopiero po załadowaniu .env
+from ticker_analizer import getScoreWithDetails, required_history_bars, required_history_start
+from moving_analizer import calculate_moving_averages_signals, required_history_bars as ma_history_bars
+from ohlcv_panel import OHLCVPanel
+from analysis_cache import analysis_cache, cached_score, cached_moving_averages_signals
+from drop_alerts import ALERT_NAMES, NO_ALERT, GREEN, YELLOW, classify_drops, drop_percent
+from intraday_tracker import IntradayTracker, DRAWDOWN_THRESHOLDS, GAP_THRESHOLD
+from alert_state import LevelHysteresis, SignalDebouncer
+from market_move import market_move, worst_movers, MarketLatch, MARKET_MEMBER_DROP
+from polling_tiers import PollingTiers, LastQuotes, TIER_INTERVALS, TIER_NAMES, MY_TIER
+from market_hours import EXCHANGE_HOURS, is_open, next_session
+from scheduler import EventScheduler
+from alert_store import AlertStore, session_date
+from notifications import (NotificationBatch, pack_messages, LEVEL_PRIORITIES, PRIORITY_RED, PRIORITY_ERROR,
+                           PRIORITY_ANALYSIS, PRIORITY_INFO)
+from notifiers import MultiNotifier, sinks_from_env
+from alert_rules import load_rules, RuleInputs, SessionHistory
+
 # + twoje istniejące importy (yfinance, telegram, etc.)
 # ----------------------
 # KONFIGURACJA (dostosuj)
@@ -65,37 +83,35 @@ for t in TICKERS_NYSE:
 
 
 # Interwały (sekundy)
-PRICE_CHECK_INTERVAL = 5 * 60    # 5 minut dla cen
-OPEN_CHECK_INTERVAL = 30         # co 30s sprawdzamy czy giełda się otworzyła (real-time)
-OFF_HOURS_SLEEP = 30 * 60        # jak giełda zamknięta to dłuższy sleep (tylko gdy wszystkie zamknięte)
-
-# Progi alertów (w procentach)
-DROP_THRESHOLDS = {
-    "czerwony": float(os.getenv("ALERT_THRESHOLD_RED", "10.0")),
-    "zolty": float(os.getenv("ALERT_THRESHOLD_YELLOW", "7.0")),
-    "zielony": float(os.getenv("ALERT_THRESHOLD_GREEN", "5.0"))
-}
+# Ceny: takt = najkrótszy interwał warstw (TIER_INTERVALS); w takcie pobierane są tylko tickery,
+# którym minął interwał ich warstwy (własne / obserwowane / pozostałe)
+PRICE_CHECK_INTERVAL = min(TIER_INTERVALS)
+PRE_OPEN_WARMUP = 5 * 60         # rozgrzewka (poprzednie zamknięcia, historia reguł) przed otwarciem
+# Analiza techniczna tickera nie częściej niż co tyle sekund - niezależnie od warstwy odpytywania
+SIGNAL_CHECK_INTERVAL = float(os.getenv("SIGNAL_CHECK_INTERVAL", str(5 * 60)))
+# Ile giełd może jednocześnie pobierać dane i liczyć alerty (wspólny limit dla wszystkich giełd)
+PRICE_CHECK_CONCURRENCY = int(os.getenv("PRICE_CHECK_CONCURRENCY", "2"))
+
+# Progi alertów (w procentach) - DROP_THRESHOLDS w drop_alerts.py
 # ----------------------
 
 if not TOKEN or not CHAT_ID:
     raise SystemExit("Ustaw zmienne środowiskowe TG_BOT_TOKEN i TG_CHAT_ID przed uruchomieniem.")
 
-# Strefy czasowe
-warsaw_tz = pytz.timezone("Europe/Warsaw")
-us_tz = pytz.timezone("US/Eastern")
-
 # Stan: zapobiega powtarzaniu powiadomień o błędach
 tickery_z_bledem = set()
 
-# Czy dana giełda była już (wczoraj/ostatnio) otwarta — by wysłać alert o otwarciu raz dziennie
-last_open_date = { "GPW": None, "NYSE": None, "NASDAQ": None }
-
-# Ostatni czas sprawdzenia cen dla giełdy (timestamp)
-last_price_check_ts = { "GPW": 0, "NYSE": 0, "NASDAQ": 0 }
-
-alerted_types_today = {}
+# Wysłane alerty per (ticker, sesja giełdy, kod) - trwałe (SQLite), przeżywają restart.
+# Otwierany w procesie pętli (main_loop) - połączenia SQLite nie wolno przenosić przez fork()
+alert_store = None
 previous_close_cache = {}  # { ticker: {"date": date, "price": float} }
 
+# Reguły alertów użytkownika (ALERT_RULES_PATH) - kompilowane raz przy starcie
+alert_rules = load_rules()
+rule_history_cache = {}  # { giełda: (sesja, SessionHistory) } - historia dzienna dla reguł
+# Stan sesji per giełda (tracker przebiegu sesji, histereza alertów, oceny wskaźników)
+session_states = {}  # { (giełda, rodzaj): (sesja, tickery, stan) }
+
 def load_tickers():
     tickers = {}
     for ticker in os.getenv("TICKERS_GPW", "").split(","):
@@ -119,77 +135,44 @@ def load_tickers():
 
 TICKERS = load_tickers()
 
-def send_telegram_message(text, parse_mode="HTML"):
-    url = f"https://api.telegram.org/bot{TOKEN}/sendMessage"
-    payload = {"chat_id": CHAT_ID, "text": text,
-        "parse_mode": parse_mode,
-        "disable_web_page_preview": True }
-    try:
-        resp = requests.post(url, json=payload, timeout=10)
-        if not resp.ok:
-            print(f"[TG] Błąd wysyłki: {resp.status_code} {resp.text}")
-    except Exception as e:
-        print(f"[TG] Wyjątek przy wysyłce: {e}")
+# Wysyłka w tle do wszystkich kanałów (Telegram, webhook, e-mail, plik) - pętla tylko dodaje do kolejek
+notifier = MultiNotifier(sinks_from_env())
 
 
-def is_exchange_open(exchange):
-    """Zwraca True jeżeli dana giełda jest otwarta teraz (proste reguły: dni robocze i godziny)."""
-    if exchange == "GPW":
-        now = datetime.now(warsaw_tz)
-        if now.weekday() >= 5:  # sobota/niedziela
-            return False
-        return dt_time(9, 0) <= now.time() <= dt_time(17, 0)
+def send_notification(text):
+    notifier.send(text)
 
-    if exchange in ("NYSE", "NASDAQ"):
-        now = datetime.now(us_tz)
-        if now.weekday() >= 5:
-            return False
-        return dt_time(9, 30) <= now.time() <= dt_time(16, 0)
 
-    # domyślnie: otwarte
-    return True
+# Powiadomienia z jednego zadania (zdarzenie harmonogramu, sprawdzenie giełdy w puli) - wysyłane razem
+# (scalone, wg priorytetu) na końcu zadania. Każdy wątek ma własną paczkę - równoległe giełdy się nie mieszają
+outboxes = threading.local()
 
 
-def market_open_watch():
-    """Sprawdza otwarcie giełd i wysyła powiadomienie raz dziennie o ich otwarciu."""
-    global last_open_date
-    exchanges = set(TICKERS.values())
-    for ex in exchanges:
-        if ex not in last_open_date:
-            last_open_date[ex] = None
+def outbox():
+    """Paczka powiadomień bieżącego wątku (zadania)."""
+    batch = getattr(outboxes, 'batch', None)
+    if batch is None:
+        batch = outboxes.batch = NotificationBatch(send_notification)
+    return batch
 
-        open_now = is_exchange_open(ex)
-        today = date.today()
 
-        if open_now:
-            # jeśli jeszcze dziś nie wysłaliśmy powiadomienia o otwarciu -> wyślij
-            if last_open_date[ex] != today:
-                alerted_types_today.clear()
-                send_telegram_message(f"🟢 {ex} — otwarta. Bot działa i będzie monitorował tickery na tej giełdzie.")
-                last_open_date[ex] = today
-        else:
-            # jeśli giełda zamknięta, resetujemy flagę, ale tylko gdy dzień się zmienił
-            # (zapobiega wysyłaniu otwarcia kilka razy za jeden dzień)
-            if last_open_date[ex] is not None and last_open_date[ex] != today:
-                last_open_date[ex] = None
-            # nie ruszamy jeśli last_open_date == None
-
-def alert_color_name(spadek):
-    """Zwraca nagłówek alertu wg progów lub None."""
-    if spadek >= DROP_THRESHOLDS["czerwony"]:
-        return "🔴 CZERWONY ALERT"
-    if DROP_THRESHOLDS["zolty"] <= spadek < DROP_THRESHOLDS["czerwony"]:
-        return "🟡 ŻÓŁTY ALERT"
-    if DROP_THRESHOLDS["zielony"] <= spadek < DROP_THRESHOLDS["zolty"]:
-        return "🟢 ZIELONY ALERT"
-    return None
+def notify(text, priority=PRIORITY_INFO):
+    outbox().add(text, priority)
+
+
+def is_exchange_open(exchange):
+    """Zwraca True jeżeli dana giełda jest otwarta teraz (godziny sesji z market_hours)."""
+    return is_open(exchange)
+
 
 def download_with_retry_onlyAt(ticker, max_retries=3, delay=2):
+    # Zakres historii wynika z rozbiegu aktywnych wskaźników i średnich kroczących
+    start = required_history_start(required_history_bars(extra_bars=ma_history_bars()))
     for attempt in range(max_retries):
         try:
             hist = yf.download(
                 [ticker],
-                period="6mo",
+                start=start,
                 interval="1d",
                 prepost=False,
                 threads=True,
@@ -395,44 +378,22 @@ def download_with_retry(tickers, max_retries=3, delay=2):
             if hist_daily is None or hist_daily.empty:
                 raise Exception("Otrzymano puste dane dzienne z yfinance")
 
-
+            # Zwarte panele float32 zamiast ramek float64 z MultiIndex
+            hist_daily = OHLCVPanel.from_yfinance(hist_daily, tickers)
+            hist_realtime = OHLCVPanel.from_yfinance(hist_realtime, tickers)
 
             # Sprawdź które tickery nie mają danych
             if isinstance(tickers, list) and len(tickers) > 1:
-                # Multi-ticker: sprawdź kolumny i sprawdź czy mają rzeczywiste dane (nie tylko NaN-y)
-                available_daily = set()
-                available_realtime = set()
-
-                if hasattr(hist_daily.columns, 'levels'):
-                    # Sprawdź każdy ticker czy ma dane (nie tylko kolumnę)
-                    for ticker in tickers:
-                        if ticker in hist_daily.columns.get_level_values(0):
-                            # Sprawdź czy kolumna 'Close' ma jakieś nie-NaN wartości
-                            ticker_data = hist_daily[ticker]
-                            df_realtime = hist_realtime[ticker]
-                            current_price = float(df_realtime['Close'].iloc[-1])
-                            has_yahoo_data = not math.isnan(current_price)
-
-                            if (has_yahoo_data and 'Close' in ticker_data.columns
-                                    and not ticker_data['Close'].isna().all()):
-                                available_daily.add(ticker)
-                elif not hist_daily.empty:
-                    # Single ticker - sprawdź czy ma dane
-                    if 'Close' in hist_daily.columns and not hist_daily['Close'].isna().all():
-                        available_daily = set(tickers)
-
-                if hasattr(hist_realtime.columns, 'levels'):
-                    # Sprawdź każdy ticker czy ma dane (nie tylko kolumnę)
-                    for ticker in tickers:
-                        if ticker in hist_realtime.columns.get_level_values(0):
-                            # Sprawdź czy kolumna 'Close' ma jakieś nie-NaN wartości
-                            ticker_data = hist_realtime[ticker]
-                            if 'Close' in ticker_data.columns and not ticker_data['Close'].isna().all():
-                                available_realtime.add(ticker)
-                elif not hist_realtime.empty:
-                    # Single ticker - sprawdź czy ma dane
-                    if 'Close' in hist_realtime.columns and not hist_realtime['Close'].isna().all():
-                        available_realtime = set(tickers)
+                # Ticker jest dostępny, jeśli ma rzeczywiste dane (nie tylko NaN-y)
+                current_close = hist_realtime.field('Close')[:, -1] if len(hist_realtime) else []
+                has_current_price = {
+                    ticker: not math.isnan(float(close))
+                    for ticker, close in zip(hist_realtime.symbols, current_close)
+                }
+
+                available_daily = {t for t in tickers
+                                   if has_current_price.get(t) and hist_daily.has_data(t)}
+                available_realtime = {t for t in tickers if hist_realtime.has_data(t)}
 
                 failed_tickers_daily = [t for t in tickers if t not in available_daily]
                 failed_tickers_realtime = [t for t in tickers if t not in available_realtime]
@@ -490,293 +451,568 @@ def download_with_retry(tickers, max_retries=3, delay=2):
     
     if stooq_data:
         print(f"✅ Stooq dostarczył dane awaryjne dla {len(stooq_data)} tickerów")
-        # Zwróć puste DataFrames + dane ze Stooq
-        import pandas as pd
-        return pd.DataFrame(), pd.DataFrame(), stooq_data
+        # Zwróć puste panele + dane ze Stooq
+        return OHLCVPanel.from_yfinance(None), OHLCVPanel.from_yfinance(None), stooq_data
     
     raise Exception(f"Nie udało się pobrać danych po {max_retries} próbach (Yahoo i Stooq)")
 
 
-def check_prices_for_exchange(exchange):
-    global alerted_types_today  # { ticker: set(alert_type) }
+# Źródło ceny tickera w cyklu sprawdzania
+SOURCE_NONE = 0      # brak danych (zgłaszany jako brakujący)
+SOURCE_YAHOO = 1     # świeca 5m z Yahoo + previousClose z API
+SOURCE_STOOQ = 2     # Stooq (cena i poprzednie zamknięcie)
+SOURCE_SKIP = 3      # dane niepełne, ale Stooq ma ticker - pomijamy bez alertu
+SOURCE_IDLE = 4      # ticker nie był pobierany w tym cyklu (warstwy odpytywania) - stan bez zmian
+
+
+def previous_closes(tickers):
+    """Wczorajsze zamknięcia jako tablica (NaN gdy brak); API odpytywane tylko dla tickerów spoza cache."""
+    today = date.today()
+    out = np.full(len(tickers), np.nan)
+    for i, ticker in enumerate(tickers):
+        cached = previous_close_cache.get(ticker)
+        price = cached["price"] if cached and cached["date"] == today else get_previous_close(ticker)
+        if price is not None:
+            out[i] = price
+    return out
+
+
+def exchange_prices(tickers, hist_daily, hist_realtime, stooq_data):
+    """
+    Poprzednie zamknięcie, aktualna cena i źródło dla wszystkich tickerów giełdy (tablice).
+
+    Reguły wyboru źródła jak dotąd: Yahoo gdy ostatnia świeca 5m ma cenę; w przeciwnym razie Stooq
+    (jeśli ma ticker); bez świec dziennych lub previousClose - pominięcie (gdy jest w Stooq)
+    albo brak danych.
+    """
+    n = len(tickers)
+    current = np.full(n, np.nan)
+    if len(hist_realtime):
+        rows = [hist_realtime.symbol_index.get(t, -1) for t in tickers]
+        known = np.array([r >= 0 for r in rows])
+        last = hist_realtime.field('Close')[:, -1].astype(float)
+        current[known] = last[np.array(rows)[known]]
+    prev_close = np.full(n, np.nan)
+
+    in_stooq = np.array([t in stooq_data for t in tickers], dtype=bool)
+    in_daily = np.array([t in hist_daily for t in tickers], dtype=bool)
+    has_yahoo = ~np.isnan(current)
+
+    yahoo = has_yahoo & in_daily
+    idx = np.flatnonzero(yahoo)
+    prev_close[idx] = previous_closes([tickers[i] for i in idx])
+    yahoo &= ~np.isnan(prev_close)
+
+    stooq = ~has_yahoo & in_stooq
+    for i in np.flatnonzero(stooq):
+        quote = stooq_data[tickers[i]]
+        current[i] = quote['close']
+        prev_close[i] = quote['prev_close'] if quote['prev_close'] else np.nan
+
+    source = np.full(n, SOURCE_NONE, dtype=np.int8)
+    source[has_yahoo & in_stooq] = SOURCE_SKIP
+    source[stooq] = SOURCE_STOOQ
+    source[yahoo] = SOURCE_YAHOO
+    return prev_close, current, source
+
+
+def scatter_prices(n, due, prev_close, current, source):
+    """Ceny pobranej części tickerów na pozycjach całej giełdy (pozostałe: NaN i SOURCE_IDLE)."""
+    idx = np.flatnonzero(due)
+    out_prev, out_current = np.full(n, np.nan), np.full(n, np.nan)
+    out_source = np.full(n, SOURCE_IDLE, dtype=np.int8)
+    out_prev[idx], out_current[idx], out_source[idx] = prev_close, current, source
+    return out_prev, out_current, out_source
+
+
+def session_quotes(tickers, hist_realtime, stooq_data, source):
+    """Otwarcie i wolumen bieżącej sesji (tablice; NaN gdy brak) - ze świec 5m albo ze Stooq."""
+    n = len(tickers)
+    open_price = np.full(n, np.nan)
+    volume = np.full(n, np.nan)
+    if len(hist_realtime):
+        rows = np.array([hist_realtime.symbol_index.get(t, -1) for t in tickers])
+        known = rows >= 0
+        open_price[known] = hist_realtime.first_valid('Open')[rows[known]]
+        volume[known] = np.nansum(hist_realtime.field('Volume'), axis=1)[rows[known]]
+    for i in np.flatnonzero(source == SOURCE_STOOQ):
+        quote = stooq_data[tickers[i]]
+        open_price[i] = quote['open'] if quote['open'] is not None else np.nan
+        volume[i] = quote['volume'] if quote['volume'] is not None else np.nan
+    return open_price, volume
+
+
+def rule_history(exchange, tickers, session):
+    """Zakończone sesje potrzebne regułom - pobierane raz na sesję giełdy (None gdy niepotrzebne)."""
+    bars = alert_rules.history_bars
+    if not bars:
+        return None
+    cached = rule_history_cache.get(exchange)
+    if cached and cached[0] == session and cached[1].tickers == tickers:
+        return cached[1]
+    try:
+        hist = yf.download(
+            tickers,
+            start=required_history_start(bars + 1),
+            interval="1d",
+            prepost=False,
+            threads=True,
+            group_by="ticker",
+            auto_adjust=True,
+            progress=False
+        )
+    except Exception as e:
+        print(f"[RULES] Nie udało się pobrać historii dla {exchange}: {e}")
+        return None
+    history = SessionHistory(OHLCVPanel.from_yfinance(hist, tickers), tickers, session)
+    rule_history_cache[exchange] = (session, history)
+    print(f"[RULES] Historia {exchange}: {history.bars} sesji dla {len(tickers)} tickerów")
+    return history
+
+
+def check_rules_for_exchange(exchange, tickers, session, prev_close, current, source, hist_realtime, stooq_data):
+    """Reguły użytkownika - każda liczona jednym wyrażeniem na tablicach całej giełdy."""
+    valid = np.isin(source, (SOURCE_YAHOO, SOURCE_STOOQ))
+    open_price, volume = session_quotes(tickers, hist_realtime, stooq_data, source)
+    inputs = RuleInputs(tickers,
+                        np.where(valid, prev_close, np.nan),
+                        np.where(valid, current, np.nan),
+                        open_price, volume,
+                        history=rule_history(exchange, tickers, session))
+
+    for rule, hits in alert_rules.evaluate(inputs, exchange):
+        for i in hits:
+            ticker = tickers[i]
+            if not alert_store.add(ticker, session, rule.code):
+                continue
+            msg = (
+                f"📋 {rule.name}: <b>{ticker}</b>\n"
+                f"Warunek: {rule.description}\n"
+                f"Wczorajsze zamknięcie: {inputs.prev_close[i]:.2f}\n"
+                f"Aktualna cena: {inputs.price[i]:.2f}\n"
+                f"Zmiana: {inputs.change[i]:+.2f}%"
+            )
+            print(f"[SENDING RULE ALERT] {msg}")
+            notify(msg, rule.priority)
+
+
+def stored_alerts(tickers, session):
+    """Alerty już zapisane w sesji per ticker - po restarcie odtwarzają stan histerezy i numery epizodów."""
+    stored = alert_store.session_alerts(session)
+    return [stored.get(ticker, {}) for ticker in tickers]
+
+
+def session_state(exchange, kind, tickers, session, factory):
+    """Stan danego rodzaju dla giełdy - tworzony od nowa przy zmianie sesji lub listy tickerów."""
+    cached = session_states.get((exchange, kind))
+    if cached is None or cached[0] != session or cached[1] != tickers:
+        cached = (session, list(tickers), factory())
+        session_states[(exchange, kind)] = cached
+    return cached[2]
+
+
+def check_intraday_for_exchange(exchange, tickers, session, prev_close, current, source, drop_levels,
+                                hist_realtime, stooq_data, quotes):
+    """
+    Obsunięcie od maksimum sesji i luka na otwarciu - przetwarzane są tylko nowe świece.
+
+    Returns:
+        obsunięcie od maksimum w % (NaN dla tickerów bez ceny w tym cyklu)
+    """
+    tracker = session_state(exchange, 'intraday', tickers, session, lambda: IntradayTracker(tickers, session))
+    tracker.update(hist_realtime)
+    stooq = np.flatnonzero(source == SOURCE_STOOQ)
+    if len(stooq):
+        quotes = [stooq_data[tickers[i]] for i in stooq]
+        tracker.observe(stooq,
+                        [q['open'] if q['open'] is not None else np.nan for q in quotes],
+                        [q['high'] if q['high'] is not None else np.nan for q in quotes])
+
+    valid = np.isin(source, (SOURCE_YAHOO, SOURCE_STOOQ))
+    drawdown, _levels, gap, _gaps = tracker.classify(np.where(valid, prev_close, np.nan),
+                                                       np.where(valid, current, np.nan))
+    # Obsunięcia i luki całego rynku nie generują alertu dla każdej spółki - liczymy je względem rynku
+    # (rynek ze wszystkich tickerów giełdy, także niepobieranych w tym cyklu)
+    market_drawdown, _levels, market_gap, _gaps = tracker.classify(quotes.prev_close, quotes.price)
+    gaps = np.abs(market_move(-market_gap).relative(-gap)) >= GAP_THRESHOLD
+    dd_state = session_state(exchange, 'drawdown', tickers, session,
+                             lambda: LevelHysteresis(len(tickers), DRAWDOWN_THRESHOLDS).restore(
+                                 stored_alerts(tickers, session),
+                                 {level: f"{name} DD" for level, name in ALERT_NAMES.items()}))
+    dd_market = session_state(exchange, 'market_drawdown', tickers, session, MarketLatch).update(
+        market_move(market_drawdown))
+    dd_levels = dd_state.step(dd_market.relative(drawdown))
+    # Gdy maksimum sesji nie przekracza wczorajszego zamknięcia, obsunięcie to zwykły spadek -
+    # alert o obsunięciu tylko ponad poziom alertu spadkowego
+    dd_levels[dd_levels <= drop_levels] = NO_ALERT
+
+    for i in np.flatnonzero(dd_levels):
+        ticker = tickers[i]
+        alert_code = dd_state.code(i, f"{ALERT_NAMES[dd_levels[i]]} DD")
+        if not alert_store.add(ticker, session, alert_code):
+            continue
+        msg = (
+            f"{ALERT_NAMES[dd_levels[i]]} — obsunięcie od maksimum sesji: <b>{ticker}</b>\n"
+            f"Maksimum sesji: {np.fmax(tracker.high[i], current[i]):.2f}\n"
+            f"Aktualna cena: {current[i]:.2f}\n"
+            f"Obsunięcie: {drawdown[i]:.2f}%\n"
+            f"Zmiana od wczoraj: {(current[i] / prev_close[i] - 1) * 100:+.2f}%"
+        )
+        print(f"[SENDING ALERT] {msg}")
+        notify(msg, LEVEL_PRIORITIES[dd_levels[i]])
+
+    for i in np.flatnonzero(gaps):
+        ticker = tickers[i]
+        if not alert_store.add(ticker, session, "GAP"):
+            continue
+        kind = "spadkowa" if gap[i] < 0 else "wzrostowa"
+        msg = (
+            f"⚡ Luka {kind} na otwarciu: <b>{ticker}</b>\n"
+            f"Wczorajsze zamknięcie: {prev_close[i]:.2f}\n"
+            f"Otwarcie: {tracker.open[i]:.2f} ({gap[i]:+.2f}%)\n"
+            f"Aktualna cena: {current[i]:.2f}"
+        )
+        print(f"[SENDING ALERT] {msg}")
+        notify(msg, LEVEL_PRIORITIES[YELLOW if gap[i] < 0 else GREEN])
+    return drawdown
+
+
+def check_signals_for_exchange(exchange, tickers, session, source):
+    """
+    Oceny wskaźników dla obserwowanych tickerów giełdy; zmiana oceny zgłaszana dopiero po
+    potwierdzeniu w kolejnych sprawdzeniach i z wyciszeniem (SignalDebouncer). Każdy ticker
+    analizowany jest co SIGNAL_CHECK_INTERVAL, także gdy jego ceny sprawdzane są częściej.
+    """
+    watched = set(MY_TICKERS) | set(OBSERVABLE_TICKERS)
+    rates_s = np.full(len(tickers), np.nan)
+    rates_m = np.full(len(tickers), np.nan)
+    results = {}
+    last_analysis = session_state(exchange, 'signal_time', tickers, session, lambda: np.full(len(tickers), -np.inf))
+    now = time.time()
+    # pół taktu zapasu na opóźnienie zdarzeń - jak w warstwach odpytywania
+    due = now - last_analysis >= SIGNAL_CHECK_INTERVAL - PRICE_CHECK_INTERVAL / 2
+    for i in np.flatnonzero((source == SOURCE_YAHOO) & due):
+        ticker = tickers[i]
+        if ticker not in watched:
+            continue
+        last_analysis[i] = now
+        try:
+            histAT = download_with_retry_onlyAt(ticker)
+            result, movingRate = getAnalizeResult(histAT, ticker)
+        except Exception as e:
+            print(f"[ERROR] Błąd analizy technicznej dla {ticker}: {e}")
+            continue
+        results[i] = (result, movingRate)
+        rates_s[i] = result.rate
+        rates_m[i] = movingRate
+    print(f"[CACHE] Analiza techniczna: {analysis_cache.stats()}")
+
+    # Stan ocen całej giełdy - jeden przebieg na cykl
+    state_s = session_state(exchange, 'signal_s', tickers, session, lambda: SignalDebouncer(len(tickers)).restore(
+        stored_alerts(tickers, session), {rate: f"{rate}s" for rate in RATING_LABELS}))
+    state_m = session_state(exchange, 'signal_m', tickers, session, lambda: SignalDebouncer(len(tickers)).restore(
+        stored_alerts(tickers, session), {rate: f"{rate}m" for rate in RATING_LABELS}))
+    fire_s = state_s.step(rates_s)
+    fire_m = state_m.step(rates_m)
+
+    for i in np.flatnonzero(fire_s | fire_m):
+        ticker = tickers[i]
+        result, movingRate = results[i]
+        alert_code_m, alert_code_s = getAnalizeCodes(result, movingRate)
+        new_s = fire_s[i] and alert_store.add(ticker, session, state_s.code(i, alert_code_s))
+        new_m = fire_m[i] and alert_store.add(ticker, session, state_m.code(i, alert_code_m))
+        if new_s or new_m:
+            notify(formatAnalizeMsg(ticker, result, movingRate), PRIORITY_ANALYSIS)
+
+
+def notify_market_move(exchange, tickers, session, market, spadek):
+    """Jeden alert o ruchu całej giełdy - ponownie dopiero, gdy rynek spadnie o kolejny MARKET_MEMBER_DROP."""
+    step = int(market.drop // MARKET_MEMBER_DROP)
+    if not alert_store.add(exchange, session, f"MARKET {step}"):
+        return
+    worst = ", ".join(f"{tickers[i]} -{spadek[i]:.2f}%" for i in worst_movers(spadek))
+    msg = (
+        f"🌧️ RUCH RYNKU: <b>{exchange}</b>\n"
+        f"Średni spadek: {market.drop:.2f}% ({market.breadth:.0%} z {market.count} spółek ≥ {MARKET_MEMBER_DROP:g}%)\n"
+        f"Najsłabsze: {worst}\n"
+        f"Alerty pojedynczych spółek liczone względem rynku."
+    )
+    print(f"[SENDING MARKET ALERT] {msg}")
+    notify(msg, PRIORITY_RED)
+
+
+def check_prices_for_exchange(exchange, tiers=None, due=None):
+    """
+    Sprawdza ceny giełdy. `due` - maska tickerów pobieranych w tym cyklu (domyślnie wszystkie),
+    pobranych jednym zapytaniem; pozostałe mają SOURCE_IDLE i zachowują stan alertów. Tickery
+    z dużym ruchem awansują w `tiers` do najszybszej warstwy.
+    """
     tickers_for_exchange = [t for t, ex in TICKERS.items() if ex == exchange]
     if not tickers_for_exchange:
         return
-
-    missing_data_tickers = []
+    due = np.ones(len(tickers_for_exchange), dtype=bool) if due is None else np.asarray(due, dtype=bool)
+    batch = [tickers_for_exchange[i] for i in np.flatnonzero(due)]
 
     try:
-        hist_daily, hist_realtime, stooq_data = download_with_retry(tickers_for_exchange)
+        hist_daily, hist_realtime, stooq_data = download_with_retry(batch)
     except Exception as e:
         msg = f"❗ Błąd przy pobieraniu danych dla giełdy {exchange}: {e}"
         print(msg)
-        print(f"stooq_data: {stooq_data}")
-        send_telegram_message(msg)
+        notify(msg, PRIORITY_ERROR)
         return
 
     print(f"stooq_data: {stooq_data}")
 
-    for ticker in tickers_for_exchange:
-        try:
-            # === SPRAWDŹ CZY TICKER MA DANE W YAHOO FINANCE ===
-            has_yahoo_data = False
-            df_realtime = hist_realtime[ticker]
-            if isinstance(hist_daily.columns, pd.MultiIndex):
-                current_price = float(df_realtime['Close'].iloc[-1])
-                has_yahoo_data = not math.isnan(current_price)
-            elif not hist_daily.empty:
-                has_yahoo_data = True
-            
-            # === NORMALNA OBSŁUGA YAHOO FINANCE ===
-            # Obsługa MultiIndex (wiele tickerów) vs single ticker
-            if isinstance(hist_daily.columns, pd.MultiIndex):
-                df_daily = hist_daily[ticker]
-                df_realtime = hist_realtime[ticker]
-            else:
-                df_daily = hist_daily
-                df_realtime = hist_realtime
-            
+    # === ALERTY CENOWE: spadki i progi dla całej giełdy jedną operacją ===
+    prev_close, current, source = scatter_prices(len(tickers_for_exchange), due,
+                                                 *exchange_prices(batch, hist_daily, hist_realtime, stooq_data))
+    spadek, levels, candidates = classify_drops(prev_close, current)
+    missing_data_tickers = [tickers_for_exchange[i] for i in np.flatnonzero(source == SOURCE_NONE)]
+
+    checked = int(np.isin(source, (SOURCE_YAHOO, SOURCE_STOOQ)).sum())
+    print(f"\n[ALERT CHECK] {exchange}: {checked}/{len(batch)} tickerów z ceną, "
+          f"{len(candidates)} powyżej progu")
+    last_update = hist_realtime.index[-1] if len(hist_realtime) else None
+    session = session_date(exchange)
+
+    # Ruch całego rynku: jeden alert zbiorczy, a pojedyncze spółki oceniane względem rynku.
+    # Rynek liczony z ostatnich znanych cen wszystkich tickerów, nie tylko pobranych w tym cyklu
+    quotes = session_state(exchange, 'quotes', tickers_for_exchange, session,
+                           lambda: LastQuotes(len(tickers_for_exchange)))
+    valid = np.isin(source, (SOURCE_YAHOO, SOURCE_STOOQ))
+    market_spadek = drop_percent(*quotes.update(np.where(valid, prev_close, np.nan), current))
+    # stan "ruch rynku" z histerezą - spadki nie przełączają się co cykl między bezwzględnymi a względnymi
+    market = session_state(exchange, 'market', tickers_for_exchange, session, MarketLatch).update(
+        market_move(market_spadek))
+    if market.storm:
+        notify_market_move(exchange, tickers_for_exchange, session, market, market_spadek)
+    print(f"[MARKET] {exchange}: średni spadek {market.drop:.2f}%, szerokość {market.breadth:.0%}"
+          f"{' - ruch rynkowy' if market.storm else ''}")
+
+    # Histereza i wyciszenie: ponowny alert dopiero po odbiciu ponad próg (z zapasem) i po cooldown
+    drop_state = session_state(exchange, 'drop', tickers_for_exchange, session,
+                               lambda: LevelHysteresis(len(tickers_for_exchange)).restore(
+                                   stored_alerts(tickers_for_exchange, session), ALERT_NAMES))
+    relative = market.relative(spadek)
+    fire_levels = drop_state.step(relative)
+
+    # Do powiadomień trafiają tylko tickery, dla których stan alertu się podniósł
+    for i in np.flatnonzero(fire_levels):
+        ticker = tickers_for_exchange[i]
+        alert_code = ALERT_NAMES[fire_levels[i]]
+        if not alert_store.add(ticker, session, drop_state.code(i, alert_code)):
+            print(f"  {ticker}: spadek {spadek[i]:.2f}% → Alert NIE wysłany (już był wysłany: {alert_code})")
+            continue
+
+        if source[i] == SOURCE_STOOQ:
+            quote = stooq_data[ticker]
+            msg = (
+                f"{alert_code}: !!! <b>{ticker}</b> !!! [Stooq]\n"
+                f"Wczorajsze zamknięcie: {prev_close[i]:.2f}\n"
+                f"Aktualna cena: {current[i]:.2f}\n"
+                f"Spadek: {spadek[i]:.2f}%\n"
+                f"Czas: {quote['date']} {quote['time']}"
+            )
+        else:
+            msg = (
+                f"{alert_code}: !!! <b>{ticker}</b> !!!\n"
+                f"Wczorajsze zamknięcie: {prev_close[i]:.2f}\n"
+                f"Aktualna cena: {current[i]:.2f}\n"
+                f"Spadek: {spadek[i]:.2f}%\n"
+                f"Czas: {last_update.strftime('%H:%M:%S')}"
+            )
+        if market.storm:
+            msg += f"\nWzględem rynku: {relative[i]:.2f}% (rynek: -{market.drop:.2f}%)"
+        print(f"[SENDING ALERT] {msg}")
+        notify(msg, LEVEL_PRIORITIES[fire_levels[i]])
+
+    # === PRZEBIEG SESJI: obsunięcie od maksimum i luka na otwarciu ===
+    drawdown = check_intraday_for_exchange(exchange, tickers_for_exchange, session, prev_close, current, source,
+                                           levels, hist_realtime, stooq_data, quotes)
+
+    # === REGUŁY UŻYTKOWNIKA ===
+    if alert_rules:
+        check_rules_for_exchange(exchange, tickers_for_exchange, session, prev_close, current, source,
+                                 hist_realtime, stooq_data)
+
+    # === ANALIZA TECHNICZNA (jeśli włączona) ===
+    if activeAnalize:
+        check_signals_for_exchange(exchange, tickers_for_exchange, session, source)
+
+    # brak danych zgłaszany raz na ticker w sesji - szybka warstwa nie powtarza go co minutę
+    missing_data_tickers = [t for t in missing_data_tickers if alert_store.add(t, session, "NO DATA")]
+    if missing_data_tickers:
+        notify(f"❗ Brak danych dla: {', '.join(missing_data_tickers)}", PRIORITY_ERROR)
 
-            if df_realtime is None or df_realtime.empty or not has_yahoo_data:
-                if ticker in stooq_data:
-                    print(f"📊 {ticker}: Yahoo brak real-time, używam Stooq")
-                    stooq_ticker_data = stooq_data[ticker]
-                    current_price = stooq_ticker_data['close']
-                    prev_close = stooq_ticker_data['prev_close']
-                    
-                    # Pobierz previous close z Yahoo daily (jeśli mamy)
-                    if prev_close:
-                        spadek = ((prev_close - current_price) / prev_close) * 100
-                        
-                        last_update_str = f"{stooq_ticker_data['date']} {stooq_ticker_data['time']}"
-                        
-                        print(f"\n[ALERT CHECK - STOOQ] {ticker} @ {last_update_str}:")
-                        print(f"  Wczorajsze zamknięcie: {prev_close:.2f}")
-                        print(f"  Aktualna cena (Stooq): {current_price:.2f}")
-                        print(f"  Spadek: {spadek:.2f}%")
-                        
-                        if ticker not in alerted_types_today:
-                            alerted_types_today[ticker] = set()
-                        
-                        alert_code = alert_color_name(spadek)
-                        
-                        if alert_code and alert_code not in alerted_types_today[ticker]:
-                            alerted_types_today[ticker].add(alert_code)
-                            msg = (
-                                f"{alert_code}: !!! <b>{ticker}</b> !!! [Stooq]\n"
-                                f"Wczorajsze zamknięcie: {prev_close:.2f}\n"
-                                f"Aktualna cena: {current_price:.2f}\n"
-                                f"Spadek: {spadek:.2f}%\n"
-                                f"Czas: {last_update_str}"
-                            )
-                            print(f"[SENDING ALERT - STOOQ] {msg}")
-                            send_telegram_message(msg)
-                    else:
-                        print(f"  ⚠️ Wczorajsze zamknięcie jest NaN, brak danych w Stooq - pomijam {ticker}")
+    # === WARSTWY ODPYTYWANIA: duży ruch w sesji - ticker sprawdzany najczęściej do końca sesji ===
+    if tiers is not None:
+        move = np.fmax(np.abs(spadek), drawdown)
+        for i in tiers.promote(move):
+            print(f"[TIERS] {exchange}: {tickers_for_exchange[i]} → warstwa {TIER_NAMES[MY_TIER]} "
+                  f"do końca sesji (ruch {move[i]:.2f}%)")
 
-                    continue
-                else:
-                    missing_data_tickers.append(ticker)
-                    continue
 
-            # Potrzebujemy minimum 2 świec: ostatnia (dzisiejsza niekompletna) i przedostatnia (wczorajsze zamknięcie)
-            if len(df_daily) < 2:
-                print(f"⚠️ Za mało danych dziennych dla {ticker}: tylko {len(df_daily)} świec (wymagane: 2)")
-                
-                # Sprawdź fallback Stooq
-                if ticker in stooq_data:
-                    print(f"  → Próba użycia Stooq jako zamiennika")
-                    continue
-                else:
-                    missing_data_tickers.append(ticker)
-                    continue
-            
-            if len(df_realtime) < 1:
-                print(f"⚠️ Za mało danych real-time dla {ticker}: tylko {len(df_realtime)} świec")
-                
-                # Sprawdź fallback Stooq
-                if ticker in stooq_data:
-                    print(f"  → Próba użycia Stooq jako zamiennika")
-                    # Użyj logiki Stooq z powyższego bloku
-                    continue
-                else:
-                    missing_data_tickers.append(ticker)
-                    continue
+def getAnalizeResult(df, ticker):
+    """Surowy wynik analizy technicznej: (ScoreResult, ocena krzywych kroczących) - bez tekstu."""
+    result = cached_score(ticker, df)
+    ma_results = cached_moving_averages_signals(ticker, df)
+    return result, ma_results['overall_summary']['signal']
 
-            if ticker not in alerted_types_today:
-                alerted_types_today[ticker] = set()
 
-            # === ALERT CENOWY REAL-TIME (YAHOO) ===
-            # Poprzednie zamknięcie = ostatni pełny dzień (wczoraj)
-            prev_close = get_previous_close(ticker) #float(df_daily['Close'].iloc[-1])
-            
-            # **KLUCZOWE: Sprawdź czy prev_close nie jest NaN**
-            if pd.isna(prev_close):
-                print(f"\n⚠️ {ticker}: Wczorajsze zamknięcie jest NaN")
-                
-                # Sprawdź czy Stooq ma dane
-                if ticker in stooq_data:
-                    print(f"  → Używam Stooq jako zamiennika")
-                    stooq_ticker_data = stooq_data[ticker]
-                    current_price = stooq_ticker_data['close']
-                    last_update_str = f"{stooq_ticker_data['date']} {stooq_ticker_data['time']}"
-                    
-                    print(f"  Aktualna cena (Stooq): {current_price:.2f}")
-                    print(f"  Czas: {last_update_str}")
-                    print(f"  ⚠️ Brak wczorajszego zamknięcia - pomijam alerty spadków")
-                    continue
-                else:
-                    missing_data_tickers.append(ticker)
-                    continue
+def getAnalizeCodes(result, movingRate):
+    return str(movingRate) + 'm', str(result.rate) + 's'
 
-            # Aktualna cena = ostatnia świeca 5-minutowa (teraz)
-            current_price = float(df_realtime['Close'].iloc[-1])
-            
-            # **KLUCZOWE: Sprawdź czy current_price nie jest NaN**
-            if pd.isna(current_price):
-                print(f"\n⚠️ {ticker}: Aktualna cena jest NaN w Yahoo")
-                print(f"\n⚠️  stooq_data: {stooq_data}")
-                tickerSq = ticker.replace('.WA', '')
-                # Sprawdź czy Stooq ma dane
-                if tickerSq in stooq_data:
-                    print(f"  → Używam Stooq jako zamiennika")
-                    stooq_ticker_data = stooq_data[tickerSq]
-                    current_price = stooq_ticker_data['close']
-                    spadek = ((prev_close - current_price) / prev_close) * 100
-                    
-                    last_update_str = f"{stooq_ticker_data['date']} {stooq_ticker_data['time']}"
-                    
-                    print(f"\n[ALERT CHECK - HYBRID] {ticker} @ {last_update_str}:")
-                    print(f"  Wczorajsze zamknięcie (Yahoo): {prev_close:.2f}")
-                    print(f"  Aktualna cena (Stooq): {current_price:.2f}")
-                    print(f"  Spadek: {spadek:.2f}%")
-                    
-                    alert_code = alert_color_name(spadek)
-                    
-                    if alert_code and alert_code not in alerted_types_today[ticker]:
-                        alerted_types_today[ticker].add(alert_code)
-                        msg = (
-                            f"{alert_code}: !!! <b>{ticker}</b> !!! [Yahoo+Stooq]\n"
-                            f"Wczorajsze zamknięcie: {prev_close:.2f}\n"
-                            f"Aktualna cena: {current_price:.2f}\n"
-                            f"Spadek: {spadek:.2f}%\n"
-                            f"Czas: {last_update_str}"
-                        )
-                        print(f"[SENDING ALERT - HYBRID] {msg}")
-                        send_telegram_message(msg)
-                    
-                    continue
-                else:
-                    missing_data_tickers.append(ticker)
-                    continue
-            
-            # Timestamp ostatniej aktualizacji
-            last_update = df_realtime.index[-1]
-            
-            # Oblicz spadek względem wczorajszego zamknięcia
-            spadek = ((prev_close - current_price) / prev_close) * 100
-
-            # Debug info
-            print(f"\n[ALERT CHECK] {ticker} @ {last_update.strftime('%H:%M:%S')}:")
-            print(f"  Wczorajsze zamknięcie: {prev_close:.2f}")
-            print(f"  Aktualna cena (real-time): {current_price:.2f}")
-            print(f"  Spadek: {spadek:.2f}%")
-            print(f"  Już wysłane alerty: {alerted_types_today.get(ticker, set())}")
-
-            alert_code = alert_color_name(spadek)
-            print(f"  Typ alertu: {alert_code if alert_code else 'brak (poniżej progu)'}")
-
-            if alert_code and alert_code not in alerted_types_today[ticker]:
-                alerted_types_today[ticker].add(alert_code)
-                msg = (
-                    f"{alert_code}: !!! <b>{ticker}</b> !!!\n"
-                    f"Wczorajsze zamknięcie: {prev_close:.2f}\n"
-                    f"Aktualna cena: {current_price:.2f}\n"
-                    f"Spadek: {spadek:.2f}%\n"
-                    f"Czas: {last_update.strftime('%H:%M:%S')}"
-                )
-                print(f"[SENDING ALERT] {msg}")
-                send_telegram_message(msg)
-            else:
-                if alert_code:
-                    print(f"  → Alert NIE wysłany (już był wysłany: {alert_code})")
-                else:
-                    print(f"  → Alert NIE wysłany (spadek {spadek:.2f}% poniżej progu)")
 
-            # === ANALIZA TECHNICZNA (jeśli włączona) ===
-            if (ticker in MY_TICKERS or ticker in OBSERVABLE_TICKERS) and activeAnalize:
-                try:
-                    histAT = download_with_retry_onlyAt(ticker)
-                    alert_code_m, alert_code_s, msg, _details = getAnalizeMsg(histAT, ticker)
+def formatAnalizeMsg(ticker, result, movingRate):
+    """Tekst wiadomości - budowany dopiero, gdy faktycznie wysyłamy."""
+    msg = f"Wskaźniki dla: <b>{ticker}</b>:\n"
+    msg_s = f"Trend: {RATING_LABELS.get(result.rate)}\n"
+    msg_m = f"Krzywe kroczące: {RATING_LABELS.get(movingRate)}"
+    return msg + msg_s + msg_m
 
-                    sendMessage = (alert_code_s not in alerted_types_today[ticker]
-                                   or alert_code_m not in alerted_types_today[ticker])
 
-                    if alert_code_s not in alerted_types_today[ticker]:
-                        alerted_types_today[ticker].add(alert_code_s)
+def getAnalizeMsg(df, ticker):
+    result, movingRate = getAnalizeResult(df, ticker)
+    alert_code_m, alert_code_s = getAnalizeCodes(result, movingRate)
+    return alert_code_m, alert_code_s, formatAnalizeMsg(ticker, result, movingRate), result.details()
 
-                    if alert_code_m not in alerted_types_today[ticker]:
-                        alerted_types_today[ticker].add(alert_code_m)
 
-                    if sendMessage:
-                        send_telegram_message(msg)
-                except Exception as e:
-                    print(f"[ERROR] Błąd analizy technicznej dla {ticker}: {e}")
+# ----------------------
+# HARMONOGRAM ZDARZEŃ GIEŁD
+# ----------------------
 
-        except Exception as ex:
-            print(f"[ERROR] Błąd dla {ticker}: {ex}")
-            import traceback
-            traceback.print_exc()
-            missing_data_tickers.append(ticker)
+def flush_outbox():
+    # Wszystkie powiadomienia z zadania bieżącego wątku - scalone, czerwone alerty pierwsze
+    sent = outbox().flush()
+    if sent:
+        print(f"[TG] Do wysłania {sent} wiadomości (w kolejkach: {notifier.pending()})")
 
-    if missing_data_tickers:
-        send_telegram_message(f"❗ Brak danych dla: {', '.join(missing_data_tickers)}")
-        
-def getAnalizeMsg(df, ticker):
-    rate, details = getScoreWithDetails(df)
-    ma_results = calculate_moving_averages_signals(df)
-    movingRate = ma_results['overall_summary']['signal']
-    alert_code_m = str(movingRate) + 'm'
-    alert_code_s = str(rate) + 's'
 
-    msg = f"Wskaźniki dla: <b>{ticker}</b>:\n"
-    msg_s = f"Trend: {RATING_LABELS.get(rate)}\n"
-    msg_m = f"Krzywe kroczące: {RATING_LABELS.get(movingRate)}"
-    msg = msg + msg_s + msg_m
-    return alert_code_m, alert_code_s, msg, details
+def schedule_exchange(scheduler, exchange):
+    """Planuje rozgrzewkę i otwarcie najbliższej sesji giełdy (otwarcie od razu, gdy sesja trwa)."""
+    if exchange not in EXCHANGE_HOURS:
+        # giełda bez znanych godzin - traktowana jak stale otwarta
+        scheduler.schedule_in(0, lambda: price_check(scheduler, exchange, None), f"{exchange} ceny")
+        return
+    open_at, close_at = next_session(exchange)
+    now = time.time()
+    warmup_at = open_at.timestamp() - PRE_OPEN_WARMUP
+    if warmup_at > now:
+        scheduler.schedule(warmup_at, lambda: submit_exchange_task(exchange, lambda: warm_up(exchange), "rozgrzewka"),
+                           f"{exchange} rozgrzewka")
+    scheduler.schedule(max(open_at.timestamp(), now), lambda: exchange_opened(scheduler, exchange, close_at),
+                       f"{exchange} otwarcie")
+
+
+# Pula sprawdzeń cen - tworzona w procesie pętli (main_loop); zajęte giełdy nie są zlecane ponownie
+price_check_pool = None
+running_checks = set()
+running_checks_lock = threading.Lock()
+
+
+def submit_exchange_task(exchange, task, name):
+    """
+    Zleca zadanie giełdy (sprawdzenie cen, rozgrzewkę) do wspólnej puli, o ile poprzednie
+    zadanie tej giełdy już się skończyło - wolna giełda nie opóźnia pozostałych.
+    """
+    with running_checks_lock:
+        if exchange in running_checks:
+            print(f"[{datetime.now()}] {exchange}: poprzednie zadanie jeszcze trwa - pomijam {name}")
+            return False
+        running_checks.add(exchange)
+
+    def run():
+        try:
+            task()
+        except Exception as e:
+            print(f"[ERROR] {exchange}: błąd zadania {name}: {e}")
+        finally:
+            # alerty są już zapisane w AlertStore - wysyłamy je także po błędzie w dalszej części zadania
+            flush_outbox()
+            with running_checks_lock:
+                running_checks.discard(exchange)
+
+    price_check_pool.submit(run)
+    return True
+
+
+def exchange_tiers(exchange, tickers):
+    """Warstwy odpytywania tickerów giełdy - od nowa w każdej sesji (awanse trwają do końca sesji)."""
+    return session_state(exchange, 'tiers', tickers, session_date(exchange),
+                         lambda: PollingTiers(tickers, MY_TICKERS, OBSERVABLE_TICKERS))
+
+
+def warm_up(exchange):
+    """Przed otwarciem: porządki w magazynie alertów i dane referencyjne, żeby pierwsze sprawdzenie było szybkie."""
+    tickers = [t for t, ex in TICKERS.items() if ex == exchange]
+    alert_store.expire()
+    previous_closes(tickers)
+    if alert_rules:
+        rule_history(exchange, tickers, session_date(exchange))
+
+
+def exchange_opened(scheduler, exchange, close_at):
+    # alerty są kluczowane datą sesji danej giełdy - nic nie czyścimy, tylko usuwamy stare sesje
+    alert_store.expire()
+    notify(f"🟢 {exchange} — otwarta. Bot działa i będzie monitorował tickery na tej giełdzie.")
+    flush_outbox()
+    scheduler.schedule(close_at, lambda: schedule_exchange(scheduler, exchange), f"{exchange} zamknięcie")
+    price_check(scheduler, exchange, close_at)
+
+
+def check_prices_task(exchange):
+    tickers = [t for t, ex in TICKERS.items() if ex == exchange]
+    tiers = exchange_tiers(exchange, tickers)
+    # tickery, którym minął interwał warstwy - pominięte (zajęta giełda) czekają do kolejnego taktu
+    due = tiers.due()
+    if not due.any():
+        return
+    tiers.mark(due)
+    layers = ", ".join(f"{name}: {int(np.sum(due & (tiers.tier == k)))}/{count}"
+                       for k, (name, count) in enumerate(zip(TIER_NAMES, tiers.counts())) if count)
+    print(f"[{datetime.now()}] Sprawdzam ceny dla giełdy {exchange} ({layers})")
+    check_prices_for_exchange(exchange, tiers, due)
+
+
+def price_check(scheduler, exchange, close_at):
+    """
+    Zleca sprawdzenie cen do puli i od razu planuje kolejne (o ile wypada przed zamknięciem) -
+    każda giełda ma własny zegar, niezależny od czasu trwania sprawdzeń innych giełd.
+    """
+    next_at = time.time() + PRICE_CHECK_INTERVAL
+    if close_at is None or next_at <= close_at.timestamp():
+        scheduler.schedule(next_at, lambda: price_check(scheduler, exchange, close_at), f"{exchange} ceny")
+    submit_exchange_task(exchange, lambda: check_prices_task(exchange), "sprawdzenie cen")
 
 
 def main_loop():
-    send_telegram_message("🚀 Bot giełdowy wystartował. Będę monitorował otwarcia giełd i ceny tam, gdzie giełdy są otwarte.")
-
-    # Zainicjuj last_price_check_ts
-    for ex in set(TICKERS.values()):
-        last_price_check_ts[ex] = 0
-
-    while True:
-        # 1) Sprawdź otwarcia giełd często (np. co OPEN_CHECK_INTERVAL)
-        market_open_watch()
-
-        # 2) Dla każdej giełdy, jeśli jest otwarta i minął interwał, sprawdź ceny
-        now_ts = time.time()
-        any_exchange_open = False
-        for ex in set(TICKERS.values()):
-            if is_exchange_open(ex):
-                any_exchange_open = True
-                # jeżeli minął interwał od ostatniego sprawdzenia tej giełdy
-                if now_ts - last_price_check_ts.get(ex, 0) >= PRICE_CHECK_INTERVAL:
-                    print(f"[{datetime.now()}] Sprawdzam ceny dla giełdy {ex}")
-                    check_prices_for_exchange(ex)
-                    last_price_check_ts[ex] = now_ts
-            else:
-                # giełda zamknięta -> nic nie robimy
-                pass
+    global price_check_pool, alert_store
+    alert_store = AlertStore()
+    notifier.start()
+    price_check_pool = ThreadPoolExecutor(max_workers=PRICE_CHECK_CONCURRENCY, thread_name_prefix="price-check")
+    send_notification("🚀 Bot giełdowy wystartował. Będę monitorował otwarcia giełd i ceny tam, gdzie giełdy są otwarte.")
+
+    # Kolejka najbliższych zdarzeń giełd - pętla śpi dokładnie do najbliższego z nich
+    scheduler = EventScheduler()
+    # SIGTERM (np. docker stop) kończy pętlę, a nie zabija procesu - niewysłane wiadomości trafiają do pliku
+    signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+    try:
+        for ex in sorted(set(TICKERS.values())):
+            schedule_exchange(scheduler, ex)
+        for when, name in scheduler.upcoming():
+            print(f"[SCHEDULER] {datetime.fromtimestamp(when)}: {name}")
+        scheduler.run()
+    finally:
+        shutdown()
 
-        # 3) Sleep: jeśli wszystkie giełdy zamknięte możemy spać dłużej (oszczędność)
-        if not any_exchange_open:
-            time.sleep(OFF_HOURS_SLEEP)
-        else:
-            time.sleep(OPEN_CHECK_INTERVAL)
+
+def shutdown():
+    """Zamknięcie procesu pętli: trwające sprawdzenia kończą się, a kolejki wysyłki zapisują się do spoolu."""
+    print(f"[{datetime.now()}] Zatrzymuję pętlę (w kolejkach: {notifier.pending()} wiadomości)")
+    price_check_pool.shutdown(wait=True, cancel_futures=True)
+    flush_outbox()
+    notifier.stop()
+    alert_store.close()
 
 
 def test():
@@ -786,7 +1022,7 @@ def test():
     except Exception as e:
         msg = f"❗ Błąd przy pobieraniu danych dla giełdy : {e}"
         print(msg)
-        send_telegram_message(msg)
+        send_notification(msg)
         return
     ticker = tickers_for_exchange[0]
 
@@ -942,9 +1178,9 @@ async def analyze(update, context):
         return
 
     _alert_code_m, _alert_code_s, msg, details = getAnalizeMsg(df, ticker)
-    await update.message.reply_text(msg, parse_mode='HTML')
-    if details:
-        await update.message.reply_text("\n".join(details), parse_mode="HTML")
+    # ocena i szczegóły w jednej wiadomości (jeśli mieszczą się w limicie)
+    for part in pack_messages([msg, "\n".join(details)] if details else [msg]):
+        await update.message.reply_text(part, parse_mode='HTML')
 
 # Test czy multiprocessing nie blokuje
 if __name__ == "__main__":
@@ -966,6 +1202,13 @@ if __name__ == "__main__":
         main_process.start()
         print(f"Main loop process started with PID: {main_process.pid}")
 
+        # SIGTERM trafia tylko do procesu głównego - przekazujemy go dalej, żeby procesy zamknęły się same
+        def stop_children(signum, frame):
+            for process in (bot_process, main_process):
+                if process.is_alive():
+                    process.terminate()
+        signal.signal(signal.SIGTERM, stop_children)
+
     except KeyboardInterrupt:
         print("Przerwano ręcznie.")
         if 'bot_process' in locals() and bot_process.is_alive():
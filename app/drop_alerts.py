@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Progi alertów spadkowych i ich klasyfikacja.
+
+Spadek liczony jest w procentach względem wczorajszego zamknięcia. alert_color_name ocenia
+pojedynczy spadek (pętla bota), drop_alert_levels - całą tablicę spadków naraz (backtest,
+wiele tickerów), z identycznymi granicami przedziałów.
+"""
+import os
+
+import numpy as np
+
+# Progi alertów (w procentach)
+DROP_THRESHOLDS = {
+    "czerwony": float(os.getenv("ALERT_THRESHOLD_RED", "10.0")),
+    "zolty": float(os.getenv("ALERT_THRESHOLD_YELLOW", "7.0")),
+    "zielony": float(os.getenv("ALERT_THRESHOLD_GREEN", "5.0"))
+}
+
+# Kody poziomów alertu (0 = brak alertu)
+NO_ALERT = 0
+GREEN = 1
+YELLOW = 2
+RED = 3
+
+ALERT_NAMES = {
+    RED: "🔴 CZERWONY ALERT",
+    YELLOW: "🟡 ŻÓŁTY ALERT",
+    GREEN: "🟢 ZIELONY ALERT",
+}
+
+
+def drop_percent(prev_close, price):
+    """Spadek w % względem wczorajszego zamknięcia (dodatni = cena niższa)."""
+    prev_close = np.asarray(prev_close, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (prev_close - np.asarray(price, dtype=float)) / prev_close * 100
+
+
+def drop_alert_levels(spadek, thresholds=None):
+    """
+    Poziom alertu (NO_ALERT/GREEN/YELLOW/RED) dla każdego spadku - jak alert_color_name.
+
+    Args:
+        spadek: tablica spadków w %; NaN daje NO_ALERT
+        thresholds: słownik progów jak DROP_THRESHOLDS (domyślnie bieżące progi)
+    """
+    t = DROP_THRESHOLDS if thresholds is None else thresholds
+    spadek = np.asarray(spadek, dtype=float)
+    with np.errstate(invalid='ignore'):
+        return np.select(
+            [spadek >= t["czerwony"],
+             (t["zolty"] <= spadek) & (spadek < t["czerwony"]),
+             (t["zielony"] <= spadek) & (spadek < t["zolty"])],
+            [RED, YELLOW, GREEN],
+            default=NO_ALERT,
+        ).astype(np.int8)
+
+
+def alert_color_name(spadek, thresholds=None):
+    """Zwraca nagłówek alertu wg progów lub None."""
+    t = DROP_THRESHOLDS if thresholds is None else thresholds
+    if spadek >= t["czerwony"]:
+        return ALERT_NAMES[RED]
+    if t["zolty"] <= spadek < t["czerwony"]:
+        return ALERT_NAMES[YELLOW]
+    if t["zielony"] <= spadek < t["zolty"]:
+        return ALERT_NAMES[GREEN]
+    return None
+
+
+def classify_drops(prev_close, price, thresholds=None):
+    """
+    Spadki i poziomy alertów dla wszystkich tickerów naraz.
+
+    Returns:
+        (spadek, poziomy, indeksy tickerów z alertem) - tylko te trafiają do powiadomień
+    """
+    spadek = drop_percent(prev_close, price)
+    levels = drop_alert_levels(spadek, thresholds)
+    return spadek, levels, np.flatnonzero(levels != NO_ALERT)
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+Backtest progów alertów spadkowych (DROP_THRESHOLDS) na danych historycznych.
+
+Historia dzienna i śródsesyjna (świece 5m, tak jak w check_prices_for_exchange) jest pobierana
+raz i trzymana w plikach CSV w katalogu danych; kolejne uruchomienia tylko dopisują nowe świece,
+więc historia śródsesyjna rośnie ponad 60-dniowy limit Yahoo.
+
+Odtwarzanie odpowiada pętli bota: każda świeca śródsesyjna to jedno sprawdzenie ceny, spadek
+liczony jest względem zamknięcia poprzedniej sesji, poziom alertu - logiką alert_color_name,
+a każdy typ alertu wysyłany jest najwyżej raz na ticker i sesję (jak AlertStore w bocie).
+Dni bez danych śródsesyjnych odtwarzane są z dziennego minimum (Low): zakładamy, że cena
+przeszła przez każdy próg do najgłębszego osiągniętego, a alert padł dokładnie na progu.
+
+Wszystkie zestawy progów liczone są naraz (broadcasting), tickery - równolegle w puli procesów.
+Raport: liczba alertów dla każdego zestawu progów i poziomu oraz stopy zwrotu po alercie
+(do zamknięcia sesji i po N sesjach).
+
+Użycie:
+    python app/drop_backtest.py CDR.WA PKN.WA AAPL --data-dir historia/ --sets "10,7,5;12,8,5"
+    python app/drop_backtest.py --refresh --horizons 1,5,20 --out alerty.csv
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from drop_alerts import (DROP_THRESHOLDS, ALERT_NAMES, NO_ALERT, GREEN, YELLOW, RED,
+                         drop_percent, drop_alert_levels)
+from ohlcv_panel import OHLCVPanel
+from parameter_sweep import env_tickers
+
+DATA_DIR = os.getenv("BACKTEST_DATA_DIR", "historia")
+DAILY_PERIOD = "5y"
+INTRADAY_INTERVAL = "5m"
+INTRADAY_PERIOD = "60d"
+DEFAULT_HORIZONS = (1, 5, 20)
+
+# Zestawy progów (czerwony, żółty, zielony) porównywane z bieżącymi DROP_THRESHOLDS
+DEFAULT_THRESHOLD_SETS = [
+    (DROP_THRESHOLDS["czerwony"], DROP_THRESHOLDS["zolty"], DROP_THRESHOLDS["zielony"]),
+    (8.0, 6.0, 4.0),
+    (12.0, 9.0, 6.0),
+    (15.0, 10.0, 5.0),
+]
+
+
+# ----------------------
+# DANE LOKALNE
+# ----------------------
+
+def exchange_timezone(ticker):
+    """Strefa czasowa sesji - sesja (dzień) liczona jest w czasie lokalnym giełdy."""
+    return "Europe/Warsaw" if ticker.endswith(".WA") else "US/Eastern"
+
+
+def history_path(data_dir, ticker, interval):
+    return os.path.join(data_dir, f"{ticker}.{interval}.csv")
+
+
+def load_history(data_dir, ticker, interval):
+    """Świece dzienne - indeks dat sesji (bez strefy); śródsesyjne - czas UTC."""
+    path = history_path(data_dir, ticker, interval)
+    if not os.path.exists(path):
+        return None
+    df = pd.read_csv(path, index_col=0)
+    df.index = pd.to_datetime(df.index) if interval == "1d" else pd.to_datetime(df.index, utc=True)
+    return df
+
+
+def save_history(data_dir, ticker, interval, df):
+    """Dopisuje świece do pliku (nowsze wartości zastępują stare dla tego samego czasu)."""
+    df = df.dropna(how='all')
+    index = pd.DatetimeIndex(df.index)
+    if interval == "1d":
+        # data sesji w czasie giełdy (Yahoo zwraca północ czasu lokalnego albo datę bez strefy)
+        df.index = (index.tz_localize(None) if index.tz is not None else index).normalize()
+    else:
+        df.index = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+    existing = load_history(data_dir, ticker, interval)
+    if existing is not None:
+        df = pd.concat([existing, df])
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+    os.makedirs(data_dir, exist_ok=True)
+    df.to_csv(history_path(data_dir, ticker, interval))
+    return df
+
+
+def fetch_history(tickers, data_dir=DATA_DIR, refresh=False, intraday_interval=INTRADAY_INTERVAL):
+    """
+    Historia dzienna i śródsesyjna z plików; brakujące (lub wszystkie przy refresh) pobiera
+    jednym zapytaniem na interwał i zapisuje.
+
+    Returns:
+        dict: {ticker: (daily DataFrame, intraday DataFrame lub None)}
+    """
+    for interval, period in (("1d", DAILY_PERIOD), (intraday_interval, INTRADAY_PERIOD)):
+        missing = [t for t in tickers if refresh or not os.path.exists(history_path(data_dir, t, interval))]
+        if not missing:
+            continue
+        print(f"📥 Pobieram {interval} ({period}) dla {len(missing)} tickerów")
+        hist = yf.download(missing, period=period, interval=interval, group_by="ticker",
+                           threads=True, progress=False)
+        panel = OHLCVPanel.from_yfinance(hist, missing, dtype="float64")
+        for ticker in missing:
+            if ticker in panel and panel.has_data(ticker):
+                save_history(data_dir, ticker, interval, panel[ticker].copy())
+            else:
+                print(f"⚠️ {ticker}: brak danych {interval}")
+
+    history = {}
+    for ticker in tickers:
+        daily = load_history(data_dir, ticker, "1d")
+        if daily is None or daily.empty:
+            continue
+        history[ticker] = (daily, load_history(data_dir, ticker, intraday_interval))
+    return history
+
+
+# ----------------------
+# ODTWARZANIE
+# ----------------------
+
+def threshold_arrays(threshold_sets):
+    """Zestawy (czerwony, żółty, zielony) jako słownik progów z osią zestawów (S, 1)."""
+    sets = np.asarray(threshold_sets, dtype=float)
+    return {"czerwony": sets[:, 0:1], "zolty": sets[:, 1:2], "zielony": sets[:, 2:3]}
+
+
+def first_per_session(levels, session_start, level):
+    """Maska pierwszego wystąpienia poziomu w każdej sesji - deduplikacja per sesja dla całej historii."""
+    hit = levels == level
+    counts = np.cumsum(hit, axis=-1)
+    before = np.where(session_start > 0, counts[..., np.maximum(session_start - 1, 0)], 0)
+    return hit & (counts - before == 1)
+
+
+def session_layout(sessions):
+    """Dla posortowanych dat sesji: indeks pierwszej świecy sesji, do której należy każda świeca."""
+    sessions = np.asarray(sessions)
+    new_session = np.r_[True, sessions[1:] != sessions[:-1]]
+    return np.maximum.accumulate(np.where(new_session, np.arange(len(sessions)), 0))
+
+
+def replay_intraday(daily_close, daily_sessions, intraday, sessions, thresholds):
+    """
+    Alerty ze świec śródsesyjnych.
+
+    Returns:
+        (zestaw, poziom, pozycja świecy, spadek, cena) dla każdego alertu
+    """
+    close = intraday['Close'].to_numpy(dtype=float)
+    # zamknięcie poprzedniej sesji: ostatnia świeca dzienna z datą wcześniejszą niż sesja
+    prev_pos = np.searchsorted(daily_sessions, sessions, side='left') - 1
+    prev_close = np.where(prev_pos >= 0, daily_close[np.maximum(prev_pos, 0)], np.nan)
+    spadek = drop_percent(prev_close, close)
+    levels = drop_alert_levels(spadek[None, :], thresholds)
+
+    starts = session_layout(sessions)
+    out = []
+    for level in ALERT_NAMES:
+        set_idx, bar_idx = np.nonzero(first_per_session(levels, starts, level))
+        out.append((set_idx, np.full(len(bar_idx), level), bar_idx, spadek[bar_idx], close[bar_idx]))
+    return [np.concatenate(parts) for parts in zip(*out)]
+
+
+def replay_daily(daily, thresholds):
+    """
+    Alerty z dziennego minimum - dla sesji bez danych śródsesyjnych.
+
+    Każdy poziom do najgłębszego osiągniętego liczy się raz, cena alertu = cena progu.
+    """
+    close = daily['Close'].to_numpy(dtype=float)
+    prev_close = np.r_[np.nan, close[:-1]]
+    deepest = drop_percent(prev_close, daily['Low'].to_numpy(dtype=float))
+    levels = drop_alert_levels(deepest[None, :], thresholds)
+
+    out = []
+    for level, key in ((RED, "czerwony"), (YELLOW, "zolty"), (GREEN, "zielony")):
+        set_idx, bar_idx = np.nonzero(levels >= level)
+        spadek = thresholds[key][set_idx, 0]
+        out.append((set_idx, np.full(len(bar_idx), level), bar_idx, spadek,
+                    prev_close[bar_idx] * (1 - spadek / 100)))
+    return [np.concatenate(parts) for parts in zip(*out)]
+
+
+def forward_returns(daily_close, session_pos, price, horizons):
+    """Stopy zwrotu od ceny alertu: do zamknięcia sesji alertu i po N kolejnych sesjach."""
+    n = len(daily_close)
+    out = {'ret_close': daily_close[session_pos] / price - 1}
+    for horizon in horizons:
+        target = session_pos + horizon
+        valid = target < n
+        out[f'ret_{horizon}d'] = np.where(valid, daily_close[np.minimum(target, n - 1)] / price - 1, np.nan)
+    return out
+
+
+def backtest_ticker(job):
+    """Pracownik puli procesów: wszystkie zestawy progów dla jednego tickera."""
+    ticker, daily, intraday, intraday_interval, threshold_sets, horizons = job
+    tz = exchange_timezone(ticker)
+    thresholds = threshold_arrays(threshold_sets)
+
+    daily = daily.dropna(subset=['Close'])
+    daily_sessions = daily.index.normalize().to_numpy()
+    daily_close = daily['Close'].to_numpy(dtype=float)
+
+    frames = []
+    covered = np.zeros(len(daily), dtype=bool)
+    if intraday is not None and not intraday.empty:
+        intraday = intraday.dropna(subset=['Close'])
+        local = intraday.index.tz_convert(tz)
+        sessions = local.tz_localize(None).normalize().to_numpy()
+        set_idx, level, bar_idx, spadek, price = replay_intraday(
+            daily_close, daily_sessions, intraday, sessions, thresholds)
+        # sesja alertu musi mieć świecę dzienną (zamknięcie sesji do stóp zwrotu)
+        session_pos = np.searchsorted(daily_sessions, sessions[bar_idx])
+        keep = (session_pos < len(daily_sessions)) & \
+            (daily_sessions[np.minimum(session_pos, len(daily_sessions) - 1)] == sessions[bar_idx])
+        covered[np.searchsorted(daily_sessions, np.intersect1d(sessions, daily_sessions))] = True
+        frames.append(pd.DataFrame({
+            'set': set_idx[keep], 'level': level[keep], 'time': local[bar_idx[keep]].tz_localize(None),
+            'source': intraday_interval, 'drop': spadek[keep], 'price': price[keep],
+            **forward_returns(daily_close, session_pos[keep], price[keep], horizons)}))
+
+    set_idx, level, bar_idx, spadek, price = replay_daily(daily, thresholds)
+    keep = ~covered[bar_idx]
+    frames.append(pd.DataFrame({
+        'set': set_idx[keep], 'level': level[keep], 'time': daily_sessions[bar_idx[keep]],
+        'source': '1d', 'drop': spadek[keep], 'price': price[keep],
+        **forward_returns(daily_close, bar_idx[keep], price[keep], horizons)}))
+
+    alerts = pd.concat(frames, ignore_index=True)
+    alerts.insert(0, 'ticker', ticker)
+    return alerts
+
+
+def run_backtest(history, threshold_sets=DEFAULT_THRESHOLD_SETS, horizons=DEFAULT_HORIZONS, workers=None,
+                 intraday_interval=INTRADAY_INTERVAL):
+    """
+    Args:
+        history: dict {ticker: (daily, intraday)} z fetch_history
+        threshold_sets: lista (czerwony, żółty, zielony) w %
+        intraday_interval: interwał świec śródsesyjnych w history (jak w fetch_history)
+
+    Returns:
+        pd.DataFrame: wszystkie alerty (ticker, zestaw, poziom, czas, spadek, cena, stopy zwrotu)
+    """
+    jobs = [(ticker, daily, intraday, intraday_interval, threshold_sets, horizons)
+            for ticker, (daily, intraday) in history.items()]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(backtest_ticker, jobs))
+    if not results:
+        return pd.DataFrame()
+    alerts = pd.concat(results, ignore_index=True)
+    alerts = alerts[alerts['level'] != NO_ALERT]
+    return alerts.sort_values(['set', 'ticker', 'time', 'level'], ignore_index=True)
+
+
+def summarize(alerts, threshold_sets, horizons=DEFAULT_HORIZONS):
+    """Liczba alertów i stopy zwrotu po alercie dla każdego zestawu progów i poziomu."""
+    columns = ['ret_close'] + [f'ret_{h}d' for h in horizons]
+    rows = []
+    for (set_idx, level), group in alerts.groupby(['set', 'level']):
+        red, yellow, green = threshold_sets[set_idx]
+        row = {'thresholds': f"{red:g}/{yellow:g}/{green:g}", 'alert': ALERT_NAMES[level],
+               'alerts': len(group), 'tickers': group['ticker'].nunique(),
+               'intraday': int((group['source'] != '1d').sum())}
+        for column in columns:
+            values = group[column].dropna()
+            row[f'{column}_mean'] = values.mean() if len(values) else np.nan
+            row[f'{column}_up'] = (values > 0).mean() if len(values) else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def parse_threshold_sets(text):
+    """'10,7,5;12,8,5' -> [(10.0, 7.0, 5.0), (12.0, 8.0, 5.0)]"""
+    sets = []
+    for part in text.split(";"):
+        red, yellow, green = (float(v) for v in part.split(","))
+        if not red > yellow > green:
+            raise ValueError(f"Progi muszą maleć (czerwony > żółty > zielony): {part}")
+        sets.append((red, yellow, green))
+    return sets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest progów alertów spadkowych")
+    parser.add_argument("tickers", nargs="*", help="tickery (domyślnie z TICKERS_* w ENV)")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--refresh", action="store_true", help="dopobierz nowe świece do plików")
+    parser.add_argument("--sets", default=None, help="zestawy progów, np. '10,7,5;12,8,5'")
+    parser.add_argument("--horizons", default=",".join(str(h) for h in DEFAULT_HORIZONS))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default=None, help="plik CSV ze wszystkimi alertami")
+    args = parser.parse_args()
+
+    tickers = args.tickers or env_tickers()
+    if not tickers:
+        raise SystemExit("Podaj tickery lub ustaw TICKERS_* w ENV.")
+    threshold_sets = parse_threshold_sets(args.sets) if args.sets else DEFAULT_THRESHOLD_SETS
+    horizons = tuple(int(h) for h in args.horizons.split(","))
+
+    start = time.time()
+    history = fetch_history(tickers, args.data_dir, args.refresh)
+    print(f"📂 Historia dla {len(history)}/{len(tickers)} tickerów w {time.time() - start:.1f}s")
+
+    start = time.time()
+    alerts = run_backtest(history, threshold_sets, horizons, args.workers)
+    print(f"⚙️ {len(threshold_sets)} zestawów progów x {len(history)} tickerów w {time.time() - start:.1f}s")
+    if alerts.empty:
+        print("Brak alertów w historii.")
+        return
+
+    report = summarize(alerts, threshold_sets, horizons)
+    with pd.option_context('display.max_rows', None, 'display.width', 200,
+                           'display.float_format', '{:.4f}'.format):
+        print(report.to_string(index=False))
+
+    if args.out:
+        alerts.to_csv(args.out, index=False)
+        print(f"\n💾 Zapisano alerty: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
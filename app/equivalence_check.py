@@ -0,0 +1,852 @@
+# -*- coding: utf-8 -*-
+"""
+Sprawdzenie równoważności implementacji wskaźników z implementacjami odniesienia.
+
+Backendy indicator_kernels (pandas / numpy / numba) i silnik średnich kroczących muszą dawać
+te same sygnały co oryginalne funkcje sprzed refaktoryzacji - inaczej użytkownicy dostaną inne alerty.
+Odniesieniem są skopiowane tu pierwotne calculate_* (sekcja REFERENCJA), a nie kod z ticker_analizer
+uruchomiony z backendem 'pandas'. Skrypt liczy każdy wskaźnik z rejestru na losowych i zapisanych
+danych OHLCV, wprost i przez wspólny cache (jak analyze_stock_df):
+- wartości muszą zgadzać się z tolerancją (rtol/atol),
+- sygnały kupuj/sprzedaj/neutralny muszą być identyczne (ostatnia świeca i seria per świeca),
+a na końcu raportuje przyspieszenie dla każdego wskaźnika.
+
+Użycie:
+    python app/equivalence_check.py --random 50 --bars 2500
+    python app/equivalence_check.py --data-dir historia/ --tickers CDR.WA,AAPL --save-dir historia/
+"""
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import indicator_kernels
+from indicator_kernels import use_backend, NUMBA_AVAILABLE
+from moving_analizer import calculate_moving_averages_signals, DEFAULT_PERIODS, RIBBON_PERIODS
+from ticker_analizer import (active_indicators, indicator_signal_series, run_indicator, download_with_retry,
+                             ADX_TREND_THRESHOLD)
+
+RTOL = 1e-7
+ATOL = 1e-9
+
+
+def random_ohlcv(bars, seed):
+    """Losowe OHLCV z przypadkami brzegowymi: luki (NaN), płaskie odcinki, high == low, zerowy wolumen."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, rng.uniform(0.005, 0.04), bars)))
+    open_ = close * (1 + rng.normal(0, 0.01, bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, bars)))
+    volume = rng.lognormal(12, 1, bars).round()
+
+    flat = rng.integers(0, bars - 20)
+    close[flat:flat + 10] = open_[flat:flat + 10] = high[flat:flat + 10] = low[flat:flat + 10] = close[flat]
+    doji = rng.choice(bars, size=max(1, bars // 200), replace=False)
+    high[doji] = low[doji] = open_[doji] = close[doji]
+    volume[rng.choice(bars, size=max(1, bars // 300), replace=False)] = 0
+
+    df = pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume},
+                      index=pd.bdate_range('2000-01-03', periods=bars))
+    gaps = rng.choice(np.arange(50, bars), size=max(1, bars // 500), replace=False)
+    df.iloc[gaps] = np.nan
+    return df
+
+
+def recorded_datasets(data_dir):
+    datasets = {}
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.csv"))):
+        df = pd.read_csv(path, index_col=0, parse_dates=True)
+        datasets[os.path.splitext(os.path.basename(path))[0]] = df
+    return datasets
+
+
+def download_datasets(tickers, period, save_dir=None):
+    data = download_with_retry(tickers, period=period)
+    datasets = {}
+    for ticker in tickers:
+        df = data[ticker] if isinstance(data.columns, pd.MultiIndex) else data
+        df = df.dropna(how='all')
+        datasets[ticker] = df
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+            df.to_csv(os.path.join(save_dir, f"{ticker}.csv"))
+    return datasets
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    out = func(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+
+def _numeric_outputs(output):
+    return [o for o in output if isinstance(o, (pd.Series, np.ndarray))]
+
+
+def _compare_values(reference, candidate):
+    """Zwraca (liczba różnic poza tolerancją, maks. błąd bezwzględny)."""
+    ref = np.asarray(reference, dtype=float)
+    cand = np.asarray(candidate, dtype=float)
+    close = np.isclose(ref, cand, rtol=RTOL, atol=ATOL, equal_nan=True)
+    both = ~np.isnan(ref) & ~np.isnan(cand)
+    max_err = float(np.max(np.abs(ref[both] - cand[both]))) if both.any() else 0.0
+    return int((~close).sum()), max_err
+
+
+class Report:
+    def __init__(self):
+        self.rows = {}
+        self.failures = []
+
+    def add(self, name, backend, ref_time, fast_time, value_errors, max_err, signal_errors):
+        row = self.rows.setdefault((name, backend), {
+            'ref_time': 0.0, 'fast_time': 0.0, 'value_errors': 0, 'max_err': 0.0, 'signal_errors': 0})
+        row['ref_time'] += ref_time
+        row['fast_time'] += fast_time
+        row['value_errors'] += value_errors
+        row['max_err'] = max(row['max_err'], max_err)
+        row['signal_errors'] += signal_errors
+
+    def fail(self, message):
+        self.failures.append(message)
+
+    def print(self):
+        print(f"\n{'Wskaźnik':<22} {'backend':<7} {'odniesienie [ms]':>16} {'backend [ms]':>12} {'x':>7} "
+              f"{'maks. błąd':>11} {'wartości':>9} {'sygnały':>8}")
+        for (name, backend), row in self.rows.items():
+            speedup = row['ref_time'] / row['fast_time'] if row['fast_time'] else float('inf')
+            print(f"{name:<22} {backend:<7} {row['ref_time'] * 1000:>16.2f} {row['fast_time'] * 1000:>12.2f} "
+                  f"{speedup:>7.1f} {row['max_err']:>11.2e} {row['value_errors']:>9} {row['signal_errors']:>8}")
+
+
+# ----------------------
+# REFERENCJA
+# ----------------------
+# Implementacje odniesienia niezależne od indicator_kernels: 12 pierwotnych wskaźników to ciała
+# calculate_* z ticker_analizer sprzed wprowadzenia backendów (czyste pandas), a wskaźniki dodane
+# później mają tu własne wersje w pandas / czystym Pythonie - wygładzanie Wildera i Parabolic SAR
+# liczone wprost z definicji, a nie tym samym kodem co backend 'numpy'.
+
+def reference_rsi(df, period=14):
+    """RSI - Relative Strength Index z poprawioną logiką sygnałów"""
+    close = df['Close']
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+
+    avg_gain = gain.rolling(window=period).mean()
+    avg_loss = loss.rolling(window=period).mean()
+
+    # Zabezpieczenie przed dzieleniem przez zero
+    avg_loss = avg_loss.replace(0, 1e-10)
+
+    rs = avg_gain / avg_loss
+    rsi = 100 - (100 / (1 + rs))
+
+    # Sprawdzenie czy mamy wystarczająco danych
+    if len(rsi) < 5:
+        raise ValueError("Nie ma wystarczająco danych do obliczenia średniej z 4 poprzednich wartości RSI")
+
+    # Aktualna wartość RSI
+    latest_rsi = rsi.iloc[-1]
+
+    # Średnia z czterech poprzednich wartości RSI
+    previous_4_rsi_mean = rsi.iloc[-5:-1].mean()
+
+    # Logika sygnałów zgodnie z nowymi wymaganiami
+    if (25 <= latest_rsi <= 75) and (previous_4_rsi_mean < latest_rsi):
+        signal = "kupuj"
+    elif (25 <= latest_rsi <= 75) and (previous_4_rsi_mean > latest_rsi):
+        signal = "sprzedaj"
+    elif (45 <= latest_rsi <= 55) and (45 <= previous_4_rsi_mean <= 55):
+        signal = "neutralny"
+    elif latest_rsi > 75:  # rynek wykupiony
+        signal = "neutralny"
+    elif latest_rsi < 25:  # rynek wyprzedany
+        signal = "neutralny"
+    else:
+        signal = "neutralny"  # dla przypadków granicznych
+
+    return rsi, signal, latest_rsi
+
+
+def reference_stochastic(df, k_period=14, d_period=3):
+    """Stochastic Oscillator z poprawioną logiką sygnałów"""
+    high = df['High']
+    low = df['Low']
+    close = df['Close']
+
+    lowest_low = low.rolling(window=k_period).min()
+    highest_high = high.rolling(window=k_period).max()
+
+    k_percent = 100 * ((close - lowest_low) / (highest_high - lowest_low))
+    d_percent = k_percent.rolling(window=d_period).mean()
+
+    # Ocena według nowych kryteriów
+    latest_k = k_percent.iloc[-1]
+    latest_d = d_percent.iloc[-1]
+
+    # Sprawdzenie czy mamy wystarczająco danych do obliczenia średniej z 4 poprzednich wartości
+    if len(k_percent) >= 5:
+        # Średnia z czterech poprzednich wartości STS (k_percent)
+        avg_4_previous = k_percent.iloc[-5:-1].mean()
+    else:
+        # Jeśli nie ma wystarczająco danych, zwracamy neutralny sygnał
+        signal = "neutralny"
+        return k_percent, d_percent, signal, latest_k, latest_d
+
+    # Logika sygnałów według nowych kryteriów
+    if (20 <= latest_k <= 80) and (avg_4_previous < latest_k):
+        signal = "kupuj"
+    elif (20 <= latest_k <= 80) and (avg_4_previous > latest_k):
+        signal = "sprzedaj"
+    elif (45 <= latest_k <= 55) and (45 <= avg_4_previous <= 55):
+        signal = "neutralny"
+    elif latest_k > 80:  # rynek wykupiony
+        signal = "neutralny"
+    elif latest_k < 20:  # rynek wyprzedany
+        signal = "neutralny"
+    else:
+        signal = "neutralny"
+
+    return k_percent, d_percent, signal, latest_k, latest_d
+
+
+def reference_macd(df, fast=12, slow=26, signal_period=9):
+    """MACD - Moving Average Convergence Divergence"""
+    close = df['Close']
+    ema_fast = close.ewm(span=fast).mean()
+    ema_slow = close.ewm(span=slow).mean()
+
+    macd_line = ema_fast - ema_slow
+    signal_line = macd_line.ewm(span=signal_period).mean()
+    histogram = macd_line - signal_line
+
+    # Ocena
+    latest_macd = macd_line.iloc[-1]
+    latest_signal = signal_line.iloc[-1]
+    latest_hist = histogram.iloc[-1]
+    prev_hist = histogram.iloc[-2]
+
+    if latest_macd > latest_signal and latest_hist > prev_hist:
+        signal = "kupuj"
+    elif latest_macd < latest_signal and latest_hist < prev_hist:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
+
+    return macd_line, signal_line, histogram, signal, latest_macd
+
+
+def reference_trix(df, period=14, signal_period=9):
+    """TRIX - Triple Exponential Average"""
+    close = df['Close']
+    ema1 = close.ewm(span=period).mean()
+    ema2 = ema1.ewm(span=period).mean()
+    ema3 = ema2.ewm(span=period).mean()
+
+    trix = ema3.pct_change() * 10000
+    trix_signal = trix.ewm(span=signal_period).mean()
+
+    # Ocena
+    latest_trix = trix.iloc[-1]
+    latest_signal = trix_signal.iloc[-1]
+
+    if latest_trix > latest_signal and latest_trix > 0:
+        signal = "kupuj"
+    elif latest_trix < latest_signal and latest_trix < 0:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
+
+    return trix, trix_signal, signal, latest_trix
+
+
+def reference_williams_r(df, period=10):
+    """Williams %R z poprawioną logiką sygnałów"""
+    high = df['High']
+    low = df['Low']
+    close = df['Close']
+
+    highest_high = high.rolling(window=period).max()
+    lowest_low = low.rolling(window=period).min()
+
+    williams_r = -100 * ((highest_high - close) / (highest_high - lowest_low))
+
+    # Pobierz aktualną wartość %R
+    latest_wr = williams_r.iloc[-1]
+
+    # Oblicz średnią z czterech poprzednich wartości %R
+    if len(williams_r) >= 5:  # Potrzebujemy przynajmniej 5 wartości (4 poprzednie + aktualna)
+        avg_prev_4 = williams_r.iloc[-5:-1].mean()
+    else:
+        avg_prev_4 = None
+
+    # Logika sygnałów zgodnie z nowymi wymaganiami
+    if avg_prev_4 is not None and -80 <= latest_wr <= -20:
+        if avg_prev_4 > latest_wr:
+            signal = "sprzedaj"
+        elif avg_prev_4 < latest_wr:
+            signal = "kupuj"
+        else:
+            signal = "neutralny"
+    elif -55 <= latest_wr <= -45 and (avg_prev_4 is None or -55 <= avg_prev_4 <= -45):
+        signal = "neutralny"
+    elif latest_wr > -20:  # rynek wykupiony
+        signal = "neutralny"
+    elif latest_wr < -80:  # rynek wyprzedany
+        signal = "neutralny"
+    else:
+        signal = "neutralny"
+
+    return williams_r, signal, latest_wr
+
+
+def reference_cci(df, period=14):
+    """Commodity Channel Index"""
+    high = df['High']
+    low = df['Low']
+    close = df['Close']
+
+    typical_price = (high + low + close) / 3
+    sma = typical_price.rolling(window=period).mean()
+    mad = typical_price.rolling(window=period).apply(lambda x: np.mean(np.abs(x - x.mean())))
+
+    cci = (typical_price - sma) / (0.015 * mad)
+
+    # Ocena sygnału
+    latest_cci = cci.iloc[-1]
+
+    # Sprawdzenie czy mamy wystarczającą liczbę wartości do obliczenia średniej z 4 poprzednich
+    if len(cci) >= 5:
+        prev_4_avg = cci.iloc[-5:-1].mean()  # Średnia z 4 poprzednich wartości (bez aktualnej)
+    else:
+        # Jeśli nie mamy wystarczających danych, używamy dostępnych wartości
+        prev_4_avg = cci.iloc[:-1].mean() if len(cci) > 1 else latest_cci
+
+    # Logika sygnałów
+    if (-200 <= latest_cci <= 200) and (prev_4_avg < latest_cci):
+        signal = "kupuj"
+    elif (-200 <= latest_cci <= 200) and (prev_4_avg > latest_cci):
+        signal = "sprzedaj"
+    elif (-50 <= latest_cci <= 50) and (-50 <= prev_4_avg <= 50):
+        signal = "neutralny"
+    elif latest_cci > 200:
+        signal = "neutralny"  # rynek wykupiony
+    elif latest_cci < -200:
+        signal = "neutralny"  # rynek wyprzedany
+    else:
+        signal = "neutralny"
+
+    return cci, signal, latest_cci
+
+
+def reference_roc(df, period=15):
+    """Rate of Change"""
+    close = df['Close']
+    roc = ((close - close.shift(period)) / close.shift(period)) * 100
+
+    # Ocena
+    latest_roc = roc.iloc[-1]
+    if latest_roc > 0:
+        signal = "kupuj"
+    elif latest_roc < 0:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
+
+    return roc, signal, latest_roc
+
+
+def reference_ultimate_oscillator(df, period1=7, period2=14, period3=28):
+    """Ultimate Oscillator z ulepszonymi sygnałami"""
+    high = df['High']
+    low = df['Low']
+    close = df['Close']
+
+    true_low = np.minimum(low, close.shift(1))
+    buying_pressure = close - true_low
+    true_range = np.maximum(high, close.shift(1)) - true_low
+
+    bp_sum1 = buying_pressure.rolling(window=period1).sum()
+    tr_sum1 = true_range.rolling(window=period1).sum()
+
+    bp_sum2 = buying_pressure.rolling(window=period2).sum()
+    tr_sum2 = true_range.rolling(window=period2).sum()
+
+    bp_sum3 = buying_pressure.rolling(window=period3).sum()
+    tr_sum3 = true_range.rolling(window=period3).sum()
+
+    ult_osc = 100 * ((4 * (bp_sum1 / tr_sum1)) + (2 * (bp_sum2 / tr_sum2)) + (bp_sum3 / tr_sum3)) / 7
+
+    # Ocena według nowych kryteriów
+    latest_ult = ult_osc.iloc[-1]
+
+    # Sprawdź czy mamy wystarczająco danych do obliczenia średniej z 4 poprzednich wartości
+    if len(ult_osc) < 5:
+        return ult_osc, "brak_danych", latest_ult
+
+    # Średnia z 4 poprzednich wartości
+    prev_4_avg = ult_osc.iloc[-5:-1].mean()
+
+    # Logika sygnałów
+    if 30 <= latest_ult <= 70 and prev_4_avg < latest_ult:
+        signal = "kupuj"
+    elif 30 <= latest_ult <= 70 and prev_4_avg > latest_ult:
+        signal = "sprzedaj"
+    elif (45 <= latest_ult <= 55 and 45 <= prev_4_avg <= 55) or latest_ult > 70 or latest_ult < 30:
+        signal = "neutralny"
+    else:
+        signal = "neutralny"
+
+    return ult_osc, signal, latest_ult
+
+
+def reference_force_index(df, period=13):
+    """Force Index"""
+    close = df['Close']
+    volume = df['Volume']
+
+    force_index = (close - close.shift(1)) * volume
+    fi_ema = force_index.ewm(span=period).mean()
+
+    # Ocena
+    latest_fi = fi_ema.iloc[-1]
+    if latest_fi > 0:
+        signal = "kupuj"
+    elif latest_fi < 0:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
+
+    return fi_ema, signal, latest_fi
+
+
+def reference_mfi(df, period=14):
+    """Money Flow Index"""
+    high = df['High']
+    low = df['Low']
+    close = df['Close']
+    volume = df['Volume']
+
+    typical_price = (high + low + close) / 3
+    money_flow = typical_price * volume
+
+    positive_mf = money_flow.where(typical_price > typical_price.shift(1), 0)
+    negative_mf = money_flow.where(typical_price < typical_price.shift(1), 0)
+
+    positive_mf_sum = positive_mf.rolling(window=period).sum()
+    negative_mf_sum = negative_mf.rolling(window=period).sum()
+
+    money_ratio = positive_mf_sum / negative_mf_sum
+    mfi = 100 - (100 / (1 + money_ratio))
+
+    # Ocena według nowych kryteriów
+    latest_mfi = mfi.iloc[-1]
+
+    # Obliczenie średniej z czterech poprzednich wartości MFI
+    if len(mfi) >= 5:  # Sprawdzenie czy mamy wystarczająco danych
+        avg_previous_4 = mfi.iloc[-5:-1].mean()  # Średnia z 4 poprzednich wartości (bez aktualnej)
+    else:
+        avg_previous_4 = None
+
+    # Logika sygnałów
+    if avg_previous_4 is not None:
+        # Kupuj: MFI w przedziale 25-75 i średnia poprzednich < aktualna
+        if 25 <= latest_mfi <= 75 and avg_previous_4 < latest_mfi:
+            signal = "kupuj"
+        # Sprzedaj: MFI w przedziale 25-75 i średnia poprzednich > aktualna
+        elif 25 <= latest_mfi <= 75 and avg_previous_4 > latest_mfi:
+            signal = "sprzedaj"
+        # Neutralny: różne przypadki
+        elif (45 <= latest_mfi <= 55 and 45 <= avg_previous_4 <= 55) or \
+                latest_mfi > 75 or \
+                latest_mfi < 25:
+            signal = "neutralny"
+        else:
+            signal = "neutralny"  # Domyślnie neutralny dla pozostałych przypadków
+    else:
+        signal = "neutralny"  # Jeśli nie ma wystarczających danych historycznych
+
+    return mfi, signal, latest_mfi
+
+
+def reference_bop(df, period=14):
+    """Balance of Power"""
+    open_price = df['Open']
+    high = df['High']
+    low = df['Low']
+    close = df['Close']
+
+    bop = (close - open_price) / (high - low)
+    bop_sma = bop.rolling(window=period).mean()
+
+    # Ocena
+    latest_bop = bop_sma.iloc[-1]
+    if latest_bop > 0.1:
+        signal = "kupuj"
+    elif latest_bop < -0.1:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
+
+    return bop_sma, signal, latest_bop
+
+
+def reference_emv(df, period=14):
+    """Ease of Movement"""
+    high = df['High']
+    low = df['Low']
+    volume = df['Volume']
+
+    distance_moved = ((high + low) / 2) - ((high.shift(1) + low.shift(1)) / 2)
+    box_height = (volume / 1000000) / (high - low)  # Skalowanie wolumenu
+
+    emv = distance_moved / box_height
+    emv_sma = emv.rolling(window=period).mean()
+
+    # Ocena
+    latest_emv = emv_sma.iloc[-1]
+    if latest_emv > 1:
+        signal = "kupuj"
+    elif latest_emv < -1:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
+
+    return emv_sma, signal, latest_emv
+
+
+def _threshold_signal(value, buy, sell):
+    if value > buy:
+        return "kupuj"
+    if value < sell:
+        return "sprzedaj"
+    return "neutralny"
+
+
+def reference_wilder_mean(series, period):
+    """Wygładzanie Wildera z definicji: SMA z pierwszych `period` wartości, potem (poprzednia * (n - 1) + x) / n."""
+    out = []
+    seed = []
+    previous = np.nan
+    for x in series:
+        if pd.isna(x):
+            out.append(previous)
+            continue
+        if len(seed) < period:
+            seed.append(x)
+            if len(seed) == period:
+                previous = sum(seed) / period
+        else:
+            previous = (previous * (period - 1) + x) / period
+        out.append(previous)
+    return pd.Series(out, index=series.index, dtype=float)
+
+
+def _reference_true_range(df):
+    previous_close = df['Close'].shift(1)
+    return np.maximum(df['High'], previous_close) - np.minimum(df['Low'], previous_close)
+
+
+def reference_atr(df, period=14):
+    atr = reference_wilder_mean(_reference_true_range(df), period)
+    return atr, atr.iloc[-1]
+
+
+def reference_adx(df, period=14, threshold=ADX_TREND_THRESHOLD):
+    up_move = df['High'].diff()
+    down_move = -df['Low'].diff()
+
+    plus_dm = up_move.where((up_move > down_move) & (up_move > 0), 0.0).where(up_move.notna())
+    minus_dm = down_move.where((down_move > up_move) & (down_move > 0), 0.0).where(down_move.notna())
+
+    atr = reference_wilder_mean(_reference_true_range(df), period)
+    plus_di = 100 * reference_wilder_mean(plus_dm, period) / atr
+    minus_di = 100 * reference_wilder_mean(minus_dm, period) / atr
+
+    dx = 100 * (plus_di - minus_di).abs() / (plus_di + minus_di)
+    adx = reference_wilder_mean(dx, period)
+
+    latest_adx = adx.iloc[-1]
+    latest_plus = plus_di.iloc[-1]
+    latest_minus = minus_di.iloc[-1]
+    if latest_adx > threshold and latest_plus > latest_minus:
+        signal = "kupuj"
+    elif latest_adx > threshold and latest_minus > latest_plus:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
+    return adx, plus_di, minus_di, signal, latest_adx
+
+
+def reference_bollinger(df, period=20, width=2):
+    close = df['Close']
+    middle = close.rolling(window=period).mean()
+    std = close.rolling(window=period).std(ddof=0)
+
+    upper = middle + width * std
+    lower = middle - width * std
+    percent_b = (close - lower) / (upper - lower)
+
+    latest_b = percent_b.iloc[-1]
+    prev_4_avg = percent_b.iloc[-5:-1].mean()
+    if 0 <= latest_b <= 1 and prev_4_avg < latest_b:
+        signal = "kupuj"
+    elif 0 <= latest_b <= 1 and prev_4_avg > latest_b:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
+    return upper, lower, percent_b, signal, latest_b
+
+
+def reference_obv(df, signal_period=20):
+    close = df['Close']
+    direction = np.sign(close - close.shift(1)).fillna(0)
+    obv = (direction * df['Volume']).cumsum()
+    obv_ema = obv.ewm(span=signal_period).mean()
+    distance = obv - obv_ema
+    return obv, distance, _threshold_signal(distance.iloc[-1], 0, 0), obv.iloc[-1]
+
+
+def reference_vwap(df, period=20):
+    price_volume = (df['High'] + df['Low'] + df['Close']) / 3 * df['Volume']
+    volume = df['Volume']
+
+    sessions = df.index.normalize() if isinstance(df.index, pd.DatetimeIndex) else None
+    if sessions is not None and sessions.has_duplicates:
+        vwap = price_volume.groupby(sessions).cumsum() / volume.groupby(sessions).cumsum()
+    else:
+        vwap = price_volume.rolling(window=period).sum() / volume.rolling(window=period).sum()
+
+    distance = df['Close'] - vwap
+    return vwap, distance, _threshold_signal(distance.iloc[-1], 0, 0), vwap.iloc[-1]
+
+
+def reference_ichimoku(df, tenkan=9, kijun=26, senkou=52):
+    def midpoint(period):
+        return (df['High'].rolling(window=period).max() + df['Low'].rolling(window=period).min()) / 2
+
+    close = df['Close']
+    tenkan_line = midpoint(tenkan)
+    kijun_line = midpoint(kijun)
+    span_a = ((tenkan_line + kijun_line) / 2).shift(kijun)
+    span_b = midpoint(senkou).shift(kijun)
+
+    cloud_top = np.maximum(span_a, span_b)
+    cloud_bottom = np.minimum(span_a, span_b)
+    cloud_position = pd.Series(np.where(close > cloud_top, 1.0, np.where(close < cloud_bottom, -1.0, 0.0)),
+                               index=close.index).where(cloud_top.notna() & close.notna())
+
+    latest_position = cloud_position.iloc[-1]
+    latest_cross = tenkan_line.iloc[-1] - kijun_line.iloc[-1]
+    if latest_position > 0 and latest_cross > 0:
+        signal = "kupuj"
+    elif latest_position < 0 and latest_cross < 0:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
+    return tenkan_line, kijun_line, span_a, span_b, cloud_position, signal, latest_position
+
+
+def reference_parabolic_sar_values(high, low, step=0.02, max_step=0.2):
+    """Parabolic SAR z definicji Wildera na świecach bez braków danych; pierwsza świeca tylko inicjuje stan."""
+    bars = pd.DataFrame({'high': high.to_numpy(), 'low': low.to_numpy()}).dropna()
+    out = pd.Series(np.nan, index=range(len(high)))
+    if bars.empty:
+        return pd.Series(out.to_numpy(), index=high.index)
+
+    highs = bars['high'].tolist()
+    lows = bars['low'].tolist()
+    rising, sar, ep, af = True, lows[0], highs[0], step
+    values = [np.nan]
+    for i in range(1, len(highs)):
+        sar += af * (ep - sar)
+        if rising:
+            sar = min(sar, lows[i - 1], lows[max(i - 2, 0)])
+            if lows[i] < sar:
+                rising, sar, ep, af = False, ep, lows[i], step
+            elif highs[i] > ep:
+                ep, af = highs[i], min(af + step, max_step)
+        else:
+            sar = max(sar, highs[i - 1], highs[max(i - 2, 0)])
+            if highs[i] > sar:
+                rising, sar, ep, af = True, ep, highs[i], step
+            elif lows[i] < ep:
+                ep, af = lows[i], min(af + step, max_step)
+        values.append(sar)
+    out.loc[bars.index] = values
+    return pd.Series(out.to_numpy(), index=high.index)
+
+
+def reference_parabolic_sar(df, step=0.02, max_step=0.2):
+    sar = reference_parabolic_sar_values(df['High'], df['Low'], step, max_step)
+    distance = df['Close'] - sar
+    return sar, distance, _threshold_signal(distance.iloc[-1], 0, 0), sar.iloc[-1]
+
+
+# nazwa wskaźnika z rejestru -> implementacja odniesienia (te same parametry co func w rejestrze)
+REFERENCE_INDICATORS = {
+    'RSI': reference_rsi,
+    'STS': reference_stochastic,
+    'MACD': reference_macd,
+    'TRIX': reference_trix,
+    'Williams %R': reference_williams_r,
+    'CCI': reference_cci,
+    'ROC': reference_roc,
+    'ULT': reference_ultimate_oscillator,
+    'FI': reference_force_index,
+    'MFI': reference_mfi,
+    'BOP': reference_bop,
+    'EMV': reference_emv,
+    'ATR': reference_atr,
+    'ADX': reference_adx,
+    'BB%B': reference_bollinger,
+    'OBV': reference_obv,
+    'VWAP': reference_vwap,
+    'Ichimoku': reference_ichimoku,
+    'SAR': reference_parabolic_sar,
+}
+
+
+def reference_outputs(df, report, name):
+    """Wyniki (i czasy) implementacji odniesienia dla aktywnych wskaźników: {etykieta: (wynik, czas)}."""
+    references = {}
+    for spec in active_indicators():
+        reference = REFERENCE_INDICATORS.get(spec['name'])
+        if reference is None:
+            report.fail(f"{name}: {spec['label']} - brak implementacji odniesienia")
+            continue
+        references[spec['label']] = _timed(reference, df, **spec['params'])
+    return references
+
+
+def _compare_outputs(spec, reference, candidate):
+    """Zwraca (różnice wartości, maks. błąd, różnice sygnałów) wyniku wskaźnika względem odniesienia."""
+    value_errors, max_err = 0, 0.0
+    for ref_out, cand_out in zip(_numeric_outputs(reference), _numeric_outputs(candidate)):
+        errors, err = _compare_values(ref_out, cand_out)
+        value_errors += errors
+        max_err = max(max_err, err)
+
+    signal_errors = int(spec['extract'](candidate)[0] != spec['extract'](reference)[0])
+    if spec['series'] is not None:
+        signal_errors += int((spec['series'](reference) != spec['series'](candidate)).sum())
+    return value_errors, max_err, signal_errors
+
+
+def check_indicators(name, df, backends, references, report):
+    for backend in backends:
+        # jeden cache na zbiór danych, jak w analyze_stock_df - wskaźniki współdzielą wartości pośrednie
+        cache = {}
+        with use_backend(backend):
+            for spec in active_indicators():
+                if spec['label'] not in references:
+                    continue
+                reference, ref_time = references[spec['label']]
+                # rozgrzewka (kompilacja JIT) poza pomiarem
+                spec['func'](df, **spec['params'])
+                candidate, fast_time = _timed(spec['func'], df, **spec['params'])
+                cached = run_indicator(spec, df, cache)
+
+                value_errors, max_err, signal_errors = _compare_outputs(spec, reference, candidate)
+                cached_values, cached_err, cached_signals = _compare_outputs(spec, reference, cached)
+                value_errors += cached_values
+                max_err = max(max_err, cached_err)
+                signal_errors += cached_signals
+
+                report.add(spec['label'], backend, ref_time, fast_time, value_errors, max_err, signal_errors)
+                if value_errors or signal_errors:
+                    report.fail(f"{name}: {spec['label']} [{backend}] - wartości: {value_errors}, "
+                                f"sygnały: {signal_errors}")
+
+
+def reference_moving_averages(df, periods):
+    """Oryginalna pętla z moving_analizer: osobne rolling().mean() i ewm().mean() dla każdego okresu."""
+    close = df['Close']
+    current_price = close.iloc[-1]
+    out = {}
+    for period in periods:
+        out[f'SMA{period}'] = close.rolling(window=period).mean().iloc[-1]
+    for period in periods:
+        out[f'EMA{period}'] = close.ewm(span=period).mean().iloc[-1]
+    signals = {name: 1 if current_price > v else -1 if current_price < v else 0 for name, v in out.items()}
+    return out, signals
+
+
+def check_moving_averages(name, df, report):
+    for label, periods in (('MA' + str(DEFAULT_PERIODS), DEFAULT_PERIODS), ('MA ribbon x20', RIBBON_PERIODS)):
+        (ref_values, ref_signals), ref_time = _timed(reference_moving_averages, df, periods)
+        result, fast_time = _timed(calculate_moving_averages_signals, df, periods)
+
+        value_errors, max_err, signal_errors = 0, 0.0, 0
+        for kind in ('sma_details', 'ema_details'):
+            for key, details in result[kind].items():
+                errors, err = _compare_values([round(ref_values[key], 2)], [details['value']])
+                value_errors += errors
+                max_err = max(max_err, err)
+                expected = {1: 'kupuj', -1: 'sprzedaj', 0: 'neutralnie'}[ref_signals[key]]
+                signal_errors += int(details['signal'] != expected)
+
+        report.add(label, 'numpy', ref_time, fast_time, value_errors, max_err, signal_errors)
+        if value_errors or signal_errors:
+            report.fail(f"{name}: {label} - wartości: {value_errors}, sygnały: {signal_errors}")
+
+
+def check_signal_series(name, df, backends, references, report):
+    """Seria sygnałów z indicator_signal_series (szybki backend, wspólny cache) musi być identyczna z odniesieniem."""
+    specs = {spec['label']: spec for spec in active_indicators()}
+    for backend in backends:
+        with use_backend(backend):
+            candidate = indicator_signal_series(df)
+        for group, series in candidate.items():
+            for label, codes in series.items():
+                if label not in references:
+                    continue
+                mismatches = int((specs[label]['series'](references[label][0]) != codes).sum())
+                if mismatches:
+                    report.fail(f"{name}: seria {label} [{backend}] - {mismatches} różnych sygnałów")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Równoważność szybkich wskaźników z implementacjami odniesienia")
+    parser.add_argument("--random", type=int, default=20, help="liczba losowych zbiorów danych")
+    parser.add_argument("--bars", type=int, default=2500, help="liczba świec w losowym zbiorze")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=None, help="katalog z zapisanymi CSV (OHLCV)")
+    parser.add_argument("--tickers", default=None, help="pobierz z Yahoo, np. CDR.WA,AAPL")
+    parser.add_argument("--period", default="10y")
+    parser.add_argument("--save-dir", default=None, help="zapisz pobrane dane jako CSV")
+    args = parser.parse_args()
+
+    backends = ['pandas', 'numpy'] + (['numba'] if NUMBA_AVAILABLE else [])
+    print(f"Backendy: {', '.join(backends)} (auto = {indicator_kernels.get_backend()})")
+
+    datasets = {f"random-{args.seed + i}": random_ohlcv(args.bars, args.seed + i) for i in range(args.random)}
+    if args.data_dir:
+        datasets.update(recorded_datasets(args.data_dir))
+    if args.tickers:
+        datasets.update(download_datasets(args.tickers.split(","), args.period, args.save_dir))
+
+    report = Report()
+    for name, df in datasets.items():
+        references = reference_outputs(df, report, name)
+        check_indicators(name, df, backends, references, report)
+        check_moving_averages(name, df, report)
+        check_signal_series(name, df, backends, references, report)
+    report.print()
+
+    print(f"\nZbiory danych: {len(datasets)}")
+    if report.failures:
+        print(f"❌ Niezgodności: {len(report.failures)}")
+        for failure in report.failures[:50]:
+            print(f"  {failure}")
+        raise SystemExit(1)
+    print("✅ Wszystkie implementacje zgodne z referencją")
+
+
+if __name__ == "__main__":
+    main()
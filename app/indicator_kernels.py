@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Jądra obliczeniowe wskaźników z wymiennym backendem.
+
+Rekurencyjnych wskaźników (EMA, wygładzanie Wildera, potrójne EMA w TRIX, Parabolic SAR) i okien kroczących
+(sumy ULT/MFI, min/max STS i Williams %R, odchylenie średnie CCI) nie da się w pełni
+zwektoryzować w czystym NumPy. Dostępne backendy:
+
+    'numba'  - jądra kompilowane JIT (jeśli numba jest zainstalowana)
+    'numpy'  - czyste NumPy (zawsze dostępne)
+    'pandas' - wyrażenia pandas (ewm/rolling); odniesieniem dla backendów jest equivalence_check
+    'auto'   - numba, a gdy jej brak - numpy (domyślnie)
+
+Backend wybiera zmienna INDICATOR_BACKEND albo set_backend() / use_backend() (np. do benchmarków).
+Funkcje przyjmują i zwracają pd.Series z tym samym indeksem.
+"""
+import os
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from moving_analizer import sma_matrix, ema_matrix
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    numba = None
+    NUMBA_AVAILABLE = False
+
+BACKENDS = ('auto', 'numba', 'numpy', 'pandas')
+
+_backend = os.getenv("INDICATOR_BACKEND", "auto").lower()
+
+
+def set_backend(name):
+    """Wymusza backend: 'auto', 'numba', 'numpy' lub 'pandas'."""
+    global _backend
+    name = name.lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Nieznany backend: {name} (dostępne: {', '.join(BACKENDS)})")
+    if name == 'numba' and not NUMBA_AVAILABLE:
+        raise ValueError("Backend 'numba' niedostępny - brak pakietu numba")
+    _backend = name
+
+
+def get_backend():
+    """Faktycznie używany backend (rozwiązuje 'auto')."""
+    if _backend == 'auto':
+        return 'numba' if NUMBA_AVAILABLE else 'numpy'
+    return _backend
+
+
+@contextmanager
+def use_backend(name):
+    previous = _backend
+    set_backend(name)
+    try:
+        yield
+    finally:
+        set_backend(previous)
+
+
+# ----------------------
+# PĘTLE (kompilowane przez numba, jeśli dostępna)
+# ----------------------
+
+def _ewm_loop(values, alpha):
+    """EMA jak ewm(alpha=...).mean() z adjust=True i ignore_na=False."""
+    n = len(values)
+    out = np.empty(n)
+    decay = 1.0 - alpha
+    num = 0.0
+    den = 0.0
+    for i in range(n):
+        num *= decay
+        den *= decay
+        x = values[i]
+        if not np.isnan(x):
+            num += x
+            den += 1.0
+        out[i] = num / den if den > 0 else np.nan
+    return out
+
+
+def _wilder_loop(values, period):
+    """Wygładzanie Wildera: start od SMA z pierwszych `period` wartości, potem rekurencja."""
+    n = len(values)
+    out = np.full(n, np.nan)
+    count = 0
+    total = 0.0
+    prev = np.nan
+    for i in range(n):
+        x = values[i]
+        if np.isnan(x):
+            if count >= period:
+                out[i] = prev
+            continue
+        if count < period:
+            total += x
+            count += 1
+            if count == period:
+                prev = total / period
+                out[i] = prev
+        else:
+            prev = (prev * (period - 1) + x) / period
+            out[i] = prev
+    return out
+
+
+def _rolling_sum_loop(values, window):
+    """Suma w oknie; NaN gdy w oknie brakuje wartości lub jest ±inf (jak rolling().sum())."""
+    n = len(values)
+    out = np.full(n, np.nan)
+    for i in range(window - 1, n):
+        total = 0.0
+        ok = True
+        for j in range(i - window + 1, i + 1):
+            x = values[j]
+            if not np.isfinite(x):
+                ok = False
+                break
+            total += x
+        if ok:
+            out[i] = total
+    return out
+
+
+def _rolling_extreme_loop(values, window, is_max):
+    n = len(values)
+    out = np.full(n, np.nan)
+    for i in range(window - 1, n):
+        best = values[i - window + 1]
+        ok = not np.isnan(best)
+        for j in range(i - window + 2, i + 1):
+            x = values[j]
+            if np.isnan(x):
+                ok = False
+                break
+            if (is_max and x > best) or (not is_max and x < best):
+                best = x
+        if ok:
+            out[i] = best
+    return out
+
+
+def _rolling_mad_loop(values, window):
+    """Średnie odchylenie bezwzględne w oknie (CCI)."""
+    n = len(values)
+    out = np.full(n, np.nan)
+    for i in range(window - 1, n):
+        total = 0.0
+        ok = True
+        for j in range(i - window + 1, i + 1):
+            if np.isnan(values[j]):
+                ok = False
+                break
+            total += values[j]
+        if not ok:
+            continue
+        mean = total / window
+        dev = 0.0
+        for j in range(i - window + 1, i + 1):
+            dev += abs(values[j] - mean)
+        out[i] = dev / window
+    return out
+
+
+def _parabolic_sar_loop(high, low, step, max_step):
+    """Parabolic SAR Wildera; świece z brakami danych są pomijane (stan bez zmian)."""
+    n = len(high)
+    out = np.full(n, np.nan)
+    started = False
+    rising = True
+    sar = 0.0
+    ep = 0.0
+    af = step
+    prev_low1 = prev_low2 = prev_high1 = prev_high2 = np.nan
+    for i in range(n):
+        h = high[i]
+        l = low[i]
+        if np.isnan(h) or np.isnan(l):
+            continue
+        if not started:
+            started = True
+            sar = l
+            ep = h
+            prev_low1 = prev_low2 = l
+            prev_high1 = prev_high2 = h
+            continue
+        sar = sar + af * (ep - sar)
+        if rising:
+            sar = min(sar, prev_low1, prev_low2)
+            if l < sar:
+                rising = False
+                sar = ep
+                ep = l
+                af = step
+            elif h > ep:
+                ep = h
+                af = min(af + step, max_step)
+        else:
+            sar = max(sar, prev_high1, prev_high2)
+            if h > sar:
+                rising = True
+                sar = ep
+                ep = h
+                af = step
+            elif l < ep:
+                ep = l
+                af = min(af + step, max_step)
+        out[i] = sar
+        prev_low2 = prev_low1
+        prev_low1 = l
+        prev_high2 = prev_high1
+        prev_high1 = h
+    return out
+
+
+if NUMBA_AVAILABLE:
+    _parabolic_sar_jit = numba.njit(cache=True)(_parabolic_sar_loop)
+    _ewm_jit = numba.njit(cache=True)(_ewm_loop)
+    _wilder_jit = numba.njit(cache=True)(_wilder_loop)
+    _rolling_sum_jit = numba.njit(cache=True)(_rolling_sum_loop)
+    _rolling_extreme_jit = numba.njit(cache=True)(_rolling_extreme_loop)
+    _rolling_mad_jit = numba.njit(cache=True)(_rolling_mad_loop)
+
+
+# ----------------------
+# NUMPY
+# ----------------------
+
+def _windows(values, window):
+    return np.lib.stride_tricks.sliding_window_view(values, window)
+
+
+def _numpy_rolling(values, window, reducer):
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = reducer(_windows(values, window))
+    return out
+
+
+def _numpy_sum(windows):
+    return np.where(np.isfinite(windows).all(axis=1), windows.sum(axis=1), np.nan)
+
+
+def _numpy_mad(windows):
+    return np.mean(np.abs(windows - windows.mean(axis=1, keepdims=True)), axis=1)
+
+
+# ----------------------
+# API
+# ----------------------
+
+def _as_values(series):
+    return np.ascontiguousarray(series.to_numpy(dtype=float, na_value=np.nan))
+
+
+def _wrap(series, values):
+    return pd.Series(values, index=series.index)
+
+
+def ewm_mean(series, span):
+    backend = get_backend()
+    if backend == 'pandas':
+        return series.ewm(span=span).mean()
+    values = _as_values(series)
+    if backend == 'numba':
+        return _wrap(series, _ewm_jit(values, 2.0 / (span + 1.0)))
+    return _wrap(series, ema_matrix(values, [span])[0])
+
+
+def wilder_mean(series, period):
+    """Wygładzanie Wildera (RMA) - ATR, ADX. Braki danych są pomijane (wynik przenoszony)."""
+    backend = get_backend()
+    if backend == 'pandas':
+        # start od SMA z pierwszych `period` wartości bez braków, potem ewm(alpha=1/n); braki - ffill
+        clean = series.reset_index(drop=True).dropna()
+        if len(clean) < period:
+            return _wrap(series, np.full(len(series), np.nan))
+        seeded = pd.concat([pd.Series([clean.iloc[:period].mean()], index=clean.index[period - 1:period]),
+                            clean.iloc[period:]])
+        smoothed = seeded.ewm(alpha=1.0 / period, adjust=False).mean()
+        return _wrap(series, smoothed.reindex(range(len(series))).ffill().to_numpy())
+    values = _as_values(series)
+    if backend == 'numba':
+        return _wrap(series, _wilder_jit(values, period))
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) < period:
+        return _wrap(series, np.full(len(values), np.nan))
+    seed = valid[period - 1]
+    seeded = values.copy()
+    seeded[:seed] = np.nan
+    seeded[seed] = values[valid[:period]].mean()
+    smoothed = pd.Series(seeded).ewm(alpha=1.0 / period, adjust=False, ignore_na=True).mean()
+    return _wrap(series, smoothed.to_numpy())
+
+
+def rolling_mean(series, window):
+    backend = get_backend()
+    if backend == 'pandas':
+        return series.rolling(window=window).mean()
+    values = _as_values(series)
+    if backend == 'numba':
+        return _wrap(series, _rolling_sum_jit(values, window) / window)
+    return _wrap(series, sma_matrix(values, [window])[0])
+
+
+def rolling_sum(series, window):
+    backend = get_backend()
+    if backend == 'pandas':
+        return series.rolling(window=window).sum()
+    values = _as_values(series)
+    if backend == 'numba':
+        return _wrap(series, _rolling_sum_jit(values, window))
+    return _wrap(series, _numpy_rolling(values, window, _numpy_sum))
+
+
+def rolling_max(series, window):
+    backend = get_backend()
+    if backend == 'pandas':
+        return series.rolling(window=window).max()
+    values = _as_values(series)
+    if backend == 'numba':
+        return _wrap(series, _rolling_extreme_jit(values, window, True))
+    return _wrap(series, _numpy_rolling(values, window, lambda w: w.max(axis=1)))
+
+
+def rolling_min(series, window):
+    backend = get_backend()
+    if backend == 'pandas':
+        return series.rolling(window=window).min()
+    values = _as_values(series)
+    if backend == 'numba':
+        return _wrap(series, _rolling_extreme_jit(values, window, False))
+    return _wrap(series, _numpy_rolling(values, window, lambda w: w.min(axis=1)))
+
+
+def rolling_mad(series, window):
+    """Średnie odchylenie bezwzględne w oknie (CCI) - zamiast rolling().apply(lambda)."""
+    backend = get_backend()
+    if backend == 'pandas':
+        return series.rolling(window=window).apply(lambda x: np.mean(np.abs(x - x.mean())))
+    values = _as_values(series)
+    if backend == 'numba':
+        return _wrap(series, _rolling_mad_jit(values, window))
+    return _wrap(series, _numpy_rolling(values, window, _numpy_mad))
+
+
+def parabolic_sar(high, low, step=0.02, max_step=0.2):
+    """Parabolic SAR - rekurencja ze stanem (trend, punkt ekstremalny, przyspieszenie)."""
+    high_values = _as_values(high)
+    low_values = _as_values(low)
+    if get_backend() == 'numba':
+        return _wrap(high, _parabolic_sar_jit(high_values, low_values, step, max_step))
+    return _wrap(high, _parabolic_sar_loop(high_values, low_values, step, max_step))
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Śledzenie przebiegu sesji: maksimum sesji, obsunięcie od maksimum i luka na otwarciu.
+
+Alert spadkowy porównuje tylko ostatnią cenę z wczorajszym zamknięciem, więc spółka, która
+rano rośnie o 8%, a potem traci 12% od szczytu, albo otwiera się dużą luką, umyka albo jest
+zgłaszana z opóźnieniem. IntradayTracker trzyma dla wszystkich tickerów giełdy tablice
+otwarcia i maksimum sesji i aktualizuje je przyrostowo: każdy cykl przetwarza tylko świece
+nowsze od ostatnio przetworzonej dla danego tickera (ostatnią - ponownie, bo mogła się jeszcze
+zmienić). Panel może obejmować tylko część tickerów (odpytywanie warstwami) - pozostałe
+zachowują swój stan.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from drop_alerts import drop_alert_levels
+
+# Progi obsunięcia od maksimum sesji (w procentach) - te same poziomy co alerty spadkowe
+DRAWDOWN_THRESHOLDS = {
+    "czerwony": float(os.getenv("ALERT_DRAWDOWN_RED", "10.0")),
+    "zolty": float(os.getenv("ALERT_DRAWDOWN_YELLOW", "7.0")),
+    "zielony": float(os.getenv("ALERT_DRAWDOWN_GREEN", "5.0"))
+}
+# Luka na otwarciu względem wczorajszego zamknięcia (w procentach, w obu kierunkach)
+GAP_THRESHOLD = float(os.getenv("ALERT_GAP_THRESHOLD", "5.0"))
+
+
+class IntradayTracker:
+    """Otwarcie i maksimum bieżącej sesji dla tickerów giełdy (tablice w kolejności `tickers`)."""
+
+    def __init__(self, tickers, session=None):
+        """
+        Args:
+            tickers: tickery giełdy
+            session: data sesji 'YYYY-MM-DD' (czas giełdy) - starsze świece są pomijane
+        """
+        n = len(tickers)
+        self.tickers = list(tickers)
+        self.session = session
+        self.open = np.full(n, np.nan)
+        self.high = np.full(n, np.nan)
+        # czas (ns epoki) ostatnio przetworzonej świecy per ticker
+        self.last_bar = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)
+        self.rows = {}
+
+    def _rows(self, symbols):
+        # pozycje tickerów w panelu - liczone raz dla danego zestawu symboli
+        key = tuple(symbols)
+        if key not in self.rows:
+            lookup = {symbol: i for i, symbol in enumerate(symbols)}
+            self.rows = {key: np.array([lookup.get(t, -1) for t in self.tickers], dtype=int)}
+        return self.rows[key]
+
+    def observe(self, positions, open_price, high):
+        """Uwzględnia otwarcie (tylko gdy jeszcze nieznane) i maksimum dla tickerów na pozycjach `positions`."""
+        positions = np.asarray(positions, dtype=int)
+        current_open = self.open[positions]
+        self.open[positions] = np.where(np.isnan(current_open), open_price, current_open)
+        self.high[positions] = np.fmax(self.high[positions], high)
+
+    def update(self, panel):
+        """
+        Przetwarza świece z panelu (np. 5m z download_with_retry), dla każdego tickera zaczynając
+        od ostatnio przetworzonej; tickery spoza panelu zachowują stan.
+
+        Returns:
+            liczba przetworzonych świec
+        """
+        if not len(panel):
+            return 0
+        index = panel.index
+        times = index.as_unit('ns').asi8
+        rows = self._rows(panel.symbols)
+        known = np.flatnonzero(rows >= 0)
+        if not len(known):
+            return 0
+        since = self.last_bar[known]
+        if self.session is not None:
+            since = np.maximum(since, pd.Timestamp(self.session, tz=index.tz).value)
+        # maksimum jest idempotentne - ponowne przejście ostatniej (niepełnej) świecy nic nie psuje
+        start = int(times.searchsorted(since.min(), side='left'))
+        if start >= len(index):
+            return 0
+
+        fresh = times[start:] >= since[:, None]
+        opens = np.where(fresh, panel.field('Open')[rows[known], start:], np.nan)
+        highs = np.where(fresh, panel.field('High')[rows[known], start:], np.nan)
+        valid = ~np.isnan(opens)
+        first_open = np.where(valid.any(axis=1), opens[np.arange(len(known)), np.argmax(valid, axis=1)], np.nan)
+        # fmax pomija NaN (brak świecy tickera); wiersz bez danych daje NaN
+        self.observe(known, first_open, np.fmax.reduce(highs, axis=1))
+        self.last_bar[known] = times[-1]
+        return int(len(index) - start)
+
+    def drawdown(self, price):
+        """Obsunięcie ceny od maksimum sesji w % (bieżąca cena też może być nowym maksimum)."""
+        high = np.fmax(self.high, price)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (high - price) / high * 100
+
+    def gap(self, prev_close):
+        """Luka na otwarciu w % względem wczorajszego zamknięcia (ujemna = luka spadkowa)."""
+        prev_close = np.asarray(prev_close, dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self.open - prev_close) / prev_close * 100
+
+    def classify(self, prev_close, price, drawdown_thresholds=None, gap_threshold=GAP_THRESHOLD):
+        """
+        Obsunięcia i luki dla całej giełdy naraz.
+
+        Returns:
+            (obsunięcie %, poziomy obsunięcia jak drop_alert_levels, luka %, maska luk >= gap_threshold)
+        """
+        drawdown = self.drawdown(np.asarray(price, dtype=float))
+        levels = drop_alert_levels(drawdown, drawdown_thresholds or DRAWDOWN_THRESHOLDS)
+        gap = self.gap(prev_close)
+        with np.errstate(invalid='ignore'):
+            gaps = np.abs(gap) >= gap_threshold
+        return drawdown, levels, gap, gaps
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Godziny sesji giełd: czy giełda jest otwarta i kiedy najbliższa sesja.
+
+Źródłem jest kalendarz sesji (trading_calendar.json - święta, sesje skrócone, zmiana czasu)
+z odczytem w O(1). Poza zakresem kalendarza obowiązują regularne godziny w dni robocze
+w strefie czasowej giełdy.
+"""
+from datetime import datetime, time as dt_time, timedelta
+
+import pytz
+
+from trading_calendar import EXCHANGE_SPECS, load_calendars
+
+# giełda -> (strefa czasowa, otwarcie, zamknięcie) - regularne godziny sesji
+EXCHANGE_HOURS = {
+    exchange: (spec["timezone"], dt_time.fromisoformat(spec["open"]), dt_time.fromisoformat(spec["close"]))
+    for exchange, spec in EXCHANGE_SPECS.items()
+}
+
+# Jak daleko w przód szukać sesji (poza kalendarzem)
+MAX_LOOKAHEAD_DAYS = 30
+
+CALENDARS = load_calendars()
+
+
+def regular_session(exchange, day):
+    """Sesja wg regularnych godzin (dzień roboczy, bez świąt)."""
+    tz_name, open_time, close_time = EXCHANGE_HOURS[exchange]
+    if day.weekday() >= 5:  # sobota/niedziela
+        return None
+    tz = pytz.timezone(tz_name)
+    return (tz.localize(datetime.combine(day, open_time)),
+            tz.localize(datetime.combine(day, close_time)))
+
+
+def session_bounds(exchange, day):
+    """(otwarcie, zamknięcie) sesji w danym dniu jako datetime ze strefą giełdy; None gdy brak sesji."""
+    calendar = CALENDARS.get(exchange)
+    if calendar is not None and calendar.first_day <= day <= calendar.last_day:
+        return calendar.session(day)
+    return regular_session(exchange, day)
+
+
+def _now(exchange, now):
+    tz = pytz.timezone(EXCHANGE_HOURS[exchange][0])
+    return datetime.now(tz) if now is None else now.astimezone(tz)
+
+
+def is_open(exchange, now=None):
+    """Czy giełda jest otwarta w chwili `now` (domyślnie teraz); nieznana giełda - otwarta."""
+    if exchange not in EXCHANGE_HOURS:
+        return True
+    now = _now(exchange, now)
+    calendar = CALENDARS.get(exchange)
+    if calendar is not None and calendar.covers(now.timestamp()):
+        return calendar.is_open(now)
+    bounds = session_bounds(exchange, now.date())
+    return bounds is not None and bounds[0] <= now <= bounds[1]
+
+
+def next_session(exchange, now=None):
+    """
+    Bieżąca albo najbliższa sesja: (otwarcie, zamknięcie) z zamknięciem po `now`.
+    """
+    now = _now(exchange, now)
+    calendar = CALENDARS.get(exchange)
+    if calendar is not None and calendar.covers(now.timestamp()):
+        try:
+            return calendar.next_session(now)
+        except ValueError:
+            pass  # koniec kalendarza - dalej regularne godziny
+    for offset in range(MAX_LOOKAHEAD_DAYS):
+        bounds = session_bounds(exchange, now.date() + timedelta(days=offset))
+        if bounds is not None and bounds[1] > now:
+            return bounds
+    raise ValueError(f"Brak sesji {exchange} w ciągu {MAX_LOOKAHEAD_DAYS} dni")
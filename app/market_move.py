@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Ruch całego rynku (giełdy) w bieżącym cyklu.
+
+Gdy spada cała GPW albo NASDAQ, alerty spadkowe przychodzą dla prawie każdego tickera naraz.
+market_move liczy spadek równoważony (średnia spadków tickerów giełdy) i szerokość ruchu
+(udział tickerów spadających co najmniej o MARKET_MEMBER_DROP). Przy ruchu rynkowym bot
+wysyła jeden alert rynkowy z najsłabszymi spółkami, a alerty dla pojedynczych tickerów ocenia
+względem rynku - zgłaszane są tylko spółki spadające wyraźnie mocniej niż cała giełda.
+
+Stan "ruch rynku" ma własną histerezę (MarketLatch): włącza się przy szerokości MARKET_BREADTH,
+a wyłącza dopiero poniżej MARKET_BREADTH_OFF - inaczej przy szerokości oscylującej wokół progu
+spadki tickerów przełączałyby się co cykl między wartością bezwzględną a względną.
+"""
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+# Minimalny spadek (%) tickera liczony jako udział w ruchu rynku
+MARKET_MEMBER_DROP = float(os.getenv("MARKET_MEMBER_DROP", "2.0"))
+# Udział tickerów spadających razem, od którego ruch uznajemy za rynkowy
+MARKET_BREADTH = float(os.getenv("MARKET_BREADTH", "0.6"))
+# Szerokość, poniżej której trwający ruch rynkowy się kończy (histereza)
+MARKET_BREADTH_OFF = float(os.getenv("MARKET_BREADTH_OFF", "0.4"))
+# Minimalna liczba tickerów z ceną, żeby oceniać rynek
+MARKET_MIN_TICKERS = int(os.getenv("MARKET_MIN_TICKERS", "5"))
+# Ile najsłabszych spółek wymienić w alercie rynkowym
+MARKET_WORST_COUNT = int(os.getenv("MARKET_WORST_COUNT", "5"))
+
+
+@dataclass(slots=True)
+class MarketMove:
+    drop: float       # średni spadek tickerów w % (dodatni = rynek niżej)
+    breadth: float    # udział tickerów ze spadkiem >= MARKET_MEMBER_DROP
+    count: int        # liczba tickerów z ceną
+    storm: bool       # czy to ruch całego rynku
+
+    def relative(self, spadek):
+        """Spadki tickerów względem rynku (przy ruchu rynkowym) albo bez zmian."""
+        spadek = np.asarray(spadek, dtype=float)
+        return spadek - self.drop if self.storm else spadek
+
+
+def market_move(spadek, member_drop=MARKET_MEMBER_DROP, breadth=MARKET_BREADTH, min_tickers=MARKET_MIN_TICKERS):
+    """
+    Spadek równoważony i szerokość ruchu dla spadków wszystkich tickerów giełdy (NaN - brak ceny).
+    """
+    spadek = np.asarray(spadek, dtype=float)
+    valid = spadek[~np.isnan(spadek)]
+    if len(valid) == 0:
+        return MarketMove(drop=0.0, breadth=0.0, count=0, storm=False)
+    share = float(np.mean(valid >= member_drop))
+    drop = float(valid.mean())
+    return MarketMove(drop=drop, breadth=share, count=len(valid),
+                      storm=len(valid) >= min_tickers and share >= breadth and drop > 0)
+
+
+def worst_movers(spadek, count=MARKET_WORST_COUNT):
+    """Indeksy tickerów z największym spadkiem (malejąco), bez tickerów bez ceny."""
+    spadek = np.asarray(spadek, dtype=float)
+    valid = np.flatnonzero(~np.isnan(spadek))
+    order = valid[np.argsort(-spadek[valid], kind='stable')]
+    return order[:count]
+
+
+class MarketLatch:
+    """Ruch rynkowy z histerezą w ramach sesji - włączony trwa, aż szerokość spadnie poniżej breadth_off."""
+
+    def __init__(self, breadth_off=MARKET_BREADTH_OFF):
+        self.breadth_off = breadth_off
+        self.active = False
+
+    def update(self, move):
+        """Zwraca `move` ze stanem storm po histerezie."""
+        if move.storm:
+            self.active = True
+        elif self.active and (move.breadth < self.breadth_off or move.drop <= 0):
+            self.active = False
+        return MarketMove(drop=move.drop, breadth=move.breadth, count=move.count, storm=self.active)
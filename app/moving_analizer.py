@@ -1,12 +1,140 @@
 
 
-def calculate_moving_averages_signals(df, periods=[5, 15, 30, 60]):
+import os
+
+import numpy as np
+
+from signal_rules import price_vs_average_signals, sum_to_rate
+
+DEFAULT_PERIODS = [5, 15, 30, 60]
+RIBBON_PERIODS = list(range(10, 201, 10))
+# Ile "spanów" potrzebuje EMA, żeby wpływ początku serii był pomijalny (waga < 2%)
+EMA_WARMUP_SPANS = 2
+# Ocena sumaryczna: suma sygnałów >= STRONG_FRACTION * max -> mocne, >= WEAK_FRACTION * max -> zwykłe
+MA_STRONG_FRACTION = float(os.getenv("MA_STRONG_FRACTION", "0.75"))
+MA_WEAK_FRACTION = float(os.getenv("MA_WEAK_FRACTION", "0.25"))
+# Maksymalny zakres skalowania w bloku rekurencji EMA (10^x) - chroni przed przepełnieniem
+EMA_BLOCK_LOG10_RANGE = 100
+
+
+def required_history_bars(periods=DEFAULT_PERIODS, cross_pairs=()):
+    """Liczba świec potrzebna do policzenia SMA/EMA dla podanych okresów."""
+    longest = max(list(periods) + [slow for _fast, slow in cross_pairs])
+    return EMA_WARMUP_SPANS * longest
+
+
+def sma_matrix(values, periods):
+    """
+    SMA dla wielu okien naraz z jednej sumy skumulowanej.
+
+    Semantyka jak rolling(window=p).mean(): NaN, jeśli w oknie brakuje którejkolwiek wartości
+    (NaN lub ±inf - tak samo traktuje je pandas).
+
+    Returns:
+        np.ndarray (len(periods), len(values))
+    """
+    x = np.asarray(values, dtype=float)
+    periods = np.asarray(periods, dtype=int)
+    n = len(x)
+    valid = np.isfinite(x)
+    csum = np.concatenate(([0.0], np.cumsum(np.where(valid, x, 0.0))))
+    ccount = np.concatenate(([0], np.cumsum(valid)))
+
+    idx = np.arange(1, n + 1)
+    start = idx[None, :] - periods[:, None]
+    start_clipped = np.clip(start, 0, None)
+    window_sum = csum[None, 1:] - csum[start_clipped]
+    window_count = ccount[None, 1:] - ccount[start_clipped]
+
+    out = window_sum / periods[:, None]
+    out[(start < 0) | (window_count < periods[:, None])] = np.nan
+    return out
+
+
+def ema_matrix(values, periods):
+    """
+    EMA (jak ewm(span=p).mean(), adjust=True) dla wielu okresów w jednej rekurencji.
+
+    Licznik i mianownik średniej ważonej są liczone blokami w postaci zamkniętej
+    (skalowana suma skumulowana), wektorowo po okresach i po świecach w bloku;
+    stan przenoszony jest między blokami. Braki danych (NaN) zachowują się jak w pandas
+    (ignore_na=False): wagi maleją, a wynik przenosi ostatnią wartość.
+
+    Returns:
+        np.ndarray (len(periods), len(values))
+    """
+    x = np.asarray(values, dtype=float)
+    spans = np.asarray(periods, dtype=float)
+    if np.any(spans < 1):
+        raise ValueError("Okres EMA musi być >= 1")
+    n = len(x)
+    k = len(spans)
+    out = np.full((k, n), np.nan)
+    if n == 0:
+        return out
+
+    valid = ~np.isnan(x)
+    xv = np.where(valid, x, 0.0)
+    w = valid.astype(float)
+    decay = 1.0 - 2.0 / (spans + 1.0)
+
+    # span == 1 -> alpha == 1: EMA to po prostu ostatnia znana wartość
+    recursive = decay > 0
+    if not np.all(recursive):
+        last = np.maximum.accumulate(np.where(valid, np.arange(n), -1))
+        carried = np.where(last >= 0, x[np.clip(last, 0, None)], np.nan)
+        out[~recursive] = carried
+
+    if np.any(recursive):
+        d = decay[recursive][:, None]
+        block = max(1, int(EMA_BLOCK_LOG10_RANGE / -np.log10(d.min())))
+        num_prev = np.zeros((len(d), 1))
+        den_prev = np.zeros((len(d), 1))
+        rows = np.flatnonzero(recursive)
+        for b in range(0, n, block):
+            j = np.arange(min(block, n - b))
+            grow = d ** (-j)        # decay^-j
+            shrink = d ** j         # decay^j
+            num = shrink * (d * num_prev + np.cumsum(grow * xv[b:b + len(j)], axis=1))
+            den = shrink * (d * den_prev + np.cumsum(grow * w[b:b + len(j)], axis=1))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[rows, b:b + len(j)] = np.where(den > 0, num / den, np.nan)
+            num_prev = num[:, -1:]
+            den_prev = den[:, -1:]
+    return out
+
+
+def detect_crosses(fast, slow, lookback=1):
+    """
+    Wykrywa złoty (szybka przebija wolną od dołu) i śmiertelny krzyż w ostatnich `lookback` świecach.
+
+    Returns:
+        dict: {'type': 'golden'|'death'|None, 'bars_ago': int|None}
+    """
+    fast = np.asarray(fast, dtype=float)
+    slow = np.asarray(slow, dtype=float)
+    diff = np.sign(fast - slow)
+    for bars_ago in range(min(lookback, len(diff) - 1)):
+        cur = diff[-1 - bars_ago]
+        prev = diff[-2 - bars_ago]
+        if np.isnan(cur) or np.isnan(prev):
+            break
+        if prev <= 0 < cur:
+            return {'type': 'golden', 'bars_ago': bars_ago}
+        if prev >= 0 > cur:
+            return {'type': 'death', 'bars_ago': bars_ago}
+    return {'type': None, 'bars_ago': None}
+
+
+def calculate_moving_averages_signals(df, periods=DEFAULT_PERIODS, cross_pairs=(), cross_lookback=1):
     """
     Oblicza sygnały SMA i EMA dla różnych okresów i zwraca sumaryczną ocenę
 
     Args:
         df: DataFrame z danymi OHLCV
         periods: lista okresów do obliczenia (domyślnie [5, 15, 30, 60])
+        cross_pairs: pary (szybka, wolna) SMA do wykrywania krzyży, np. [(50, 200)]
+        cross_lookback: w ilu ostatnich świecach szukać krzyża
 
     Returns:
         dict: zawiera szczegółowe wyniki i sumaryczną ocenę
@@ -14,6 +142,13 @@ def calculate_moving_averages_signals(df, periods=[5, 15, 30, 60]):
     close = df['Close']
     current_price = close.iloc[-1]
 
+    # Wszystkie okna liczone jednym przebiegiem (z jednej sumy skumulowanej / jednej rekurencji)
+    cross_periods = [p for pair in cross_pairs for p in pair]
+    sma_periods = list(dict.fromkeys(list(periods) + cross_periods))
+    sma_all = sma_matrix(close.to_numpy(), sma_periods)
+    ema_all = ema_matrix(close.to_numpy(), periods)
+    sma_row = {period: i for i, period in enumerate(sma_periods)}
+
     sma_signals = []
     ema_signals = []
 
@@ -23,13 +158,13 @@ def calculate_moving_averages_signals(df, periods=[5, 15, 30, 60]):
         'ema_details': {},
         'sma_summary': {},
         'ema_summary': {},
-        'overall_summary': {}
+        'overall_summary': {},
+        'crosses': {}
     }
 
     # Oblicz SMA dla każdego okresu
     for period in periods:
-        sma = close.rolling(window=period).mean()
-        sma_value = sma.iloc[-1]
+        sma_value = sma_all[sma_row[period], -1]
 
         # Sygnał: cena vs SMA
         if current_price > sma_value:
@@ -47,9 +182,8 @@ def calculate_moving_averages_signals(df, periods=[5, 15, 30, 60]):
         }
 
     # Oblicz EMA dla każdego okresu
-    for period in periods:
-        ema = close.ewm(span=period).mean()
-        ema_value = ema.iloc[-1]
+    for i, period in enumerate(periods):
+        ema_value = ema_all[i, -1]
 
         # Sygnał: cena vs EMA
         if current_price > ema_value:
@@ -72,17 +206,10 @@ def calculate_moving_averages_signals(df, periods=[5, 15, 30, 60]):
     total_sum = sma_sum + ema_sum
 
     # Funkcja do konwersji sumy na ocenę tekstową
+    # (>= 75% -> 2 "Mocne kupuj", >= 25% -> 1 "Kupuj", symetrycznie dla sprzedaj, inaczej 0 "Trzymaj";
+    # ułamki: MA_STRONG_FRACTION / MA_WEAK_FRACTION)
     def sum_to_signal(signal_sum, max_signals):
-        if signal_sum >= max_signals * 0.75:
-            return 2 #"Mocne kupuj"
-        elif signal_sum >= max_signals * 0.25:
-            return 1 #"Kupuj"
-        elif signal_sum <= -max_signals * 0.75:
-            return -2 #"Mocne sprzedaj"
-        elif signal_sum <= -max_signals * 0.25:
-            return -1 #"Sprzedaj"
-        else:
-            return 0 #"Trzymaj"
+        return int(sum_to_rate(signal_sum, max_signals, MA_STRONG_FRACTION, MA_WEAK_FRACTION))
 
     # Oceny sumaryczne
     max_sma_signals = len(periods)
@@ -127,4 +254,30 @@ def calculate_moving_averages_signals(df, periods=[5, 15, 30, 60]):
         'neutral_count': sma_neutral + ema_neutral
     }
 
+    for fast, slow in cross_pairs:
+        results['crosses'][f'SMA{fast}/SMA{slow}'] = detect_crosses(
+            sma_all[sma_row[fast]], sma_all[sma_row[slow]], cross_lookback)
+
     return results
+
+
+def moving_average_rate_series(df, periods=DEFAULT_PERIODS):
+    """
+    Oceny krzywych kroczących dla każdej świecy jednym przebiegiem - te same reguły co
+    calculate_moving_averages_signals (cena vs SMA/EMA, sum_to_signal), ale dla całej historii.
+
+    Returns:
+        dict: {'sma': np.ndarray, 'ema': np.ndarray, 'overall': np.ndarray} ocen -2..2
+              oraz 'score': suma sygnałów SMA i EMA dla każdej świecy
+    """
+    close = df['Close'].to_numpy(dtype=float)
+    sma_sum = price_vs_average_signals(close, sma_matrix(close, periods)).sum(axis=0, dtype=np.int64)
+    ema_sum = price_vs_average_signals(close, ema_matrix(close, periods)).sum(axis=0, dtype=np.int64)
+    total_sum = sma_sum + ema_sum
+    rate = lambda signal_sum, max_signals: sum_to_rate(signal_sum, max_signals, MA_STRONG_FRACTION, MA_WEAK_FRACTION)
+    return {
+        'sma': rate(sma_sum, len(periods)),
+        'ema': rate(ema_sum, len(periods)),
+        'overall': rate(total_sum, 2 * len(periods)),
+        'score': total_sum,
+    }
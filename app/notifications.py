@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Zbieranie powiadomień z jednego cyklu i łączenie ich w jak najmniej wiadomości.
+
+Zamiast osobnego wywołania API na każdy alert, błąd i "Brak danych" cykl dodaje teksty do
+NotificationBatch, a flush() wysyła je posortowane wg priorytetu (czerwone alerty pierwsze),
+sklejone w wiadomości nie dłuższe niż limit Telegrama (4096 znaków).
+
+Wysyłka odbywa się w tle (OutboundQueue): pętla monitorująca tylko wrzuca wiadomości do
+ograniczonej kolejki, a wątek nadawcy pilnuje limitu (token bucket), respektuje retry_after
+z odpowiedzi 429, ponawia błędy przejściowe, a niedostarczone wiadomości zapisuje w pliku
+(JSONL) i wysyła ponownie później - także po restarcie.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+from drop_alerts import RED, YELLOW, GREEN
+
+TELEGRAM_MAX_LENGTH = 4096
+MESSAGE_SEPARATOR = "\n\n"
+
+# Priorytety (mniejszy = wcześniej)
+PRIORITY_RED = 0
+PRIORITY_YELLOW = 1
+PRIORITY_GREEN = 2
+PRIORITY_ERROR = 3
+PRIORITY_ANALYSIS = 4
+PRIORITY_INFO = 5
+
+LEVEL_PRIORITIES = {RED: PRIORITY_RED, YELLOW: PRIORITY_YELLOW, GREEN: PRIORITY_GREEN}
+
+# Wynik pojedynczej próby wysyłki: (status, retry_after w sekundach lub None)
+DELIVERED = "delivered"
+RETRY = "retry"      # błąd przejściowy (sieć, 5xx, 429) - ponowić
+FAILED = "failed"    # błąd trwały (np. 400 - zły HTML) - nie ponawiać
+
+# Telegram: ok. 20 wiadomości na minutę do jednego czatu/grupy, krótkie serie dozwolone
+OUTBOX_RATE_PER_MINUTE = float(os.getenv("TG_RATE_PER_MINUTE", "20"))
+OUTBOX_BURST = int(os.getenv("TG_BURST", "3"))
+OUTBOX_MAX_SIZE = int(os.getenv("TG_QUEUE_SIZE", "500"))
+OUTBOX_MAX_RETRIES = int(os.getenv("TG_MAX_RETRIES", "5"))
+OUTBOX_SPOOL_PATH = os.getenv("TG_SPOOL_PATH", os.path.join("data", "outbox.jsonl"))
+# Co ile sekund (przy pustej kolejce) próbować ponownie wiadomości z pliku
+OUTBOX_SPOOL_RETRY_INTERVAL = 60
+
+
+def split_text(text, max_length=TELEGRAM_MAX_LENGTH):
+    """Dzieli zbyt długi tekst po liniach (a linię dłuższą niż limit - na sztywno)."""
+    if len(text) <= max_length:
+        return [text]
+    parts = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > max_length:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:max_length])
+            line = line[max_length:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > max_length:
+            parts.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+def pack_messages(texts, max_length=TELEGRAM_MAX_LENGTH, separator=MESSAGE_SEPARATOR):
+    """Skleja teksty (w podanej kolejności) w jak najmniej wiadomości nie dłuższych niż max_length."""
+    messages = []
+    current = ""
+    for text in texts:
+        for part in split_text(text, max_length):
+            candidate = f"{current}{separator}{part}" if current else part
+            if len(candidate) > max_length:
+                messages.append(current)
+                current = part
+            else:
+                current = candidate
+    if current:
+        messages.append(current)
+    return messages
+
+
+class NotificationBatch:
+    """Powiadomienia z jednego cyklu; flush() wysyła je scalone przez `send(text)`."""
+
+    def __init__(self, send, max_length=TELEGRAM_MAX_LENGTH):
+        self.send = send
+        self.max_length = max_length
+        self.items = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, text, priority=PRIORITY_INFO):
+        with self.lock:
+            # numer kolejny zachowuje kolejność w obrębie priorytetu
+            self.items.append((priority, len(self.items), text))
+
+    def messages(self):
+        with self.lock:
+            ordered = [text for _priority, _order, text in sorted(self.items)]
+        return pack_messages(ordered, self.max_length)
+
+    def flush(self):
+        """Wysyła zebrane powiadomienia; zwraca liczbę wysłanych wiadomości."""
+        with self.lock:
+            items, self.items = self.items, []
+        messages = pack_messages([text for _priority, _order, text in sorted(items)], self.max_length)
+        for message in messages:
+            self.send(message)
+        return len(messages)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+
+class TokenBucket:
+    """Limit wysyłki: `rate` żetonów na sekundę, najwyżej `capacity` naraz (seria)."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, stop=None):
+        """Czeka na żeton; zwraca False jeśli przerwano (ustawiony `stop`)."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if stop is not None:
+                if stop.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+    def pause(self, seconds):
+        """Po 429: brak żetonów przez `seconds` (retry_after)."""
+        with self.lock:
+            self._refill()
+            self.tokens = 1.0 - seconds * self.rate
+
+
+class OutboundQueue:
+    """
+    Kolejka wychodząca z wątkiem nadawcy.
+
+    Args:
+        send: funkcja text -> (status, retry_after) wykonująca jedną próbę wysyłki
+        spool_path: plik JSONL na niedostarczone wiadomości (None - bez zapisu)
+        name: nazwa kanału w logach
+    """
+
+    def __init__(self, send, maxsize=OUTBOX_MAX_SIZE, rate_per_minute=OUTBOX_RATE_PER_MINUTE,
+                 burst=OUTBOX_BURST, max_retries=OUTBOX_MAX_RETRIES, spool_path=OUTBOX_SPOOL_PATH,
+                 backoff=2.0, name="TG"):
+        self.send = send
+        self.name = name
+        self.maxsize = maxsize
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.max_retries = max_retries
+        self.spool_path = spool_path
+        self.backoff = backoff
+        self.spool_lock = threading.Lock()
+        self.stats = {'delivered': 0, 'retried': 0, 'failed': 0, 'spooled': 0}
+        self.pid = None
+        self.thread = None
+
+    def _ensure_started(self):
+        # wątek nie przechodzi przez fork - w nowym procesie startujemy nadawcę od nowa
+        if self.pid == os.getpid() and self.thread is not None and self.thread.is_alive():
+            return
+        self.pid = os.getpid()
+        self.queue = queue.Queue(maxsize=self.maxsize)
+        self.stop_event = threading.Event()
+        self.last_spooled = 0.0
+        self.thread = threading.Thread(target=self._run, name=f"outbound-{self.name}", daemon=True)
+        self.thread.start()
+        self.requeue_spool()
+
+    def start(self):
+        self._ensure_started()
+        return self
+
+    def put(self, text):
+        """Dodaje wiadomość do kolejki bez blokowania; przy pełnej kolejce zapisuje ją do pliku."""
+        self._ensure_started()
+        try:
+            self.queue.put_nowait({'text': text, 'attempts': 0})
+        except queue.Full:
+            print(f"[{self.name}] Kolejka pełna - wiadomość zapisana do ponownej wysyłki")
+            self._spool({'text': text, 'attempts': 0})
+
+    def pending(self):
+        return self.queue.qsize() if self.thread is not None else 0
+
+    def stop(self, timeout=10):
+        """Zatrzymuje nadawcę; niewysłane wiadomości z kolejki trafiają do pliku."""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join(timeout)
+        while True:
+            try:
+                self._spool(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                item = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                if time.monotonic() - self.last_spooled >= OUTBOX_SPOOL_RETRY_INTERVAL:
+                    self.requeue_spool()
+                continue
+            self._deliver(item)
+
+    def _deliver(self, item):
+        while True:
+            if not self.bucket.acquire(self.stop_event):
+                self._spool(item)
+                return
+            try:
+                status, retry_after = self.send(item['text'])
+            except Exception as e:
+                print(f"[{self.name}] Wyjątek przy wysyłce: {e}")
+                status, retry_after = RETRY, None
+
+            if status == DELIVERED:
+                self.stats['delivered'] += 1
+                return
+            if status == FAILED:
+                self.stats['failed'] += 1
+                print(f"[{self.name}] Wiadomość odrzucona (bez ponawiania): {item['text'][:80]!r}")
+                return
+
+            self.stats['retried'] += 1
+            if retry_after is not None:
+                # 429: czekamy dokładnie tyle, ile każe Telegram (nie liczy się jako nieudana próba)
+                print(f"[{self.name}] Limit wysyłki (429) - ponowienie za {retry_after}s")
+                self.bucket.pause(retry_after)
+                continue
+            item['attempts'] += 1
+            if item['attempts'] > self.max_retries:
+                print(f"[{self.name}] Nie udało się wysłać po {self.max_retries} próbach - zapis do ponownej wysyłki")
+                self._spool(item)
+                return
+            if self.stop_event.wait(min(self.backoff * 2 ** (item['attempts'] - 1), 60)):
+                self._spool(item)
+                return
+
+    def _spool(self, item):
+        if self.spool_path is None:
+            print(f"[{self.name}] Utracono wiadomość: {item['text'][:80]!r}")
+            return
+        with self.spool_lock:
+            if os.path.dirname(self.spool_path):
+                os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({'text': item['text'], 'attempts': item['attempts']}, ensure_ascii=False) + "\n")
+        self.stats['spooled'] += 1
+        self.last_spooled = time.monotonic()
+
+    def requeue_spool(self):
+        """Przenosi wiadomości z pliku z powrotem do kolejki (z wyzerowanym licznikiem prób)."""
+        if self.spool_path is None or not os.path.exists(self.spool_path):
+            return 0
+        with self.spool_lock:
+            with open(self.spool_path, encoding="utf-8") as f:
+                items = [json.loads(line) for line in f if line.strip()]
+            os.remove(self.spool_path)
+        self.last_spooled = time.monotonic()
+        for item in items:
+            self.put(item['text'])
+        if items:
+            print(f"[{self.name}] Ponowna wysyłka {len(items)} zapisanych wiadomości")
+        return len(items)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Kanały powiadomień: Telegram, webhook, e-mail (SMTP), plik / stdout.
+
+Każdy kanał ma własną OutboundQueue (osobny wątek, limit, ponowienia, timeout i plik
+niewysłanych), a MultiNotifier.send() tylko wrzuca wiadomość do kolejek wszystkich kanałów.
+Wolny albo niedostępny kanał nie opóźnia więc pozostałych ani pętli monitorującej.
+
+Konfiguracja (ENV):
+    TG_BOT_TOKEN, TG_CHAT_ID          - Telegram (TG_CHAT_ID może zawierać kilka czatów po przecinku)
+    NOTIFY_WEBHOOK_URLS               - adresy webhooków (POST JSON {"text", "html"}), po przecinku
+    NOTIFY_SMTP_HOST, NOTIFY_SMTP_PORT, NOTIFY_SMTP_FROM, NOTIFY_SMTP_TO (po przecinku),
+    NOTIFY_SMTP_USER, NOTIFY_SMTP_PASSWORD, NOTIFY_SMTP_STARTTLS (1/0)
+    NOTIFY_FILE                       - ścieżka pliku albo "-" (stdout)
+    NOTIFY_TIMEOUT                    - timeout pojedynczej próby w sekundach (domyślnie 10)
+"""
+import html
+import os
+import re
+import smtplib
+import sys
+import threading
+from datetime import datetime
+from email.message import EmailMessage
+
+import requests
+
+from notifications import OutboundQueue, DELIVERED, RETRY, FAILED, OUTBOX_SPOOL_PATH
+
+NOTIFY_TIMEOUT = float(os.getenv("NOTIFY_TIMEOUT", "10"))
+# Kanały bez limitów Telegrama
+UNLIMITED_RATE_PER_MINUTE = 600
+
+_TAGS = re.compile(r"<[^>]+>")
+
+
+def plain_text(text):
+    """Tekst bez znaczników HTML (dla e-maila, webhooka i pliku)."""
+    return html.unescape(_TAGS.sub("", text))
+
+
+def _env_list(name):
+    return [v.strip() for v in os.getenv(name, "").split(",") if v.strip()]
+
+
+class TelegramSink:
+    rate_per_minute = None  # domyślny limit kolejki (Telegram)
+
+    def __init__(self, token, chat_id, timeout=NOTIFY_TIMEOUT, parse_mode="HTML"):
+        self.token = token
+        self.chat_id = chat_id
+        self.timeout = timeout
+        self.parse_mode = parse_mode
+        self.name = f"telegram-{chat_id}"
+
+    def deliver(self, text):
+        """Jedna próba wysyłki przez API; zwraca (status, retry_after)."""
+        url = f"https://api.telegram.org/bot{self.token}/sendMessage"
+        payload = {"chat_id": self.chat_id, "text": text,
+                   "parse_mode": self.parse_mode,
+                   "disable_web_page_preview": True}
+        try:
+            resp = requests.post(url, json=payload, timeout=self.timeout)
+        except Exception as e:
+            print(f"[{self.name}] Wyjątek przy wysyłce: {e}")
+            return RETRY, None
+        if resp.ok:
+            return DELIVERED, None
+        print(f"[{self.name}] Błąd wysyłki: {resp.status_code} {resp.text}")
+        if resp.status_code == 429:
+            try:
+                retry_after = resp.json().get("parameters", {}).get("retry_after", 1)
+            except ValueError:
+                retry_after = 1
+            return RETRY, retry_after
+        if resp.status_code >= 500:
+            return RETRY, None
+        return FAILED, None
+
+
+class WebhookSink:
+    rate_per_minute = UNLIMITED_RATE_PER_MINUTE
+
+    def __init__(self, url, timeout=NOTIFY_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.name = f"webhook-{re.sub(r'^https?://', '', url).split('/')[0]}"
+
+    def deliver(self, text):
+        try:
+            resp = requests.post(self.url, json={"text": plain_text(text), "html": text}, timeout=self.timeout)
+        except Exception as e:
+            print(f"[{self.name}] Wyjątek przy wysyłce: {e}")
+            return RETRY, None
+        if resp.ok:
+            return DELIVERED, None
+        print(f"[{self.name}] Błąd wysyłki: {resp.status_code}")
+        if resp.status_code == 429:
+            retry_after = resp.headers.get("Retry-After")
+            return RETRY, float(retry_after) if retry_after and retry_after.isdigit() else None
+        if resp.status_code >= 500 or resp.status_code == 408:
+            return RETRY, None
+        return FAILED, None
+
+
+class SmtpSink:
+    rate_per_minute = UNLIMITED_RATE_PER_MINUTE
+
+    def __init__(self, host, port, sender, recipients, username=None, password=None,
+                 starttls=False, timeout=NOTIFY_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = list(recipients)
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.name = f"smtp-{host}"
+
+    def message(self, text):
+        body = plain_text(text)
+        msg = EmailMessage()
+        msg["Subject"] = body.split("\n", 1)[0][:120]
+        msg["From"] = self.sender
+        msg["To"] = ", ".join(self.recipients)
+        msg.set_content(body)
+        msg.add_alternative(text.replace("\n", "<br>\n"), subtype="html")
+        return msg
+
+    def deliver(self, text):
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                if self.starttls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password)
+                smtp.send_message(self.message(text))
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                smtplib.SMTPAuthenticationError) as e:
+            print(f"[{self.name}] Odrzucono: {e}")
+            return FAILED, None
+        except (smtplib.SMTPException, OSError) as e:
+            print(f"[{self.name}] Wyjątek przy wysyłce: {e}")
+            return RETRY, None
+        return DELIVERED, None
+
+
+class FileSink:
+    rate_per_minute = UNLIMITED_RATE_PER_MINUTE
+
+    def __init__(self, path):
+        self.path = path
+        self.name = "stdout" if path == "-" else f"file-{os.path.basename(path)}"
+        self.lock = threading.Lock()
+
+    def deliver(self, text):
+        line = f"[{datetime.now().isoformat(timespec='seconds')}] {plain_text(text)}\n"
+        try:
+            with self.lock:
+                if self.path == "-":
+                    sys.stdout.write(line)
+                    sys.stdout.flush()
+                else:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(line)
+        except OSError as e:
+            print(f"[{self.name}] Błąd zapisu: {e}")
+            return RETRY, None
+        return DELIVERED, None
+
+
+def spool_path_for(name):
+    """Osobny plik niewysłanych wiadomości dla każdego kanału (obok OUTBOX_SPOOL_PATH)."""
+    root, ext = os.path.splitext(OUTBOX_SPOOL_PATH)
+    return f"{root}-{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}{ext}"
+
+
+class MultiNotifier:
+    """Rozsyła każdą wiadomość do wszystkich kanałów - każdy przez własną kolejkę w tle."""
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+        self.queues = []
+        for sink in self.sinks:
+            options = {} if sink.rate_per_minute is None else {'rate_per_minute': sink.rate_per_minute}
+            self.queues.append(OutboundQueue(sink.deliver, spool_path=spool_path_for(sink.name),
+                                             name=sink.name, **options))
+
+    def start(self):
+        for q in self.queues:
+            q.start()
+        return self
+
+    def send(self, text):
+        for q in self.queues:
+            q.put(text)
+
+    def pending(self):
+        return sum(q.pending() for q in self.queues)
+
+    def stats(self):
+        return {q.name: dict(q.stats) for q in self.queues}
+
+    def stop(self, timeout=10):
+        # najpierw sygnał dla wszystkich kanałów - czekamy równolegle, a nie po kolei
+        for q in self.queues:
+            q.stop_event.set()
+        for q in self.queues:
+            q.stop(timeout)
+
+
+def sinks_from_env():
+    sinks = []
+    token = os.getenv("TG_BOT_TOKEN")
+    if token:
+        sinks += [TelegramSink(token, chat_id) for chat_id in _env_list("TG_CHAT_ID")]
+    sinks += [WebhookSink(url) for url in _env_list("NOTIFY_WEBHOOK_URLS")]
+    if os.getenv("NOTIFY_SMTP_HOST") and _env_list("NOTIFY_SMTP_TO"):
+        sinks.append(SmtpSink(
+            os.getenv("NOTIFY_SMTP_HOST"),
+            int(os.getenv("NOTIFY_SMTP_PORT", "25")),
+            os.getenv("NOTIFY_SMTP_FROM", "gieldaalerts@localhost"),
+            _env_list("NOTIFY_SMTP_TO"),
+            os.getenv("NOTIFY_SMTP_USER") or None,
+            os.getenv("NOTIFY_SMTP_PASSWORD") or None,
+            os.getenv("NOTIFY_SMTP_STARTTLS", "0") == "1",
+        ))
+    if os.getenv("NOTIFY_FILE"):
+        sinks.append(FileSink(os.getenv("NOTIFY_FILE")))
+    return sinks
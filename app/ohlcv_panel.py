@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Zwarty panel OHLCV dla wielu tickerów.
+
+yf.download(group_by="ticker") zwraca DataFrame float64 z kolumnami MultiIndex (ticker, pole).
+Panel trzyma te same dane jako jeden ciągły blok float32 (konfigurowalny) o kształcie
+(symbole, pola, świece), wspólny DatetimeIndex i mapę symbol -> pozycja.
+panel[ticker] zwraca zwykły DataFrame będący widokiem (bez kopiowania), więc kod wskaźników
+i alertów przyjmuje panel bezpośrednio - tak jak dotąd hist[ticker].
+
+Panel (i dowolną tablicę) można umieścić w pamięci współdzielonej i podłączyć w procesach puli
+bez kopiowania i serializacji danych (share_array / attach_array, to_shared_memory / attach).
+"""
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume')
+FIELD_INDEX = {field: i for i, field in enumerate(FIELDS)}
+PANEL_DTYPE = os.getenv("PANEL_DTYPE", "float32")
+
+
+class OHLCVPanel:
+    def __init__(self, data, index, symbols):
+        """
+        Args:
+            data: np.ndarray (len(symbols), len(FIELDS), len(index))
+            index: wspólny DatetimeIndex świec
+            symbols: lista symboli w kolejności pierwszego wymiaru data
+        """
+        data = np.ascontiguousarray(data)
+        if data.shape != (len(symbols), len(FIELDS), len(index)):
+            raise ValueError(f"Nieprawidłowy kształt danych panelu: {data.shape}")
+        self.data = data
+        self.index = pd.DatetimeIndex(index)
+        self.symbols = list(symbols)
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def from_yfinance(cls, hist, symbols=None, dtype=None):
+        """Buduje panel z wyniku yf.download (MultiIndex lub pojedynczy ticker)."""
+        dtype = np.dtype(dtype or PANEL_DTYPE)
+        if hist is None or hist.empty:
+            return cls(np.empty((0, len(FIELDS), 0), dtype=dtype), pd.DatetimeIndex([]), [])
+
+        if isinstance(hist.columns, pd.MultiIndex):
+            # group_by="ticker" -> (ticker, pole); bez group_by -> (pole, ticker)
+            level = 0 if set(FIELDS) & set(hist.columns.get_level_values(1)) else 1
+            available = list(dict.fromkeys(hist.columns.get_level_values(level)))
+            frames = lambda symbol: hist.xs(symbol, axis=1, level=level)
+        else:
+            if symbols is None or len(symbols) != 1:
+                raise ValueError("Dla danych bez MultiIndex podaj dokładnie jeden symbol")
+            available = list(symbols)
+            frames = lambda symbol: hist
+
+        symbols = available if symbols is None else [s for s in symbols if s in available]
+        data = np.full((len(symbols), len(FIELDS), len(hist.index)), np.nan, dtype=dtype)
+        for j, symbol in enumerate(symbols):
+            sub = frames(symbol)
+            for f, field in enumerate(FIELDS):
+                if field in sub.columns:
+                    data[j, f] = sub[field].to_numpy(dtype=dtype, na_value=np.nan)
+        return cls(data, hist.index, symbols)
+
+    @property
+    def empty(self):
+        return self.data.size == 0
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, symbol):
+        return symbol in self.symbol_index
+
+    def __getitem__(self, symbol):
+        return self.frame(symbol)
+
+    def frame(self, symbol):
+        """DataFrame OHLCV dla symbolu - widok na dane panelu (bez kopiowania)."""
+        block = self.data[self.symbol_index[symbol]]
+        return pd.DataFrame(block.T, index=self.index, columns=list(FIELDS), copy=False)
+
+    def column(self, symbol, field):
+        """Ciągły wektor numpy jednego pola dla symbolu (widok)."""
+        return self.data[self.symbol_index[symbol], FIELD_INDEX[field]]
+
+    def field(self, field):
+        """Macierz (symbole, świece) jednego pola dla wszystkich symboli (widok)."""
+        return self.data[:, FIELD_INDEX[field]]
+
+    def has_data(self, symbol, field='Close'):
+        """Czy symbol ma choć jedną wartość (nie NaN) danego pola."""
+        return symbol in self and not np.isnan(self.column(symbol, field)).all()
+
+    def last_valid(self, field='Close'):
+        """
+        Ostatnia znana (nie NaN) wartość pola dla każdego symbolu.
+
+        Returns:
+            (wartości, pozycje świec) - np.ndarray o długości len(symbols); NaN / -1 gdy brak danych
+        """
+        values = self.field(field)
+        if values.shape[1] == 0:
+            return np.full(len(self.symbols), np.nan), np.full(len(self.symbols), -1)
+        valid = ~np.isnan(values)
+        positions = values.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+        positions = np.where(valid.any(axis=1), positions, -1)
+        last = values[np.arange(len(self.symbols)), np.clip(positions, 0, None)]
+        return np.where(positions >= 0, last, np.nan), positions
+
+    def first_valid(self, field='Open'):
+        """Pierwsza znana (nie NaN) wartość pola dla każdego symbolu (np. cena otwarcia sesji); NaN gdy brak."""
+        values = self.field(field)
+        if values.shape[1] == 0:
+            return np.full(len(self.symbols), np.nan)
+        valid = ~np.isnan(values)
+        first = values[np.arange(len(self.symbols)), np.argmax(valid, axis=1)]
+        return np.where(valid.any(axis=1), first, np.nan)
+
+    def before(self, timestamp):
+        """Panel ze świecami sprzed `timestamp` - np. tylko zakończone sesje."""
+        stop = self.index.searchsorted(pd.Timestamp(timestamp), side='left')
+        return OHLCVPanel(self.data[:, :, :stop], self.index[:stop], self.symbols)
+
+    def to_shared_memory(self):
+        """
+        Kopiuje dane panelu do pamięci współdzielonej.
+
+        Returns:
+            (SharedMemory, opis dla OHLCVPanel.attach) - właściciel zamyka i usuwa segment (close/unlink)
+        """
+        shm, array_spec = share_array(self.data)
+        return shm, (array_spec, self.index, self.symbols)
+
+    @classmethod
+    def attach(cls, spec):
+        """Panel na danych z pamięci współdzielonej (bez kopiowania) - np. w procesie puli."""
+        array_spec, index, symbols = spec
+        shm, data = attach_array(array_spec)
+        panel = cls(data, index, symbols)
+        panel.shm = shm  # segment musi żyć tak długo jak panel
+        return panel
+
+
+def share_array(array):
+    """Tworzy segment pamięci współdzielonej z kopią tablicy; zwraca (SharedMemory, opis)."""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    shared[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def attach_array(spec):
+    """Podłącza tablicę z pamięci współdzielonej; zwraca (SharedMemory, np.ndarray - widok)."""
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+Przegląd (sweep) parametrów wskaźników na danych historycznych.
+
+Progi i okresy w ticker_analizer.py i moving_analizer.py (pasma RSI 25/75, CCI ±200,
+BOP ±0.1, EMV ±1, wagi 0.7/0.3 trend/oscylatory) zostały dobrane ręcznie. Ten moduł ocenia
+całe siatki parametrów: wartości wskaźnika liczone są raz na okres, a progi oceniane
+jednocześnie przez broadcasting po osi parametrów. Tickery liczone są równolegle w puli procesów.
+
+Skuteczność (hit-rate): sygnał kupuj trafiony, gdy cena po `horizon` świecach jest wyższa;
+sprzedaj - gdy niższa.
+
+Użycie:
+    python app/parameter_sweep.py CDR.WA PKN.WA AAPL --period 5y --horizon 5 --workers 4 --out sweep.csv
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from moving_analizer import sma_matrix, ema_matrix
+from signal_rules import (band_momentum_signals, threshold_signals, price_vs_average_signals,
+                          score_to_rate, BUY, SELL)
+from ticker_analizer import download_with_retry, group_rate_series
+
+DEFAULT_HORIZON = 5
+
+# Siatki parametrów: dla każdej rodziny osie w kolejności wymiarów tablicy sygnałów
+DEFAULT_GRID = {
+    'RSI': {'period': [7, 10, 14, 21], 'lower': [15, 20, 25, 30, 35], 'upper': [65, 70, 75, 80, 85]},
+    'STS': {'k_period': [9, 14, 21], 'lower': [10, 15, 20, 25, 30], 'upper': [70, 75, 80, 85, 90]},
+    'Williams %R': {'period': [7, 10, 14, 21], 'lower': [-90, -85, -80, -75, -70], 'upper': [-30, -25, -20, -15, -10]},
+    'CCI': {'period': [10, 14, 20], 'band': [100, 150, 200, 250, 300]},
+    'MFI': {'period': [10, 14, 21], 'lower': [15, 20, 25, 30, 35], 'upper': [65, 70, 75, 80, 85]},
+    'BOP': {'period': [7, 14, 21, 28], 'threshold': [0.0, 0.05, 0.1, 0.15, 0.2, 0.3]},
+    'EMV': {'period': [7, 14, 21, 28], 'threshold': [0.0, 0.25, 0.5, 1.0, 1.5, 2.0, 3.0]},
+    'SMA': {'period': [5, 10, 15, 20, 30, 50, 60, 100, 150, 200]},
+    'EMA': {'period': [5, 10, 15, 20, 30, 50, 60, 100, 150, 200]},
+    'SCORE': {'trend_weight': [round(w, 2) for w in np.linspace(0, 1, 21)],
+              'weak_cutoff': [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7]},
+}
+
+
+def _axes(values, ndim, axis):
+    """Ustawia wektor parametrów na osi `axis` z `ndim` osi (ostatnia oś to czas)."""
+    shape = [1] * ndim
+    shape[axis] = -1
+    return np.asarray(values, dtype=float).reshape(shape)
+
+
+def _rolling_sum(values, periods):
+    return sma_matrix(values, periods) * np.asarray(periods, dtype=float)[:, None]
+
+
+def _rolling_extreme(values, periods, func):
+    series = pd.Series(values)
+    rolling = (series.rolling(window=p) for p in periods)
+    return np.vstack([getattr(r, func)().to_numpy() for r in rolling])
+
+
+def rsi_values(df, periods):
+    close = df['Close'].to_numpy(dtype=float)
+    delta = np.diff(close, prepend=np.nan)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    avg_gain = sma_matrix(gain, periods)
+    avg_loss = sma_matrix(loss, periods)
+    avg_loss = np.where(avg_loss == 0, 1e-10, avg_loss)
+    return 100 - (100 / (1 + avg_gain / avg_loss))
+
+
+def stochastic_k_values(df, periods):
+    close = df['Close'].to_numpy(dtype=float)
+    lowest = _rolling_extreme(df['Low'].to_numpy(dtype=float), periods, 'min')
+    highest = _rolling_extreme(df['High'].to_numpy(dtype=float), periods, 'max')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 100 * (close - lowest) / (highest - lowest)
+
+
+def williams_r_values(df, periods):
+    close = df['Close'].to_numpy(dtype=float)
+    lowest = _rolling_extreme(df['Low'].to_numpy(dtype=float), periods, 'min')
+    highest = _rolling_extreme(df['High'].to_numpy(dtype=float), periods, 'max')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return -100 * (highest - close) / (highest - lowest)
+
+
+def cci_values(df, periods):
+    typical = ((df['High'] + df['Low'] + df['Close']) / 3).to_numpy(dtype=float)
+    sma = sma_matrix(typical, periods)
+    out = np.full(sma.shape, np.nan)
+    for i, p in enumerate(periods):
+        if len(typical) < p:
+            continue
+        windows = np.lib.stride_tricks.sliding_window_view(typical, p)
+        mad = np.mean(np.abs(windows - windows.mean(axis=1, keepdims=True)), axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[i, p - 1:] = (typical[p - 1:] - sma[i, p - 1:]) / (0.015 * mad)
+    return out
+
+
+def mfi_values(df, periods):
+    typical = ((df['High'] + df['Low'] + df['Close']) / 3).to_numpy(dtype=float)
+    money_flow = typical * df['Volume'].to_numpy(dtype=float)
+    prev_typical = np.concatenate(([np.nan], typical[:-1]))
+    positive = np.where(typical > prev_typical, money_flow, 0.0)
+    negative = np.where(typical < prev_typical, money_flow, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = _rolling_sum(positive, periods) / _rolling_sum(negative, periods)
+        return 100 - (100 / (1 + ratio))
+
+
+def bop_values(df, periods):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bop = ((df['Close'] - df['Open']) / (df['High'] - df['Low'])).to_numpy(dtype=float)
+    return sma_matrix(bop, periods)
+
+
+def emv_values(df, periods):
+    high = df['High'].to_numpy(dtype=float)
+    low = df['Low'].to_numpy(dtype=float)
+    mid = (high + low) / 2
+    distance = mid - np.concatenate(([np.nan], mid[:-1]))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        box_height = (df['Volume'].to_numpy(dtype=float) / 1000000) / (high - low)
+        emv = distance / box_height
+    return sma_matrix(emv, periods)
+
+
+def _band_family(values_func, period_key):
+    def family(df, grid):
+        values = values_func(df, grid[period_key])
+        v = values[:, None, None, :]
+        lower = _axes(grid['lower'], 4, 1)
+        upper = _axes(grid['upper'], 4, 2)
+        return band_momentum_signals(v, lower, upper)
+    return family
+
+
+def _cci_family(df, grid):
+    values = cci_values(df, grid['period'])[:, None, :]
+    band = _axes(grid['band'], 3, 1)
+    return band_momentum_signals(values, -band, band)
+
+
+def _threshold_family(values_func):
+    def family(df, grid):
+        values = values_func(df, grid['period'])[:, None, :]
+        threshold = _axes(grid['threshold'], 3, 1)
+        return threshold_signals(values, threshold, -threshold)
+    return family
+
+
+def _average_family(matrix_func):
+    def family(df, grid):
+        close = df['Close'].to_numpy(dtype=float)
+        return price_vs_average_signals(close[None, :], matrix_func(close, grid['period']))
+    return family
+
+
+def _score_family(df, grid):
+    """Ocena łączna getScoreWithDetails dla każdej świecy przy różnych wagach i progach."""
+    trends_rate, osc_rate = group_rate_series(df)
+    weight = _axes(grid['trend_weight'], 3, 0)
+    weak = _axes(grid['weak_cutoff'], 3, 1)
+    score = weight * trends_rate + (1 - weight) * osc_rate
+    # strong_cutoff = 3 * weak_cutoff, jak domyślne 0.5 / 1.5
+    rate = score_to_rate(score, strong=3 * weak, weak=weak)
+    return np.sign(rate).astype(np.int8)
+
+
+FAMILIES = {
+    'RSI': _band_family(rsi_values, 'period'),
+    'STS': _band_family(stochastic_k_values, 'k_period'),
+    'Williams %R': _band_family(williams_r_values, 'period'),
+    'CCI': _cci_family,
+    'MFI': _band_family(mfi_values, 'period'),
+    'BOP': _threshold_family(bop_values),
+    'EMV': _threshold_family(emv_values),
+    'SMA': _average_family(sma_matrix),
+    'EMA': _average_family(ema_matrix),
+    'SCORE': _score_family,
+}
+
+
+def forward_returns(close, horizon=DEFAULT_HORIZON):
+    close = np.asarray(close, dtype=float)
+    out = np.full(close.shape, np.nan)
+    if len(close) > horizon:
+        out[:-horizon] = close[horizon:] / close[:-horizon] - 1
+    return out
+
+
+def evaluate_signals(signals, fwd):
+    """
+    Statystyki trafień dla wszystkich kombinacji naraz.
+
+    Args:
+        signals: np.ndarray (kombinacje, świece) kodów sygnałów
+        fwd: np.ndarray (świece,) przyszłych stóp zwrotu
+
+    Returns:
+        np.ndarray (kombinacje, 4): [liczba kupuj, trafione kupuj, liczba sprzedaj, trafione sprzedaj]
+    """
+    valid = ~np.isnan(fwd)
+    buy = (signals == BUY) & valid
+    sell = (signals == SELL) & valid
+    with np.errstate(invalid='ignore'):
+        up = fwd > 0
+        down = fwd < 0
+    return np.stack([buy.sum(axis=1), (buy & up).sum(axis=1),
+                     sell.sum(axis=1), (sell & down).sum(axis=1)], axis=1)
+
+
+def sweep_ticker(job):
+    """Pracownik puli procesów: wszystkie rodziny parametrów dla jednego tickera."""
+    ticker, df, grid, horizon = job
+    df = df.dropna(subset=['Close'])
+    fwd = forward_returns(df['Close'], horizon)
+    stats = {}
+    for family, family_grid in grid.items():
+        try:
+            signals = FAMILIES[family](df, family_grid)
+            stats[family] = evaluate_signals(signals.reshape(-1, signals.shape[-1]), fwd)
+        except Exception as e:
+            print(f"⚠️ {ticker}: błąd sweepu {family}: {e}")
+    return ticker, stats
+
+
+def combinations(family_grid):
+    """Kombinacje parametrów w kolejności spłaszczania tablicy sygnałów."""
+    keys = list(family_grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*family_grid.values())]
+
+
+def run_sweep(frames, grid=DEFAULT_GRID, horizon=DEFAULT_HORIZON, workers=None):
+    """
+    Args:
+        frames: dict {ticker: DataFrame OHLCV}
+        grid: siatka parametrów (podzbiór DEFAULT_GRID lub własne wartości)
+
+    Returns:
+        pd.DataFrame: wiersz na (rodzina, kombinacja) z liczbą sygnałów i skutecznością
+    """
+    totals = {family: None for family in grid}
+    tickers_used = {family: 0 for family in grid}
+    jobs = [(ticker, df, grid, horizon) for ticker, df in frames.items()]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for ticker, stats in executor.map(sweep_ticker, jobs):
+            for family, counts in stats.items():
+                totals[family] = counts if totals[family] is None else totals[family] + counts
+                tickers_used[family] += 1
+
+    rows = []
+    for family, counts in totals.items():
+        if counts is None:
+            continue
+        for params, (n_buy, hit_buy, n_sell, hit_sell) in zip(combinations(grid[family]), counts):
+            signals = n_buy + n_sell
+            rows.append({
+                'family': family,
+                'params': params,
+                'tickers': tickers_used[family],
+                'buy_signals': int(n_buy),
+                'buy_hit_rate': hit_buy / n_buy if n_buy else np.nan,
+                'sell_signals': int(n_sell),
+                'sell_hit_rate': hit_sell / n_sell if n_sell else np.nan,
+                'signals': int(signals),
+                'hit_rate': (hit_buy + hit_sell) / signals if signals else np.nan,
+            })
+    return pd.DataFrame(rows)
+
+
+def download_frames(tickers, period="5y"):
+    data = download_with_retry(tickers, period=period)
+    frames = {}
+    for ticker in tickers:
+        if isinstance(data.columns, pd.MultiIndex):
+            if ticker in data.columns.get_level_values(0):
+                frames[ticker] = data[ticker]
+        else:
+            frames[ticker] = data
+    return frames
+
+
+def env_tickers():
+    tickers = []
+    for var in ("TICKERS_GPW", "TICKERS_NEWCONNECT", "TICKERS_NASDAQ", "TICKERS_NYSE"):
+        tickers += [t.strip() for t in os.getenv(var, "").split(",") if t.strip()]
+    return tickers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep parametrów wskaźników na danych historycznych")
+    parser.add_argument("tickers", nargs="*", help="tickery (domyślnie z TICKERS_* w ENV)")
+    parser.add_argument("--period", default="5y")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--families", default=",".join(DEFAULT_GRID), help="np. RSI,CCI,SCORE")
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--out", default=None, help="plik CSV z pełnym raportem")
+    args = parser.parse_args()
+
+    tickers = args.tickers or env_tickers()
+    if not tickers:
+        raise SystemExit("Podaj tickery lub ustaw TICKERS_* w ENV.")
+    grid = {family: DEFAULT_GRID[family] for family in args.families.split(",")}
+
+    start = time.time()
+    frames = download_frames(tickers, args.period)
+    print(f"📥 Pobrano {len(frames)}/{len(tickers)} tickerów w {time.time() - start:.1f}s")
+
+    start = time.time()
+    report = run_sweep(frames, grid, args.horizon, args.workers)
+    combos = sum(len(combinations(g)) for g in grid.values())
+    print(f"⚙️ {combos} kombinacji x {len(frames)} tickerów w {time.time() - start:.1f}s")
+
+    for family, rows in report.groupby('family', sort=False):
+        print(f"\n=== {family} ===")
+        best = rows[rows['signals'] > 0].sort_values('hit_rate', ascending=False).head(args.top)
+        for _, row in best.iterrows():
+            print(f"  {row['params']}  trafność {row['hit_rate']:.2%}  "
+                  f"(kupuj {row['buy_signals']} / {row['buy_hit_rate']:.2%}, "
+                  f"sprzedaj {row['sell_signals']} / {row['sell_hit_rate']:.2%})")
+
+    if args.out:
+        report.to_csv(args.out, index=False)
+        print(f"\n💾 Zapisano raport: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Warstwy częstotliwości odpytywania tickerów giełdy.
+
+Wszystkie tickery sprawdzane co PRICE_CHECK_INTERVAL zużywają limit zapytań tak samo na własne
+spółki jak na długi ogon listy. Tu każdy ticker ma warstwę: własne (MY_TICKERS), obserwowane
+(OBSERVABLE_TICKERS) i pozostałe, z osobnymi interwałami (TIER_INTERVALS, domyślnie 1, 5 i 15
+minut). Pętla budzi się co najkrótszy interwał i pobiera jednym zapytaniem tylko tickery, którym
+minął ich interwał. Ticker z dużym ruchem w sesji (zmiana od wczoraj albo obsunięcie od maksimum
+>= TIER_PROMOTE_MOVE) przechodzi do najszybszej warstwy do końca sesji.
+"""
+import os
+import time
+
+import numpy as np
+
+# Interwały warstw w sekundach: własne, obserwowane, pozostałe
+TIER_INTERVALS = tuple(float(v) for v in os.getenv("TIER_INTERVALS", "60,300,900").split(","))
+TIER_NAMES = ("własne", "obserwowane", "pozostałe")
+# Ruch w sesji (%), od którego ticker przechodzi do najszybszej warstwy
+TIER_PROMOTE_MOVE = float(os.getenv("TIER_PROMOTE_MOVE", "4.0"))
+
+MY_TIER = 0
+OBSERVABLE_TIER = 1
+OTHER_TIER = 2
+
+
+class PollingTiers:
+    """Warstwa i czas ostatniego sprawdzenia per ticker (tablice w kolejności `tickers`)."""
+
+    def __init__(self, tickers, my_tickers=(), observable_tickers=(), intervals=TIER_INTERVALS,
+                 promote_move=TIER_PROMOTE_MOVE):
+        my_tickers = {t.strip() for t in my_tickers}
+        observable_tickers = {t.strip() for t in observable_tickers}
+        self.tickers = list(tickers)
+        self.intervals = np.asarray(intervals, dtype=float)
+        self.promote_move = promote_move
+        self.tier = np.array([MY_TIER if t in my_tickers else OBSERVABLE_TIER if t in observable_tickers
+                              else OTHER_TIER for t in self.tickers], dtype=np.int8)
+        self.tier = np.minimum(self.tier, len(self.intervals) - 1).astype(np.int8)
+        self.last_check = np.full(len(self.tickers), -np.inf)
+
+    @property
+    def tick(self):
+        """Co ile sekund trzeba się budzić - najkrótszy interwał."""
+        return float(self.intervals.min())
+
+    def due(self, now=None):
+        """
+        Maska tickerów, którym minął interwał warstwy (z zapasem pół taktu na opóźnienie zdarzeń).
+        """
+        now = time.time() if now is None else now
+        return now - self.last_check >= self.intervals[self.tier] - self.tick / 2
+
+    def mark(self, mask, now=None):
+        """Zapamiętuje sprawdzenie tickerów z maski."""
+        self.last_check[mask] = time.time() if now is None else now
+
+    def promote(self, move):
+        """
+        Przenosi do najszybszej warstwy tickery z ruchem >= promote_move (NaN - bez zmian).
+
+        Returns:
+            indeksy awansowanych tickerów
+        """
+        with np.errstate(invalid='ignore'):
+            promoted = np.flatnonzero((np.abs(move) >= self.promote_move) & (self.tier > MY_TIER))
+        self.tier[promoted] = MY_TIER
+        return promoted
+
+    def counts(self):
+        """Liczba tickerów w każdej warstwie."""
+        return np.bincount(self.tier, minlength=len(self.intervals))
+
+
+class LastQuotes:
+    """
+    Ostatnie znane poprzednie zamknięcie i cena per ticker - ruch całego rynku liczony jest ze
+    wszystkich tickerów giełdy, także gdy w cyklu pobrano tylko część z nich.
+    """
+
+    def __init__(self, n):
+        self.prev_close = np.full(n, np.nan)
+        self.price = np.full(n, np.nan)
+
+    def update(self, prev_close, price):
+        """Uzupełnia ceny z bieżącego cyklu (NaN - bez zmian) i zwraca (poprzednie zamknięcia, ceny)."""
+        prev_close = np.asarray(prev_close, dtype=float)
+        price = np.asarray(price, dtype=float)
+        valid = ~np.isnan(prev_close) & ~np.isnan(price)
+        self.prev_close[valid] = prev_close[valid]
+        self.price[valid] = price[valid]
+        return self.prev_close, self.price
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Harmonogram zdarzeń na kopcu (heapq).
+
+Zamiast budzić się co 30 s i sprawdzać wszystkie giełdy, pętla trzyma kolejkę priorytetową
+najbliższych zdarzeń (otwarcie, zamknięcie, sprawdzenie cen, rozgrzewka przed otwarciem)
+i śpi dokładnie do najbliższego z nich. Zdarzenie może zaplanować kolejne (np. następne
+sprawdzenie cen albo jutrzejsze otwarcie).
+"""
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime
+
+
+class EventScheduler:
+    """Kolejka zdarzeń (czas epoki, kolejność dodania) -> akcja wywoływana bez argumentów."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.heap = []
+        self.counter = itertools.count()
+        self.cancelled = set()
+        self.condition = threading.Condition()
+        self.stopped = False
+
+    def __len__(self):
+        return len(self.heap) - len(self.cancelled)
+
+    def schedule(self, when, action, name=""):
+        """
+        Planuje akcję na czas `when` (datetime albo sekundy epoki).
+
+        Returns:
+            identyfikator zdarzenia (do cancel)
+        """
+        if isinstance(when, datetime):
+            when = when.timestamp()
+        event_id = next(self.counter)
+        with self.condition:
+            heapq.heappush(self.heap, (when, event_id, name, action))
+            # nowe zdarzenie może być wcześniejsze niż to, na które czeka pętla
+            self.condition.notify()
+        return event_id
+
+    def schedule_in(self, delay, action, name=""):
+        return self.schedule(self.clock() + delay, action, name)
+
+    def cancel(self, event_id):
+        with self.condition:
+            if any(item[1] == event_id for item in self.heap):
+                self.cancelled.add(event_id)
+
+    def upcoming(self):
+        """Zaplanowane zdarzenia (czas, nazwa) w kolejności wykonania."""
+        with self.condition:
+            return [(when, name) for when, event_id, name, _action in sorted(self.heap)
+                    if event_id not in self.cancelled]
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def _next_due(self):
+        """Czeka do najbliższego zdarzenia i zdejmuje je z kopca; None po stop()."""
+        with self.condition:
+            while not self.stopped:
+                while self.heap and self.heap[0][1] in self.cancelled:
+                    self.cancelled.discard(heapq.heappop(self.heap)[1])
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+                delay = self.heap[0][0] - self.clock()
+                if delay <= 0:
+                    return heapq.heappop(self.heap)
+                self.condition.wait(delay)
+            return None
+
+    def run(self):
+        """Wykonuje zdarzenia aż do stop(); błąd jednej akcji nie zatrzymuje harmonogramu."""
+        while True:
+            event = self._next_due()
+            if event is None:
+                return
+            _when, _event_id, name, action = event
+            try:
+                action()
+            except Exception as e:
+                print(f"[SCHEDULER] Błąd zdarzenia {name}: {e}")
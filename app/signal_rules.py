@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Wektorowe reguły sygnałów dla całej historii (każda świeca osobno).
+
+Reguły odpowiadają logice z ticker_analizer.py, ale zamiast ostatniej wartości zwracają
+kod sygnału dla każdej świecy: 1 = kupuj, -1 = sprzedaj, 0 = neutralny.
+Wszystkie funkcje działają na ostatniej osi i obsługują broadcasting, więc progi można
+podać jako tablice i ocenić całą siatkę parametrów jedną operacją.
+"""
+import numpy as np
+
+BUY = 1
+SELL = -1
+NEUTRAL = 0
+# Brak danych (np. ULT bez pełnych okien) - bez etykiety; w ocenie łącznej liczony jak neutralny
+NO_DATA = None
+
+SIGNAL_CODES = {'kupuj': BUY, 'sprzedaj': SELL, 'neutralny': NEUTRAL, 'brak_danych': NO_DATA}
+SIGNAL_NAMES = {BUY: 'kupuj', SELL: 'sprzedaj', NEUTRAL: 'neutralny'}
+
+
+def signal_vote(code):
+    """Głos sygnału w ocenie łącznej (brak danych = neutralny)."""
+    return NEUTRAL if code is NO_DATA else code
+
+
+# Reguły porównują wartość bieżącą ze średnią z 4 poprzednich
+PREVIOUS_WINDOW = 4
+
+
+def previous_mean(values, window=PREVIOUS_WINDOW):
+    """
+    Średnia z `window` poprzednich wartości (bez bieżącej), pomijająca NaN - jak
+    series.iloc[-5:-1].mean(). Dla pierwszych `window` świec NaN (za mało historii).
+    """
+    v = np.asarray(values, dtype=float)
+    total = np.zeros(v.shape)
+    count = np.zeros(v.shape)
+    for lag in range(window, 0, -1):
+        shifted = np.full(v.shape, np.nan)
+        shifted[..., lag:] = v[..., :-lag]
+        valid = ~np.isnan(shifted)
+        total += np.where(valid, shifted, 0.0)
+        count += valid
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = np.where(count > 0, total / count, np.nan)
+    out[..., :window] = np.nan
+    return out
+
+
+def band_momentum_signals(values, lower, upper, window=PREVIOUS_WINDOW):
+    """
+    Oscylator w paśmie [lower, upper]: kupuj gdy wartość rośnie względem średniej z 4 poprzednich,
+    sprzedaj gdy spada; poza pasmem neutralny (RSI, STS, Williams %R, CCI, ULT, MFI).
+    """
+    v = np.asarray(values, dtype=float)
+    prev = previous_mean(v, window)
+    with np.errstate(invalid='ignore'):
+        in_band = (v >= lower) & (v <= upper)
+        buy = in_band & (prev < v)
+        sell = in_band & (prev > v)
+    return np.where(buy, BUY, np.where(sell, SELL, NEUTRAL)).astype(np.int8)
+
+
+def threshold_signals(values, upper, lower):
+    """Kupuj powyżej `upper`, sprzedaj poniżej `lower` (ROC, FI, BOP, EMV)."""
+    v = np.asarray(values, dtype=float)
+    with np.errstate(invalid='ignore'):
+        return np.where(v > upper, BUY, np.where(v < lower, SELL, NEUTRAL)).astype(np.int8)
+
+
+def macd_signals(macd_line, signal_line, histogram):
+    """Kupuj gdy MACD nad linią sygnału i histogram rośnie; sprzedaj odwrotnie."""
+    macd_line = np.asarray(macd_line, dtype=float)
+    signal_line = np.asarray(signal_line, dtype=float)
+    hist = np.asarray(histogram, dtype=float)
+    prev_hist = np.full(hist.shape, np.nan)
+    prev_hist[..., 1:] = hist[..., :-1]
+    with np.errstate(invalid='ignore'):
+        buy = (macd_line > signal_line) & (hist > prev_hist)
+        sell = (macd_line < signal_line) & (hist < prev_hist)
+    return np.where(buy, BUY, np.where(sell, SELL, NEUTRAL)).astype(np.int8)
+
+
+def trix_signals(trix, trix_signal):
+    """Kupuj gdy TRIX nad sygnałem i dodatni; sprzedaj gdy pod sygnałem i ujemny."""
+    trix = np.asarray(trix, dtype=float)
+    trix_signal = np.asarray(trix_signal, dtype=float)
+    with np.errstate(invalid='ignore'):
+        buy = (trix > trix_signal) & (trix > 0)
+        sell = (trix < trix_signal) & (trix < 0)
+    return np.where(buy, BUY, np.where(sell, SELL, NEUTRAL)).astype(np.int8)
+
+
+def directional_signals(strength, plus_di, minus_di, threshold):
+    """ADX/DMI: przy sile trendu powyżej progu kupuj gdy +DI > -DI, sprzedaj gdy -DI > +DI."""
+    strength = np.asarray(strength, dtype=float)
+    plus_di = np.asarray(plus_di, dtype=float)
+    minus_di = np.asarray(minus_di, dtype=float)
+    with np.errstate(invalid='ignore'):
+        trending = strength > threshold
+        buy = trending & (plus_di > minus_di)
+        sell = trending & (minus_di > plus_di)
+    return np.where(buy, BUY, np.where(sell, SELL, NEUTRAL)).astype(np.int8)
+
+
+def agreement_signals(first, second):
+    """Kupuj gdy oba wskazania dodatnie, sprzedaj gdy oba ujemne (np. Ichimoku: chmura i linie)."""
+    first = np.asarray(first, dtype=float)
+    second = np.asarray(second, dtype=float)
+    with np.errstate(invalid='ignore'):
+        buy = (first > 0) & (second > 0)
+        sell = (first < 0) & (second < 0)
+    return np.where(buy, BUY, np.where(sell, SELL, NEUTRAL)).astype(np.int8)
+
+
+def price_vs_average_signals(price, average):
+    """Kupuj gdy cena nad średnią, sprzedaj gdy pod (moving_analizer)."""
+    price = np.asarray(price, dtype=float)
+    average = np.asarray(average, dtype=float)
+    with np.errstate(invalid='ignore'):
+        return np.where(price > average, BUY, np.where(price < average, SELL, NEUTRAL)).astype(np.int8)
+
+
+def score_to_rate(score, strong=1.5, weak=0.5):
+    """Zamiana wyniku ważonego na ocenę -2..2 (jak w getScoreWithDetails)."""
+    score = np.asarray(score, dtype=float)
+    return np.select(
+        [score >= strong, score >= weak, score > -weak, score > -strong],
+        [2, 1, 0, -1],
+        default=-2,
+    ).astype(np.int8)
+
+
+def sum_to_rate(signal_sum, max_signals, strong=0.75, weak=0.25):
+    """Zamiana sumy sygnałów cena/średnia na ocenę -2..2 (jak sum_to_signal w moving_analizer)."""
+    signal_sum = np.asarray(signal_sum, dtype=float)
+    return np.select(
+        [signal_sum >= max_signals * strong, signal_sum >= max_signals * weak,
+         signal_sum <= -max_signals * strong, signal_sum <= -max_signals * weak],
+        [2, 1, -2, -1],
+        default=0,
+    ).astype(np.int8)
@@ -3,6 +3,17 @@ import pandas as pd
 import numpy as np
 import yfinance as yf
 import time
+import os
+import inspect
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from signal_rules import (band_momentum_signals, threshold_signals, macd_signals, trix_signals,
+                          directional_signals, agreement_signals, score_to_rate, signal_vote, SIGNAL_CODES,
+                          SIGNAL_NAMES, NEUTRAL)
+from moving_analizer import moving_average_rate_series, DEFAULT_PERIODS
+from indicator_kernels import (ewm_mean, wilder_mean, rolling_mean, rolling_sum, rolling_min, rolling_max,
+                               rolling_mad, parabolic_sar)
 
 RATING_LABELS = {
     'kupuj': "🟢",
@@ -10,11 +21,23 @@ RATING_LABELS = {
     'sprzedaj': "🔴"
 }
 
+# Ocena łączna: score = TREND_WEIGHT * trendsRate + OSC_WEIGHT * oscCountRate,
+# |score| >= STRONG_CUTOFF -> mocne kupuj/sprzedaj, |score| >= WEAK_CUTOFF -> kupuj/sprzedaj
+# (wartości można dopasować przez walk_forward.py)
+TREND_WEIGHT = float(os.getenv("SCORE_TREND_WEIGHT", "0.7"))
+OSC_WEIGHT = float(os.getenv("SCORE_OSC_WEIGHT", "0.3"))
+STRONG_CUTOFF = float(os.getenv("SCORE_STRONG_CUTOFF", "1.5"))
+WEAK_CUTOFF = float(os.getenv("SCORE_WEAK_CUTOFF", "0.5"))
 
-def download_with_retry(tickers, period="1y", max_retries=3, delay=2):
+
+def download_with_retry(tickers, period=None, max_retries=3, delay=2):
+    """Pobiera historię; bez podanego period - tylko tyle, ile wymagają aktywne wskaźniki."""
     for attempt in range(max_retries):
         try:
-            hist = yf.download(tickers, period=period, group_by="ticker", threads=True)
+            if period is None:
+                hist = yf.download(tickers, start=required_history_start(), group_by="ticker", threads=True)
+            else:
+                hist = yf.download(tickers, period=period, group_by="ticker", threads=True)
             return hist
         except Exception as e:
             print(f"Próba {attempt + 1} nie powiodła się: {e}")
@@ -22,6 +45,58 @@ def download_with_retry(tickers, period="1y", max_retries=3, delay=2):
     raise Exception(f"Nie udało się pobrać danych po {max_retries} próbach")
 
 
+# ----------------------
+# WSPÓLNE WARTOŚCI POŚREDNIE
+# ----------------------
+# analyze_stock_df przekazuje wskaźnikom jeden słownik `cache` na analizę, więc cena typowa,
+# true range, EMA i okna min/max są liczone raz i współdzielone (np. ATR i ADX, CCI i MFI).
+
+def shared(cache, key, compute):
+    """Zwraca wartość pośrednią z cache analizy albo ją liczy (bez cache - zawsze liczy)."""
+    if cache is None:
+        return compute()
+    if key not in cache:
+        cache[key] = compute()
+    return cache[key]
+
+
+def typical_price(df, cache=None):
+    return shared(cache, 'typical_price', lambda: (df['High'] + df['Low'] + df['Close']) / 3)
+
+
+def previous_close(df, cache=None):
+    return shared(cache, 'previous_close', lambda: df['Close'].shift(1))
+
+
+def true_low(df, cache=None):
+    return shared(cache, 'true_low', lambda: np.minimum(df['Low'], previous_close(df, cache)))
+
+
+def true_range(df, cache=None):
+    return shared(cache, 'true_range',
+                  lambda: np.maximum(df['High'], previous_close(df, cache)) - true_low(df, cache))
+
+
+def average_true_range(df, period, cache=None):
+    return shared(cache, ('atr', period), lambda: wilder_mean(true_range(df, cache), period))
+
+
+def close_ema(df, span, cache=None):
+    return shared(cache, ('ema_close', span), lambda: ewm_mean(df['Close'], span))
+
+
+def close_sma(df, period, cache=None):
+    return shared(cache, ('sma_close', period), lambda: rolling_mean(df['Close'], period))
+
+
+def highest_high(df, period, cache=None):
+    return shared(cache, ('highest_high', period), lambda: rolling_max(df['High'], period))
+
+
+def lowest_low(df, period, cache=None):
+    return shared(cache, ('lowest_low', period), lambda: rolling_min(df['Low'], period))
+
+
 def calculate_rsi(df, period=14):
     """RSI - Relative Strength Index z poprawioną logiką sygnałów"""
     close = df['Close']
@@ -29,8 +104,8 @@ def calculate_rsi(df, period=14):
     gain = delta.where(delta > 0, 0)
     loss = -delta.where(delta < 0, 0)
 
-    avg_gain = gain.rolling(window=period).mean()
-    avg_loss = loss.rolling(window=period).mean()
+    avg_gain = rolling_mean(gain, period)
+    avg_loss = rolling_mean(loss, period)
 
     # Zabezpieczenie przed dzieleniem przez zero
     avg_loss = avg_loss.replace(0, 1e-10)
@@ -65,17 +140,15 @@ def calculate_rsi(df, period=14):
     return rsi, signal, latest_rsi
 
 
-def calculate_stochastic(df, k_period=14, d_period=3):
+def calculate_stochastic(df, k_period=14, d_period=3, cache=None):
     """Stochastic Oscillator z poprawioną logiką sygnałów"""
-    high = df['High']
-    low = df['Low']
     close = df['Close']
 
-    lowest_low = low.rolling(window=k_period).min()
-    highest_high = high.rolling(window=k_period).max()
+    lowest = lowest_low(df, k_period, cache)
+    highest = highest_high(df, k_period, cache)
 
-    k_percent = 100 * ((close - lowest_low) / (highest_high - lowest_low))
-    d_percent = k_percent.rolling(window=d_period).mean()
+    k_percent = 100 * ((close - lowest) / (highest - lowest))
+    d_percent = rolling_mean(k_percent, d_period)
 
     # Ocena według nowych kryteriów
     latest_k = k_percent.iloc[-1]
@@ -106,14 +179,13 @@ def calculate_stochastic(df, k_period=14, d_period=3):
 
     return k_percent, d_percent, signal, latest_k, latest_d
 
-def calculate_macd(df, fast=12, slow=26, signal_period=9):
+def calculate_macd(df, fast=12, slow=26, signal_period=9, cache=None):
     """MACD - Moving Average Convergence Divergence"""
-    close = df['Close']
-    ema_fast = close.ewm(span=fast).mean()
-    ema_slow = close.ewm(span=slow).mean()
+    ema_fast = close_ema(df, fast, cache)
+    ema_slow = close_ema(df, slow, cache)
 
     macd_line = ema_fast - ema_slow
-    signal_line = macd_line.ewm(span=signal_period).mean()
+    signal_line = ewm_mean(macd_line, signal_period)
     histogram = macd_line - signal_line
 
     # Ocena
@@ -132,15 +204,14 @@ def calculate_macd(df, fast=12, slow=26, signal_period=9):
     return macd_line, signal_line, histogram, signal, latest_macd
 
 
-def calculate_trix(df, period=14, signal_period=9):
+def calculate_trix(df, period=14, signal_period=9, cache=None):
     """TRIX - Triple Exponential Average"""
-    close = df['Close']
-    ema1 = close.ewm(span=period).mean()
-    ema2 = ema1.ewm(span=period).mean()
-    ema3 = ema2.ewm(span=period).mean()
+    ema1 = close_ema(df, period, cache)
+    ema2 = ewm_mean(ema1, period)
+    ema3 = ewm_mean(ema2, period)
 
     trix = ema3.pct_change() * 10000
-    trix_signal = trix.ewm(span=signal_period).mean()
+    trix_signal = ewm_mean(trix, signal_period)
 
     # Ocena
     latest_trix = trix.iloc[-1]
@@ -156,16 +227,14 @@ def calculate_trix(df, period=14, signal_period=9):
     return trix, trix_signal, signal, latest_trix
 
 
-def calculate_williams_r(df, period=10):
+def calculate_williams_r(df, period=10, cache=None):
     """Williams %R z poprawioną logiką sygnałów"""
-    high = df['High']
-    low = df['Low']
     close = df['Close']
 
-    highest_high = high.rolling(window=period).max()
-    lowest_low = low.rolling(window=period).min()
+    highest = highest_high(df, period, cache)
+    lowest = lowest_low(df, period, cache)
 
-    williams_r = -100 * ((highest_high - close) / (highest_high - lowest_low))
+    williams_r = -100 * ((highest - close) / (highest - lowest))
 
     # Pobierz aktualną wartość %R
     latest_wr = williams_r.iloc[-1]
@@ -196,17 +265,13 @@ def calculate_williams_r(df, period=10):
     return williams_r, signal, latest_wr
 
 
-def calculate_cci(df, period=14):
+def calculate_cci(df, period=14, cache=None):
     """Commodity Channel Index"""
-    high = df['High']
-    low = df['Low']
-    close = df['Close']
-
-    typical_price = (high + low + close) / 3
-    sma = typical_price.rolling(window=period).mean()
-    mad = typical_price.rolling(window=period).apply(lambda x: np.mean(np.abs(x - x.mean())))
+    tp = typical_price(df, cache)
+    sma = rolling_mean(tp, period)
+    mad = rolling_mad(tp, period)
 
-    cci = (typical_price - sma) / (0.015 * mad)
+    cci = (tp - sma) / (0.015 * mad)
 
     # Ocena sygnału
     latest_cci = cci.iloc[-1]
@@ -251,24 +316,21 @@ def calculate_roc(df, period=15):
     return roc, signal, latest_roc
 
 
-def calculate_ultimate_oscillator(df, period1=7, period2=14, period3=28):
+def calculate_ultimate_oscillator(df, period1=7, period2=14, period3=28, cache=None):
     """Ultimate Oscillator z ulepszonymi sygnałami"""
-    high = df['High']
-    low = df['Low']
     close = df['Close']
 
-    true_low = np.minimum(low, close.shift(1))
-    buying_pressure = close - true_low
-    true_range = np.maximum(high, close.shift(1)) - true_low
+    buying_pressure = close - true_low(df, cache)
+    tr = true_range(df, cache)
 
-    bp_sum1 = buying_pressure.rolling(window=period1).sum()
-    tr_sum1 = true_range.rolling(window=period1).sum()
+    bp_sum1 = rolling_sum(buying_pressure, period1)
+    tr_sum1 = rolling_sum(tr, period1)
 
-    bp_sum2 = buying_pressure.rolling(window=period2).sum()
-    tr_sum2 = true_range.rolling(window=period2).sum()
+    bp_sum2 = rolling_sum(buying_pressure, period2)
+    tr_sum2 = rolling_sum(tr, period2)
 
-    bp_sum3 = buying_pressure.rolling(window=period3).sum()
-    tr_sum3 = true_range.rolling(window=period3).sum()
+    bp_sum3 = rolling_sum(buying_pressure, period3)
+    tr_sum3 = rolling_sum(tr, period3)
 
     ult_osc = 100 * ((4 * (bp_sum1 / tr_sum1)) + (2 * (bp_sum2 / tr_sum2)) + (bp_sum3 / tr_sum3)) / 7
 
@@ -301,7 +363,7 @@ def calculate_force_index(df, period=13):
     volume = df['Volume']
 
     force_index = (close - close.shift(1)) * volume
-    fi_ema = force_index.ewm(span=period).mean()
+    fi_ema = ewm_mean(force_index, period)
 
     # Ocena
     latest_fi = fi_ema.iloc[-1]
@@ -315,21 +377,18 @@ def calculate_force_index(df, period=13):
     return fi_ema, signal, latest_fi
 
 
-def calculate_mfi(df, period=14):
+def calculate_mfi(df, period=14, cache=None):
     """Money Flow Index"""
-    high = df['High']
-    low = df['Low']
-    close = df['Close']
     volume = df['Volume']
 
-    typical_price = (high + low + close) / 3
-    money_flow = typical_price * volume
+    tp = typical_price(df, cache)
+    money_flow = tp * volume
 
-    positive_mf = money_flow.where(typical_price > typical_price.shift(1), 0)
-    negative_mf = money_flow.where(typical_price < typical_price.shift(1), 0)
+    positive_mf = money_flow.where(tp > tp.shift(1), 0)
+    negative_mf = money_flow.where(tp < tp.shift(1), 0)
 
-    positive_mf_sum = positive_mf.rolling(window=period).sum()
-    negative_mf_sum = negative_mf.rolling(window=period).sum()
+    positive_mf_sum = rolling_sum(positive_mf, period)
+    negative_mf_sum = rolling_sum(negative_mf, period)
 
     money_ratio = positive_mf_sum / negative_mf_sum
     mfi = 100 - (100 / (1 + money_ratio))
@@ -372,7 +431,7 @@ def calculate_bop(df, period=14):
     close = df['Close']
 
     bop = (close - open_price) / (high - low)
-    bop_sma = bop.rolling(window=period).mean()
+    bop_sma = rolling_mean(bop, period)
 
     # Ocena
     latest_bop = bop_sma.iloc[-1]
@@ -396,7 +455,7 @@ def calculate_emv(df, period=14):
     box_height = (volume / 1000000) / (high - low)  # Skalowanie wolumenu
 
     emv = distance_moved / box_height
-    emv_sma = emv.rolling(window=period).mean()
+    emv_sma = rolling_mean(emv, period)
 
     # Ocena
     latest_emv = emv_sma.iloc[-1]
@@ -410,59 +469,457 @@ def calculate_emv(df, period=14):
     return emv_sma, signal, latest_emv
 
 
-def analyze_stock_df(df):
-    """Główna funkcja analizująca wszystkie wskaźniki dla podanego DataFrame"""
-    try:
-        trends = {}
-        osc = {}
-        result_type = {'trends': trends,'osc': osc}
-        # results = {}
+def calculate_atr(df, period=14, cache=None):
+    """ATR - Average True Range; miara zmienności bez kierunku - wskaźnik informacyjny (bez sygnału)"""
+    atr = average_true_range(df, period, cache)
+    return atr, atr.iloc[-1]
+
+
+ADX_TREND_THRESHOLD = 20
+
+
+def calculate_adx(df, period=14, threshold=ADX_TREND_THRESHOLD, cache=None):
+    """ADX/DMI - Average Directional Index z liniami +DI i -DI"""
+    up_move = df['High'].diff()
+    down_move = -df['Low'].diff()
+
+    plus_dm = up_move.where((up_move > down_move) & (up_move > 0), 0.0).where(up_move.notna())
+    minus_dm = down_move.where((down_move > up_move) & (down_move > 0), 0.0).where(down_move.notna())
+
+    # Wygładzony true range to ATR - współdzielony z calculate_atr
+    atr = average_true_range(df, period, cache)
+    plus_di = 100 * wilder_mean(plus_dm, period) / atr
+    minus_di = 100 * wilder_mean(minus_dm, period) / atr
+
+    dx = 100 * (plus_di - minus_di).abs() / (plus_di + minus_di)
+    adx = wilder_mean(dx, period)
+
+    # Ocena: kierunek wg DI, tylko gdy trend jest wystarczająco silny
+    latest_adx = adx.iloc[-1]
+    latest_plus = plus_di.iloc[-1]
+    latest_minus = minus_di.iloc[-1]
+    if latest_adx > threshold and latest_plus > latest_minus:
+        signal = "kupuj"
+    elif latest_adx > threshold and latest_minus > latest_plus:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
+
+    return adx, plus_di, minus_di, signal, latest_adx
+
+
+def calculate_bollinger(df, period=20, width=2, cache=None):
+    """Wstęgi Bollingera i %B"""
+    close = df['Close']
+    middle = close_sma(df, period, cache)
+    std = close.rolling(window=period).std(ddof=0)
+
+    upper = middle + width * std
+    lower = middle - width * std
+    percent_b = (close - lower) / (upper - lower)
+
+    latest_b = percent_b.iloc[-1]
+    if len(percent_b) < 5:
+        return upper, lower, percent_b, "neutralny", latest_b
+
+    # Średnia z 4 poprzednich wartości %B
+    prev_4_avg = percent_b.iloc[-5:-1].mean()
+
+    # Logika sygnałów jak dla oscylatorów: ruch %B wewnątrz wstęg
+    if 0 <= latest_b <= 1 and prev_4_avg < latest_b:
+        signal = "kupuj"
+    elif 0 <= latest_b <= 1 and prev_4_avg > latest_b:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"  # poza wstęgami lub brak zmiany
+
+    return upper, lower, percent_b, signal, latest_b
+
+
+def calculate_obv(df, signal_period=20, cache=None):
+    """On-Balance Volume ze średnią wykładniczą jako linią sygnału"""
+    direction = np.sign(df['Close'] - previous_close(df, cache)).fillna(0)
+    obv = (direction * df['Volume']).cumsum()
+    obv_ema = ewm_mean(obv, signal_period)
+
+    # Ocena
+    latest_obv = obv.iloc[-1]
+    latest_ema = obv_ema.iloc[-1]
+    if latest_obv > latest_ema:
+        signal = "kupuj"
+    elif latest_obv < latest_ema:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
+
+    return obv, obv - obv_ema, signal, latest_obv
+
+
+def calculate_vwap(df, period=20, cache=None):
+    """
+    VWAP - cena średnia ważona wolumenem.
+    Dla danych śródsesyjnych liczona od początku każdej sesji, dla dziennych - z ostatnich `period` świec.
+    """
+    price_volume = typical_price(df, cache) * df['Volume']
+    volume = df['Volume']
+
+    sessions = df.index.normalize() if isinstance(df.index, pd.DatetimeIndex) else None
+    if sessions is not None and sessions.has_duplicates:
+        vwap = price_volume.groupby(sessions).cumsum() / volume.groupby(sessions).cumsum()
+    else:
+        vwap = rolling_sum(price_volume, period) / rolling_sum(volume, period)
+
+    distance = df['Close'] - vwap
+
+    # Ocena
+    latest_vwap = vwap.iloc[-1]
+    latest_distance = distance.iloc[-1]
+    if latest_distance > 0:
+        signal = "kupuj"
+    elif latest_distance < 0:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
 
-        # Oblicz wszystkie wskaźniki
-        rsi, rsi_signal, rsi_val = calculate_rsi(df)
-        osc['RSI(14)'] = {'signal': rsi_signal, 'value': round(rsi_val, 2)}
+    return vwap, distance, signal, latest_vwap
 
-        k, d, sts_signal, k_val, d_val = calculate_stochastic(df)
-        osc['STS(14,3)'] = {'signal': sts_signal, 'value': f'K:{round(k_val, 2)}, D:{round(d_val, 2)}'}
 
-        macd, signal_line, hist, macd_signal, macd_val = calculate_macd(df)
-        trends['MACD(12,26,9)'] = {'signal': macd_signal, 'value': round(macd_val, 4)}
+def calculate_ichimoku(df, tenkan=9, kijun=26, senkou=52, cache=None):
+    """Ichimoku Kinko Hyo - linie Tenkan/Kijun i chmura (Senkou A/B przesunięte o kijun)"""
+    close = df['Close']
+    tenkan_line = (highest_high(df, tenkan, cache) + lowest_low(df, tenkan, cache)) / 2
+    kijun_line = (highest_high(df, kijun, cache) + lowest_low(df, kijun, cache)) / 2
+    span_a = ((tenkan_line + kijun_line) / 2).shift(kijun)
+    span_b = ((highest_high(df, senkou, cache) + lowest_low(df, senkou, cache)) / 2).shift(kijun)
+
+    cloud_top = np.maximum(span_a, span_b)
+    cloud_bottom = np.minimum(span_a, span_b)
+    # +1 nad chmurą, -1 pod chmurą, 0 w chmurze
+    cloud_position = pd.Series(np.where(close > cloud_top, 1.0, np.where(close < cloud_bottom, -1.0, 0.0)),
+                               index=close.index).where(cloud_top.notna() & close.notna())
+
+    # Ocena: cena nad chmurą i Tenkan nad Kijun -> kupuj; odwrotnie -> sprzedaj
+    latest_position = cloud_position.iloc[-1]
+    latest_cross = tenkan_line.iloc[-1] - kijun_line.iloc[-1]
+    if latest_position > 0 and latest_cross > 0:
+        signal = "kupuj"
+    elif latest_position < 0 and latest_cross < 0:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
 
-        trix, trix_sig, trix_signal, trix_val = calculate_trix(df)
-        trends['TRIX(14,9)'] = {'signal': trix_signal, 'value': round(trix_val, 4)}
+    return tenkan_line, kijun_line, span_a, span_b, cloud_position, signal, latest_position
 
-        wr, wr_signal, wr_val = calculate_williams_r(df)
-        osc['Williams %R(10)'] = {'signal': wr_signal, 'value': round(wr_val, 2)}
 
-        cci, cci_signal, cci_val = calculate_cci(df)
-        osc['CCI(14)'] = {'signal': cci_signal, 'value': round(cci_val, 2)}
+def calculate_parabolic_sar(df, step=0.02, max_step=0.2, cache=None):
+    """Parabolic SAR"""
+    sar = parabolic_sar(df['High'], df['Low'], step, max_step)
+    distance = df['Close'] - sar
 
-        roc, roc_signal, roc_val = calculate_roc(df)
-        trends['ROC(15)'] = {'signal': roc_signal, 'value': round(roc_val, 2)}
+    # Ocena
+    latest_sar = sar.iloc[-1]
+    latest_distance = distance.iloc[-1]
+    if latest_distance > 0:
+        signal = "kupuj"
+    elif latest_distance < 0:
+        signal = "sprzedaj"
+    else:
+        signal = "neutralny"
 
-        ult, ult_signal, ult_val = calculate_ultimate_oscillator(df)
-        trends['ULT(7,14,28)'] = {'signal': ult_signal, 'value': round(ult_val, 2)}
+    return sar, distance, signal, latest_sar
+
+
+# ----------------------
+# REJESTR WSKAŹNIKÓW
+# ----------------------
+# Każdy wskaźnik deklaruje parametry, wymagane kolumny i długość rozbiegu (warm-up),
+# dzięki czemu analyze_stock_df nie musi znać konkretnych wskaźników, a warstwa
+# pobierania danych może zapytać, ile historii naprawdę potrzeba.
+
+# Ile "spanów" potrzebuje EMA, żeby wpływ początku serii był pomijalny (waga < 2%)
+EMA_WARMUP_SPANS = 2
+# Ile wartości wstecz używają reguły sygnałów (aktualna + średnia z 4 poprzednich)
+SIGNAL_LOOKBACK = 5
+# Przelicznik sesji na dni kalendarzowe (weekendy) + zapas na święta
+CALENDAR_DAYS_PER_BAR = 7 / 5
+HOLIDAY_MARGIN_DAYS = 10
+
+INDICATOR_REGISTRY = {}
 
-        fi, fi_signal, fi_val = calculate_force_index(df)
-        trends['FI(13)'] = {'signal': fi_signal, 'value': round(fi_val, 2)}
 
-        mfi, mfi_signal, mfi_val = calculate_mfi(df)
-        osc['MFI(14)'] = {'signal': mfi_signal, 'value': round(mfi_val, 2)}
+def register_indicator(name, group, func, params, columns, warmup, extract, series=None, fmt=None, active=True,
+                       vote=True):
+    """
+    Rejestruje wskaźnik używany przez analyze_stock_df.
 
-        bop, bop_signal, bop_val = calculate_bop(df)
-        trends['BOP(14)'] = {'signal': bop_signal, 'value': round(bop_val, 4)}
+    Args:
+        name: nazwa wyświetlana (np. 'RSI'); etykieta to name(param1,param2,...)
+        group: 'trends' albo 'osc'
+        func: funkcja liczaca wskaźnik, wywoływana jako func(df, **params)
+        params: dict parametrów przekazywanych do func
+        columns: kolumny OHLCV wymagane przez wskaźnik
+        warmup: funkcja params -> minimalna liczba świec potrzebna do wiarygodnego wyniku
+        extract: funkcja wynik_func -> (sygnał, krotka surowych wartości)
+        series: funkcja wynik_func -> kody sygnałów (1/0/-1) dla każdej świecy (opcjonalnie)
+        fmt: funkcja krotka wartości -> tekst; używana dopiero przy renderowaniu wiadomości
+        active: czy wskaźnik bierze udział w analizie
+        vote: czy sygnał wchodzi do oceny łącznej (False - wskaźnik informacyjny, tylko wartość)
+    """
+    if group not in ('trends', 'osc'):
+        raise ValueError(f"Nieznana grupa wskaźnika: {group}")
+    spec = {
+        'name': name,
+        'group': group,
+        'func': func,
+        'params': dict(params),
+        'columns': tuple(columns),
+        'warmup': warmup,
+        'extract': extract,
+        'series': series,
+        'fmt': fmt,
+        'active': active,
+        'vote': vote,
+        # wskaźniki przyjmujące `cache` współdzielą wartości pośrednie w ramach jednej analizy
+        'shared': 'cache' in inspect.signature(func).parameters,
+    }
+    spec['label'] = indicator_label(spec)
+    INDICATOR_REGISTRY[spec['label']] = spec
+    return spec
+
+
+def run_indicator(spec, df, cache=None):
+    """Wywołuje funkcję wskaźnika z parametrami z rejestru (i wspólnym cache, jeśli go obsługuje)."""
+    if spec['shared']:
+        return spec['func'](df, cache=cache, **spec['params'])
+    return spec['func'](df, **spec['params'])
+
+
+def indicator_label(spec):
+    """Etykieta wskaźnika w formacie 'RSI(14)' / 'MACD(12,26,9)'."""
+    return f"{spec['name']}({','.join(str(v) for v in spec['params'].values())})"
+
+
+def set_indicator_active(label, active=True):
+    """Włącza/wyłącza wskaźnik po etykiecie (np. 'CCI(14)')."""
+    INDICATOR_REGISTRY[label]['active'] = active
+
+
+def active_indicators():
+    return [spec for spec in INDICATOR_REGISTRY.values() if spec['active']]
+
+
+def indicator_warmup(spec):
+    return int(spec['warmup'](spec['params']))
+
+
+def required_history_bars(specs=None, extra_bars=0):
+    """Liczba świec dziennych potrzebna aktywnemu zestawowi wskaźników."""
+    specs = active_indicators() if specs is None else specs
+    bars = max((indicator_warmup(spec) for spec in specs), default=0)
+    return max(bars, extra_bars)
+
+
+def required_columns(specs=None):
+    specs = active_indicators() if specs is None else specs
+    columns = []
+    for spec in specs:
+        for col in spec['columns']:
+            if col not in columns:
+                columns.append(col)
+    return columns
+
+
+def required_history_start(bars=None, today=None):
+    """Data początkowa pobierania (dni kalendarzowe) dla podanej liczby świec."""
+    bars = required_history_bars() if bars is None else bars
+    today = today or datetime.now().date()
+    days = int(np.ceil(bars * CALENDAR_DAYS_PER_BAR)) + HOLIDAY_MARGIN_DAYS
+    return today - timedelta(days=days)
+
+
+def _ema_warmup(*spans):
+    return EMA_WARMUP_SPANS * sum(spans)
+
+
+def _wilder_warmup(*periods):
+    # wygładzanie Wildera (alpha = 1/n) odpowiada EMA o spanie 2n - 1
+    return _ema_warmup(*(2 * p - 1 for p in periods))
+
+
+def _latest(out):
+    return out[-2], (out[-1],)
+
+
+def _rounded(digits):
+    return lambda values: f"{round(values[0], digits)}"
+
+
+register_indicator('RSI', 'osc', calculate_rsi, {'period': 14}, ('Close',),
+                   lambda p: p['period'] + SIGNAL_LOOKBACK,
+                   _latest,
+                   lambda out: band_momentum_signals(out[0], 25, 75),
+                   fmt=_rounded(2))
+register_indicator('STS', 'osc', calculate_stochastic, {'k_period': 14, 'd_period': 3},
+                   ('High', 'Low', 'Close'),
+                   lambda p: p['k_period'] + p['d_period'] - 1 + SIGNAL_LOOKBACK,
+                   lambda out: (out[2], (out[3], out[4])),
+                   lambda out: band_momentum_signals(out[0], 20, 80),
+                   fmt=lambda v: f'K:{round(v[0], 2)}, D:{round(v[1], 2)}')
+register_indicator('MACD', 'trends', calculate_macd, {'fast': 12, 'slow': 26, 'signal_period': 9},
+                   ('Close',),
+                   lambda p: _ema_warmup(p['slow'], p['signal_period']),
+                   lambda out: (out[3], (out[4],)),
+                   lambda out: macd_signals(out[0], out[1], out[2]),
+                   fmt=_rounded(4))
+register_indicator('TRIX', 'trends', calculate_trix, {'period': 14, 'signal_period': 9}, ('Close',),
+                   lambda p: _ema_warmup(p['period'], p['period'], p['period'], p['signal_period']) + 1,
+                   _latest,
+                   lambda out: trix_signals(out[0], out[1]),
+                   fmt=_rounded(4))
+register_indicator('Williams %R', 'osc', calculate_williams_r, {'period': 10},
+                   ('High', 'Low', 'Close'),
+                   lambda p: p['period'] + SIGNAL_LOOKBACK - 1,
+                   _latest,
+                   lambda out: band_momentum_signals(out[0], -80, -20),
+                   fmt=_rounded(2))
+register_indicator('CCI', 'osc', calculate_cci, {'period': 14}, ('High', 'Low', 'Close'),
+                   lambda p: p['period'] + SIGNAL_LOOKBACK - 1,
+                   _latest,
+                   lambda out: band_momentum_signals(out[0], -200, 200),
+                   fmt=_rounded(2))
+register_indicator('ROC', 'trends', calculate_roc, {'period': 15}, ('Close',),
+                   lambda p: p['period'] + 1,
+                   _latest,
+                   lambda out: threshold_signals(out[0], 0, 0),
+                   fmt=_rounded(2))
+register_indicator('ULT', 'trends', calculate_ultimate_oscillator,
+                   {'period1': 7, 'period2': 14, 'period3': 28}, ('High', 'Low', 'Close'),
+                   lambda p: max(p['period1'], p['period2'], p['period3']) + SIGNAL_LOOKBACK,
+                   _latest,
+                   lambda out: band_momentum_signals(out[0], 30, 70),
+                   fmt=_rounded(2))
+register_indicator('FI', 'trends', calculate_force_index, {'period': 13}, ('Close', 'Volume'),
+                   lambda p: _ema_warmup(p['period']) + 1,
+                   _latest,
+                   lambda out: threshold_signals(out[0], 0, 0),
+                   fmt=_rounded(2))
+register_indicator('MFI', 'osc', calculate_mfi, {'period': 14},
+                   ('High', 'Low', 'Close', 'Volume'),
+                   lambda p: p['period'] + SIGNAL_LOOKBACK,
+                   _latest,
+                   lambda out: band_momentum_signals(out[0], 25, 75),
+                   fmt=_rounded(2))
+register_indicator('BOP', 'trends', calculate_bop, {'period': 14}, ('Open', 'High', 'Low', 'Close'),
+                   lambda p: p['period'],
+                   _latest,
+                   lambda out: threshold_signals(out[0], 0.1, -0.1),
+                   fmt=_rounded(4))
+register_indicator('EMV', 'trends', calculate_emv, {'period': 14}, ('High', 'Low', 'Volume'),
+                   lambda p: p['period'] + 1,
+                   _latest,
+                   lambda out: threshold_signals(out[0], 1, -1),
+                   fmt=_rounded(4))
+register_indicator('ATR', 'trends', calculate_atr, {'period': 14}, ('High', 'Low', 'Close'),
+                   lambda p: _wilder_warmup(p['period']) + 1,
+                   lambda out: ("neutralny", (out[1],)),
+                   fmt=_rounded(4),
+                   vote=False)
+register_indicator('ADX', 'trends', calculate_adx, {'period': 14},
+                   ('High', 'Low', 'Close'),
+                   lambda p: _wilder_warmup(p['period'], p['period']) + 1,
+                   _latest,
+                   lambda out: directional_signals(out[0], out[1], out[2], ADX_TREND_THRESHOLD),
+                   fmt=_rounded(2))
+register_indicator('BB%B', 'osc', calculate_bollinger, {'period': 20, 'width': 2}, ('Close',),
+                   lambda p: p['period'] + SIGNAL_LOOKBACK - 1,
+                   _latest,
+                   lambda out: band_momentum_signals(out[2], 0, 1),
+                   fmt=_rounded(4))
+register_indicator('OBV', 'trends', calculate_obv, {'signal_period': 20}, ('Close', 'Volume'),
+                   lambda p: _ema_warmup(p['signal_period']) + 1,
+                   _latest,
+                   lambda out: threshold_signals(out[1], 0, 0),
+                   fmt=_rounded(0))
+register_indicator('VWAP', 'trends', calculate_vwap, {'period': 20}, ('High', 'Low', 'Close', 'Volume'),
+                   lambda p: p['period'],
+                   _latest,
+                   lambda out: threshold_signals(out[1], 0, 0),
+                   fmt=_rounded(2))
+register_indicator('Ichimoku', 'trends', calculate_ichimoku, {'tenkan': 9, 'kijun': 26, 'senkou': 52},
+                   ('High', 'Low', 'Close'),
+                   lambda p: p['senkou'] + p['kijun'],
+                   lambda out: (out[-2], (out[0].iloc[-1], out[1].iloc[-1])),
+                   lambda out: agreement_signals(out[4], out[0] - out[1]),
+                   fmt=lambda v: f"T:{round(v[0], 2)}, K:{round(v[1], 2)}")
+register_indicator('SAR', 'trends', calculate_parabolic_sar, {'step': 0.02, 'max_step': 0.2},
+                   ('High', 'Low', 'Close'),
+                   lambda p: int(np.ceil(p['max_step'] / p['step'])) * 3,
+                   _latest,
+                   lambda out: threshold_signals(out[1], 0, 0),
+                   fmt=_rounded(2))
+
+
+@dataclass(slots=True)
+class IndicatorResult:
+    """Wynik jednego wskaźnika: surowe wartości i kod sygnału (1/0/-1, NO_DATA), bez zaokrągleń i tekstu."""
+    label: str
+    group: str
+    signal: int
+    values: tuple
+    vote: bool = True   # False - wskaźnik informacyjny, poza oceną łączną
+
+    def render(self):
+        """Linia szczegółów do wiadomości - formatowana dopiero przy wysyłce."""
+        spec = INDICATOR_REGISTRY.get(self.label)
+        if spec is not None and spec['fmt'] is not None:
+            value = spec['fmt'](self.values)
+        else:
+            value = ", ".join(str(v) for v in self.values)
+        label = RATING_LABELS.get(SIGNAL_NAMES.get(self.signal), '') if self.vote else ''
+        return f"{self.label:<18} {label:^2} {value}"
 
-        emv, emv_signal, emv_val = calculate_emv(df)
-        trends['EMV(14)'] = {'signal': emv_signal, 'value': round(emv_val, 4)}
 
-        return result_type
+@dataclass(slots=True)
+class ScoreResult:
+    """Ocena łączna (rate -2..2) z surowymi wynikami wskaźników (trendy przed oscylatorami)."""
+    rate: int
+    score: float
+    trends_rate: float
+    osc_rate: float
+    indicators: tuple
+
+    def details(self):
+        return [indicator.render() for indicator in self.indicators]
+
+
+def analyze_stock_df(df, specs=None):
+    """
+    Główna funkcja analizująca wszystkie aktywne wskaźniki z rejestru dla podanego DataFrame.
+
+    Returns:
+        tuple[IndicatorResult]: najpierw wskaźniki trendu, potem oscylatory; None przy błędzie
+    """
+    try:
+        trends = []
+        osc = []
+        results = {'trends': trends, 'osc': osc}
+
+        cache = {}
+        for spec in (active_indicators() if specs is None else specs):
+            output = run_indicator(spec, df, cache)
+            signal, values = spec['extract'](output)
+            results[spec['group']].append(IndicatorResult(
+                spec['label'], spec['group'], SIGNAL_CODES.get(signal, NEUTRAL),
+                tuple(float(v) for v in values), spec['vote']))
+
+        return tuple(trends + osc)
 
     except Exception as e:
         print(f"Błąd podczas analizy: {e}")
         return None
 
 
-def analyze_stock(ticker, period="1y"):
+def analyze_stock(ticker, period=None):
     """Funkcja analizująca wskaźniki dla danego tickera (dla kompatybilności wstecznej)"""
     try:
         data = download_with_retry(ticker, period=period)
@@ -479,49 +936,84 @@ def analyze_stock(ticker, period="1y"):
         return None
 
 
-def addcount(signal):
-    if signal == "kupuj":
-        return 1
-    elif signal == "sprzedaj":
-        return -1
-    else:
-        return 0
-
-
-def getScoreWithDetails(df):
-    results_all = analyze_stock_df(df)
-    oscCount = []
-    trendCount = []
-    details = []
-    table_data = []
-    for indtype, results in results_all.items():
-        for indicator, data in results.items():
-            signal = data['signal']
-            value = data['value']
-            label = RATING_LABELS.get(signal, '')
-            printer = f"{indicator:<18} {label:^2} {value}"
-            details.append(printer)
-
-            if indtype == 'osc':
-                oscCount.append(addcount(signal))
-            else:
-                trendCount.append(addcount(signal))
-        #print (details)
+def getScore(df):
+    """Ocena łączna jako ScoreResult - bez budowania tekstu."""
+    indicators = analyze_stock_df(df)
+    trendCount = [signal_vote(ind.signal) for ind in indicators if ind.group == 'trends' and ind.vote]
+    oscCount = [signal_vote(ind.signal) for ind in indicators if ind.group == 'osc' and ind.vote]
 
     trendsRate = sum(trendCount) / len(trendCount)
     oscCountRate = sum(oscCount) / len(oscCount)
-    score = 0.7 * trendsRate + 0.3 * oscCountRate
+    score = TREND_WEIGHT * trendsRate + OSC_WEIGHT * oscCountRate
 
-    if score >= 1.5:
+    if score >= STRONG_CUTOFF:
         rate = 2 #"Mocne kupuj"
-    elif score >= 0.5:
+    elif score >= WEAK_CUTOFF:
         rate = 1 #"Kupuj"
-    elif score > -0.5:
+    elif score > -WEAK_CUTOFF:
         rate = 0 #"Trzymaj"
-    elif score > -1.5:
+    elif score > -STRONG_CUTOFF:
         rate = -1 #"Sprzedaj"
     else:
         rate = -2 #"Mocne sprzedaj"
-    return rate, details
+    return ScoreResult(rate, score, trendsRate, oscCountRate, indicators)
 
 
+def getScoreWithDetails(df):
+    """Ocena i linie szczegółów (dla kompatybilności wstecznej - renderuje tekst od razu)."""
+    result = getScore(df)
+    return result.rate, result.details()
+
+
+def indicator_params_key(specs=None):
+    """Hashowalny opis aktywnego zestawu wskaźników (etykiety, grupy i parametry) - do kluczy cache."""
+    specs = active_indicators() if specs is None else specs
+    return tuple((spec['label'], spec['group'], tuple(spec['params'].items())) for spec in specs)
+
+
+def indicator_signal_series(df, specs=None):
+    """
+    Kody sygnałów (1/0/-1) dla każdej świecy i każdego aktywnego wskaźnika.
+
+    Returns:
+        dict: {'trends': {etykieta: np.ndarray}, 'osc': {etykieta: np.ndarray}}
+    """
+    result_type = {'trends': {}, 'osc': {}}
+    cache = {}
+    for spec in (active_indicators() if specs is None else specs):
+        if spec['series'] is None:
+            continue
+        output = run_indicator(spec, df, cache)
+        result_type[spec['group']][spec['label']] = spec['series'](output)
+    return result_type
+
+
+def group_rate_series(df, specs=None):
+    """Średni kod sygnału grupy trendów i oscylatorów dla każdej świecy (trendsRate / oscCountRate)."""
+    series = indicator_signal_series(df, specs)
+    trends_rate = np.vstack(list(series['trends'].values())).sum(axis=0) / len(series['trends'])
+    osc_rate = np.vstack(list(series['osc'].values())).sum(axis=0) / len(series['osc'])
+    return trends_rate, osc_rate
+
+
+def signal_history(df, specs=None, ma_periods=DEFAULT_PERIODS):
+    """
+    Co bot powiedziałby na każdej świecy historii - jednym wektorowym przebiegiem.
+
+    Każda świeca jest oceniana dokładnie regułami getScore (z uśrednianiem 4 poprzednich wartości)
+    i calculate_moving_averages_signals, więc wiersz i równa się wynikowi dla df.iloc[:i + 1].
+
+    Returns:
+        pd.DataFrame: kolumny trends_rate, osc_rate, score, rate (-2..2), ma_score, ma_rate (-2..2)
+    """
+    trends_rate, osc_rate = group_rate_series(df, specs)
+    score = TREND_WEIGHT * trends_rate + OSC_WEIGHT * osc_rate
+    moving = moving_average_rate_series(df, ma_periods)
+    return pd.DataFrame({
+        'trends_rate': trends_rate,
+        'osc_rate': osc_rate,
+        'score': score,
+        'rate': score_to_rate(score, STRONG_CUTOFF, WEAK_CUTOFF),
+        'ma_score': moving['score'],
+        'ma_rate': moving['overall'],
+    }, index=df.index)
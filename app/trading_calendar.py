@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Kalendarz sesji giełd (GPW/NewConnect, NYSE, NASDAQ): święta, sesje skrócone i zmiana czasu.
+
+Kalendarz jest wyliczany z reguł świąt (Wielkanoc, "n-ty poniedziałek miesiąca", przesunięcia
+świąt wypadających w weekend) i zapisywany w pliku danych dołączonym do aplikacji
+(trading_calendar.json), który bot tylko wczytuje. Przy wczytaniu każda sesja zamieniana jest
+na parę znaczników czasu (otwarcie, zamknięcie) w tablicy indeksowanej numerem dnia, więc
+"czy sesja trwa w chwili t" i "najbliższe otwarcie po t" to kilka odczytów z tablic - bez
+przeliczania stref czasowych. Godziny sesji zapisane są w czasie lokalnym giełdy, a znaczniki
+czasu liczone ze strefą, więc zmiana czasu (DST) jest uwzględniona.
+
+Odświeżenie pliku (np. na kolejne lata):
+    python app/trading_calendar.py --years 2025-2030
+"""
+import argparse
+import json
+import os
+from datetime import date, datetime, time as dt_time, timedelta
+
+import numpy as np
+import pytz
+
+CALENDAR_PATH = os.getenv("TRADING_CALENDAR_PATH",
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), "trading_calendar.json"))
+SECONDS_PER_DAY = 86400
+
+# Regularne godziny sesji (czas lokalny giełdy)
+EXCHANGE_SPECS = {
+    "GPW": {"timezone": "Europe/Warsaw", "open": "09:00", "close": "17:00"},
+    "NEWCONNECT": {"timezone": "Europe/Warsaw", "open": "09:00", "close": "17:00"},
+    "NYSE": {"timezone": "US/Eastern", "open": "09:30", "close": "16:00"},
+    "NASDAQ": {"timezone": "US/Eastern", "open": "09:30", "close": "16:00"},
+}
+# Zamknięcie sesji skróconych w USA
+US_EARLY_CLOSE = "13:00"
+# Nadzwyczajne zamknięcia giełd amerykańskich (żałoba narodowa itp.)
+US_SPECIAL_CLOSURES = ["2025-01-09"]
+
+
+# ----------------------
+# REGUŁY ŚWIĄT (generowanie pliku)
+# ----------------------
+
+def easter_sunday(year):
+    """Niedziela Wielkanocna (algorytm Meeusa/Jonesa/Butchera, kalendarz gregoriański)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def nth_weekday(year, month, weekday, n):
+    """n-ty (od 1) dzień tygodnia w miesiącu; n = -1 - ostatni."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = (date(year, month % 12 + 1, 1) if month < 12 else date(year + 1, 1, 1)) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def us_observed(day):
+    """Święto USA w sobotę obchodzone w piątek, w niedzielę - w poniedziałek."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def gpw_holidays(year):
+    """Dni bez sesji na GPW (dni ustawowo wolne, Wigilia i sylwester)."""
+    easter = easter_sunday(year)
+    days = [
+        date(year, 1, 1), date(year, 1, 6),
+        easter - timedelta(days=2), easter + timedelta(days=1),   # Wielki Piątek, Poniedziałek Wielkanocny
+        date(year, 5, 1), date(year, 5, 3),
+        easter + timedelta(days=60),                               # Boże Ciało
+        date(year, 8, 15), date(year, 11, 1), date(year, 11, 11),
+        date(year, 12, 24), date(year, 12, 25), date(year, 12, 26), date(year, 12, 31),
+    ]
+    return sorted(d for d in set(days) if d.weekday() < 5)
+
+
+def us_holidays(year):
+    """Dni bez sesji na NYSE/NASDAQ."""
+    days = [
+        nth_weekday(year, 1, 0, 3),                    # Martin Luther King Jr. Day
+        nth_weekday(year, 2, 0, 3),                    # Presidents' Day
+        easter_sunday(year) - timedelta(days=2),       # Good Friday
+        nth_weekday(year, 5, 0, -1),                   # Memorial Day
+        us_observed(date(year, 7, 4)),                 # Independence Day
+        nth_weekday(year, 9, 0, 1),                    # Labor Day
+        nth_weekday(year, 11, 3, 4),                   # Thanksgiving
+        us_observed(date(year, 12, 25)),               # Christmas
+    ]
+    # Nowy Rok w sobotę nie jest obchodzony w piątek (koniec roku rozliczeniowego)
+    if date(year, 1, 1).weekday() != 5:
+        days.append(us_observed(date(year, 1, 1)))
+    if year >= 2022:
+        days.append(us_observed(date(year, 6, 19)))    # Juneteenth
+    days += [date.fromisoformat(d) for d in US_SPECIAL_CLOSURES if d.startswith(str(year))]
+    return sorted(d for d in set(days) if d.year == year and d.weekday() < 5)
+
+
+def us_early_closes(year):
+    """Sesje skrócone w USA: dzień przed Świętem Niepodległości, po Święcie Dziękczynienia i Wigilia."""
+    holidays = set(us_holidays(year))
+    days = [nth_weekday(year, 11, 3, 4) + timedelta(days=1)]
+    july3 = date(year, 7, 3)
+    if date(year, 7, 4).weekday() in (1, 2, 3, 4):
+        days.append(july3)
+    days.append(date(year, 12, 24))
+    return sorted(d for d in days if d.weekday() < 5 and d not in holidays)
+
+
+def build_calendar_data(first_year, last_year):
+    """Zawartość pliku kalendarza dla lat [first_year, last_year]."""
+    years = range(first_year, last_year + 1)
+    exchanges = {}
+    for exchange, spec in EXCHANGE_SPECS.items():
+        if spec["timezone"] == "Europe/Warsaw":
+            holidays = [d for y in years for d in gpw_holidays(y)]
+            early = {}
+        else:
+            holidays = [d for y in years for d in us_holidays(y)]
+            early = {d.isoformat(): US_EARLY_CLOSE for y in years for d in us_early_closes(y)}
+        exchanges[exchange] = dict(spec, holidays=[d.isoformat() for d in holidays], early_closes=early)
+    return {
+        "first_day": date(first_year, 1, 1).isoformat(),
+        "last_day": date(last_year, 12, 31).isoformat(),
+        "exchanges": exchanges,
+    }
+
+
+# ----------------------
+# KALENDARZ (odczyt)
+# ----------------------
+
+class TradingCalendar:
+    """Sesje jednej giełdy jako tablice znaczników czasu (NaN - dzień bez sesji)."""
+
+    def __init__(self, exchange, timezone, first_day, opens, closes):
+        """
+        Args:
+            first_day: data odpowiadająca pozycji 0 tablic
+            opens, closes: znaczniki czasu (sekundy epoki) otwarcia/zamknięcia dla kolejnych dni
+        """
+        self.exchange = exchange
+        self.tz = pytz.timezone(timezone)
+        self.first_day = first_day
+        self.opens = np.asarray(opens, dtype=float)
+        self.closes = np.asarray(closes, dtype=float)
+        # początek pierwszego dnia (UTC) - numer dnia dla znacznika t to (t - origin) // doba
+        self.origin = datetime(first_day.year, first_day.month, first_day.day, tzinfo=pytz.utc).timestamp()
+        # next_day[k] = pierwszy dzień z sesją >= k (len = brak)
+        has_session = ~np.isnan(self.opens)
+        idx = np.where(has_session, np.arange(len(self.opens)), len(self.opens))
+        self.next_day = np.append(np.minimum.accumulate(idx[::-1])[::-1], len(self.opens))
+
+    @classmethod
+    def from_spec(cls, exchange, spec, first_day, last_day):
+        tz = pytz.timezone(spec["timezone"])
+        open_time = dt_time.fromisoformat(spec["open"])
+        close_time = dt_time.fromisoformat(spec["close"])
+        holidays = set(spec.get("holidays", []))
+        early = spec.get("early_closes", {})
+        n = (last_day - first_day).days + 1
+        opens = np.full(n, np.nan)
+        closes = np.full(n, np.nan)
+        for k in range(n):
+            day = first_day + timedelta(days=k)
+            if day.weekday() >= 5 or day.isoformat() in holidays:
+                continue
+            close = dt_time.fromisoformat(early[day.isoformat()]) if day.isoformat() in early else close_time
+            opens[k] = tz.localize(datetime.combine(day, open_time)).timestamp()
+            closes[k] = tz.localize(datetime.combine(day, close)).timestamp()
+        return cls(exchange, spec["timezone"], first_day, opens, closes)
+
+    @property
+    def last_day(self):
+        return self.first_day + timedelta(days=len(self.opens) - 1)
+
+    def covers(self, t):
+        """Czy znacznik czasu mieści się w zakresie kalendarza."""
+        k = self._day_index(t)
+        return 1 <= k < len(self.opens) - 1
+
+    def _day_index(self, t):
+        return int((t - self.origin) // SECONDS_PER_DAY)
+
+    def _timestamp(self, t):
+        if t is None:
+            return datetime.now(pytz.utc).timestamp()
+        return t.timestamp() if isinstance(t, datetime) else float(t)
+
+    def _datetime(self, ts):
+        return datetime.fromtimestamp(ts, self.tz)
+
+    def session(self, day):
+        """(otwarcie, zamknięcie) sesji w dniu `day` jako datetime ze strefą giełdy; None gdy brak sesji."""
+        k = (day - self.first_day).days
+        if not 0 <= k < len(self.opens):
+            raise ValueError(f"Data {day} poza kalendarzem {self.exchange} ({self.first_day} - {self.last_day})")
+        if np.isnan(self.opens[k]):
+            return None
+        return self._datetime(self.opens[k]), self._datetime(self.closes[k])
+
+    def is_trading_day(self, day):
+        return self.session(day) is not None
+
+    def is_open(self, t=None):
+        """Czy sesja trwa w chwili t (datetime, sekundy epoki albo teraz)."""
+        ts = self._timestamp(t)
+        k = self._day_index(ts)
+        # sesja dnia lokalnego mieści się w dobie UTC tego dnia albo sąsiedniej
+        for j in (k - 1, k, k + 1):
+            if 0 <= j < len(self.opens) and self.opens[j] <= ts <= self.closes[j]:
+                return True
+        return False
+
+    def next_session(self, t=None):
+        """Bieżąca albo najbliższa sesja (otwarcie, zamknięcie) - pierwsza z zamknięciem po t."""
+        ts = self._timestamp(t)
+        j = self.next_day[max(self._day_index(ts) - 1, 0)]
+        while j < len(self.opens) and self.closes[j] <= ts:
+            j = self.next_day[j + 1]
+        if j >= len(self.opens):
+            raise ValueError(f"Brak sesji {self.exchange} po {self._datetime(ts)} w kalendarzu (do {self.last_day})")
+        return self._datetime(self.opens[j]), self._datetime(self.closes[j])
+
+    def next_open(self, t=None):
+        """Najbliższe otwarcie po chwili t (jeśli sesja trwa - otwarcie następnej)."""
+        ts = self._timestamp(t)
+        open_at, close_at = self.next_session(ts)
+        if open_at.timestamp() > ts:
+            return open_at
+        return self.next_session(close_at.timestamp())[0]
+
+
+def load_calendars(path=CALENDAR_PATH):
+    """Kalendarze wszystkich giełd z pliku danych: {giełda: TradingCalendar}."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    first_day = date.fromisoformat(data["first_day"])
+    last_day = date.fromisoformat(data["last_day"])
+    return {exchange: TradingCalendar.from_spec(exchange, spec, first_day, last_day)
+            for exchange, spec in data["exchanges"].items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generuje plik kalendarza sesji giełd")
+    parser.add_argument("--years", default=f"{date.today().year - 1}-{date.today().year + 4}",
+                        help="zakres lat, np. 2025-2030")
+    parser.add_argument("--out", default=CALENDAR_PATH, help="plik wynikowy (JSON)")
+    args = parser.parse_args()
+
+    first_year, last_year = (int(y) for y in args.years.split("-"))
+    data = build_calendar_data(first_year, last_year)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+        f.write("\n")
+    for exchange, spec in data["exchanges"].items():
+        print(f"{exchange}: {len(spec['holidays'])} świąt, {len(spec['early_closes'])} sesji skróconych")
+    print(f"Zapisano {args.out} ({data['first_day']} - {data['last_day']})")
+
+
+if __name__ == "__main__":
+    main()
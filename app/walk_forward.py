@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Walk-forward dopasowanie wag i progów oceny łącznej.
+
+Dopasowywane parametry:
+- ticker_analizer: score = TREND_WEIGHT * trendsRate + OSC_WEIGHT * oscCountRate i progi
+  WEAK_CUTOFF / STRONG_CUTOFF (domyślnie 0.7 / 0.3, ±0.5 / ±1.5),
+- moving_analizer: ułamki MA_WEAK_FRACTION / MA_STRONG_FRACTION w sum_to_signal (0.25 / 0.75).
+
+Historia dzieli się na kolejne okna: parametry wybierane są na oknie treningowym (wszystkie
+tickery naraz), a oceniane na następnym oknie testowym (poza próbą); okno przesuwa się o długość
+okna testowego. Z końca okna treningowego usuwane jest `horizon` świec, żeby przyszłe stopy
+zwrotu nie zaglądały w okno testowe.
+
+Miara: średnia stopa zwrotu pozycji rate / 2 (mocne kupuj = 1, kupuj = 0.5, ..., mocne sprzedaj = -1)
+po `horizon` świecach, na świecę z danymi.
+
+Dane cenowe i przeliczone per świeca oceny (trendy, oscylatory, krzywe kroczące, stopy zwrotu)
+trzymane są w pamięci współdzielonej; procesy puli podłączają je raz (bez kopiowania), a zadania
+przekazują tylko zakres świec i siatkę parametrów.
+
+Użycie:
+    python app/walk_forward.py CDR.WA PKN.WA AAPL --period 10y --train 504 --test 126 --workers 4
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import moving_analizer
+import ticker_analizer
+from moving_analizer import moving_average_rate_series, DEFAULT_PERIODS
+from ohlcv_panel import OHLCVPanel, share_array, attach_array
+from parameter_sweep import forward_returns, env_tickers, DEFAULT_HORIZON
+from signal_rules import score_to_rate, sum_to_rate
+from ticker_analizer import download_with_retry, group_rate_series, required_history_bars
+
+TRAIN_BARS = 504
+TEST_BARS = 126
+
+DEFAULT_GRID = {
+    'score': {
+        'trend_weight': [round(w, 2) for w in np.linspace(0, 1, 11)],
+        'weak_cutoff': [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8],
+        'strong_cutoff': [0.8, 1.0, 1.2, 1.4, 1.5, 1.6, 1.8],
+    },
+    'moving': {
+        'weak_fraction': [0.1, 0.2, 0.25, 0.3, 0.4, 0.5],
+        'strong_fraction': [0.5, 0.6, 0.7, 0.75, 0.8, 0.9, 1.0],
+    },
+}
+
+# Cechy per świeca w tablicy (tickery, cechy, świece)
+TRENDS, OSC, MOVING, FWD = range(4)
+N_FEATURES = 4
+
+# Stan procesu puli (podłączony raz w _init_worker)
+_PANEL = None
+_FEATURES = None
+_SEGMENTS = []
+
+
+def _init_worker(panel_spec, features_spec):
+    global _PANEL, _FEATURES
+    _PANEL = OHLCVPanel.attach(panel_spec)
+    shm, _FEATURES = attach_array(features_spec)
+    _SEGMENTS.append(shm)
+
+
+# ----------------------
+# CECHY PER ŚWIECA
+# ----------------------
+
+def _compute_features(job):
+    """Oceny trendów, oscylatorów i krzywych kroczących dla każdej świecy jednego tickera."""
+    row, horizon, ma_periods = job
+    symbol = _PANEL.symbols[row]
+    close = _PANEL.column(symbol, 'Close')
+    positions = np.flatnonzero(~np.isnan(close))
+    warmup = max(required_history_bars(), moving_analizer.required_history_bars(ma_periods))
+    if len(positions) <= warmup + horizon:
+        return symbol, False
+
+    try:
+        df = _PANEL.frame(symbol).iloc[positions].astype(float)
+        trends_rate, osc_rate = group_rate_series(df)
+        moving = moving_average_rate_series(df, ma_periods)['score']
+        fwd = forward_returns(df['Close'], horizon)
+    except Exception as e:
+        print(f"⚠️ {symbol}: błąd liczenia ocen: {e}")
+        return symbol, False
+
+    features = np.vstack([trends_rate, osc_rate, moving, fwd])
+    # świece rozgrzewki wskaźników nie są oceniane
+    features[:, :warmup] = np.nan
+    _FEATURES[row][:, positions] = features
+    return symbol, True
+
+
+# ----------------------
+# OCENA SIATKI
+# ----------------------
+
+def position_stats(rate, fwd, valid):
+    """
+    Statystyki pozycji rate / 2 dla wszystkich kombinacji naraz (dwie ostatnie osie: tickery, świece).
+
+    Returns:
+        np.ndarray (..., 4): [suma stóp zwrotu, liczba sygnałów, trafione sygnały, świece z danymi]
+    """
+    position = np.where(valid, rate / 2, 0.0)
+    pnl = position * np.where(valid, fwd, 0.0)
+    axes = (-2, -1)
+    return np.stack([pnl.sum(axis=axes), (position != 0).sum(axis=axes), (pnl > 0).sum(axis=axes),
+                     np.broadcast_to(valid, pnl.shape).sum(axis=axes)], axis=-1)
+
+
+def _evaluate(job):
+    """
+    Pracownik puli: jedna siatka progów na zakresie świec [start, stop).
+
+    Returns:
+        np.ndarray (progi słabe, progi mocne, 4) - statystyki position_stats
+    """
+    kind, start, stop, params = job
+    block = _FEATURES[:, :, start:stop]
+    fwd = block[:, FWD]
+    if kind == 'score':
+        trend_weight, osc_weight, weak, strong = params
+        values = trend_weight * block[:, TRENDS] + osc_weight * block[:, OSC]
+        rate = score_to_rate(values, strong=np.asarray(strong)[None, :, None, None],
+                             weak=np.asarray(weak)[:, None, None, None])
+    else:
+        max_signals, weak, strong = params
+        values = block[:, MOVING]
+        rate = sum_to_rate(values, max_signals, strong=np.asarray(strong)[None, :, None, None],
+                           weak=np.asarray(weak)[:, None, None, None])
+    valid = np.isfinite(values) & np.isfinite(fwd)
+    return position_stats(rate, fwd, valid)
+
+
+def objective(stats):
+    """Średnia stopa zwrotu pozycji na świecę z danymi."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(stats[..., 3] > 0, stats[..., 0] / stats[..., 3], np.nan)
+
+
+def hit_rate(stats):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(stats[..., 1] > 0, stats[..., 2] / stats[..., 1], np.nan)
+
+
+def folds(n_bars, train, test, horizon):
+    """Zakresy (trening [a, b), test [b', c)) z odciętym końcem treningu (horizon świec)."""
+    out = []
+    start = 0
+    while start + train + test <= n_bars:
+        out.append(((start, start + train - horizon), (start + train, start + train + test)))
+        start += test
+    return out
+
+
+def _score_jobs(grid, start, stop):
+    weak, strong = grid['weak_cutoff'], grid['strong_cutoff']
+    return [('score', start, stop, (w, 1 - w, weak, strong)) for w in grid['trend_weight']]
+
+
+def _moving_jobs(grid, start, stop, max_signals):
+    return [('moving', start, stop, (max_signals, grid['weak_fraction'], grid['strong_fraction']))]
+
+
+def _best(kind, grid, stats):
+    """Najlepsza kombinacja (słaby próg < mocny) -> (parametry, wynik treningu)."""
+    if kind == 'score':
+        weak = np.asarray(grid['weak_cutoff'])[None, :, None]
+        strong = np.asarray(grid['strong_cutoff'])[None, None, :]
+    else:
+        weak = np.asarray(grid['weak_fraction'])[:, None]
+        strong = np.asarray(grid['strong_fraction'])[None, :]
+    scores = np.where(weak < strong, objective(stats), np.nan)
+    if np.isnan(scores).all():
+        return None, np.nan
+    idx = np.unravel_index(np.nanargmax(scores), scores.shape)
+    if kind == 'score':
+        w, k, s = idx
+        params = {'trend_weight': grid['trend_weight'][w], 'osc_weight': round(1 - grid['trend_weight'][w], 4),
+                  'weak_cutoff': grid['weak_cutoff'][k], 'strong_cutoff': grid['strong_cutoff'][s]}
+    else:
+        k, s = idx
+        params = {'weak_fraction': grid['weak_fraction'][k], 'strong_fraction': grid['strong_fraction'][s]}
+    return params, float(scores[idx])
+
+
+def _params_job(kind, params, start, stop, max_signals):
+    if kind == 'score':
+        return ('score', start, stop, (params['trend_weight'], params['osc_weight'],
+                                       [params['weak_cutoff']], [params['strong_cutoff']]))
+    return ('moving', start, stop, (max_signals, [params['weak_fraction']], [params['strong_fraction']]))
+
+
+def current_params():
+    return {
+        'score': {'trend_weight': ticker_analizer.TREND_WEIGHT, 'osc_weight': ticker_analizer.OSC_WEIGHT,
+                  'weak_cutoff': ticker_analizer.WEAK_CUTOFF, 'strong_cutoff': ticker_analizer.STRONG_CUTOFF},
+        'moving': {'weak_fraction': moving_analizer.MA_WEAK_FRACTION,
+                   'strong_fraction': moving_analizer.MA_STRONG_FRACTION},
+    }
+
+
+def run_walk_forward(panel, grid=DEFAULT_GRID, train=TRAIN_BARS, test=TEST_BARS, horizon=DEFAULT_HORIZON,
+                     ma_periods=DEFAULT_PERIODS, workers=None):
+    """
+    Args:
+        panel: OHLCVPanel z historią dzienną wszystkich tickerów
+        grid: siatki parametrów {'score': ..., 'moving': ...} (podzbiór DEFAULT_GRID)
+
+    Returns:
+        pd.DataFrame: wiersz na (okno, rodzaj) z parametrami i wynikami w próbie i poza nią
+    """
+    max_signals = 2 * len(ma_periods)
+    baseline = current_params()
+    panel_shm, panel_spec = panel.to_shared_memory()
+    features = np.full((len(panel.symbols), N_FEATURES, len(panel.index)), np.nan)
+    features_shm, features_spec = share_array(features)
+    del features
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(panel_spec, features_spec)) as executor:
+            jobs = [(row, horizon, ma_periods) for row in range(len(panel.symbols))]
+            done = [symbol for symbol, ok in executor.map(_compute_features, jobs) if ok]
+            print(f"📈 Oceny per świeca dla {len(done)}/{len(panel.symbols)} tickerów")
+
+            rows = []
+            for fold, ((train_start, train_stop), (test_start, test_stop)) in enumerate(
+                    folds(len(panel.index), train, test, horizon)):
+                for kind, kind_grid in grid.items():
+                    if kind == 'score':
+                        stats = np.stack(list(executor.map(_evaluate, _score_jobs(kind_grid, train_start, train_stop))))
+                    else:
+                        stats = executor.map(_evaluate, _moving_jobs(kind_grid, train_start, train_stop, max_signals))
+                        stats = next(iter(stats))
+                    params, train_score = _best(kind, kind_grid, stats)
+                    if params is None:
+                        continue
+                    fitted, current = executor.map(_evaluate, [
+                        _params_job(kind, params, test_start, test_stop, max_signals),
+                        _params_job(kind, baseline[kind], test_start, test_stop, max_signals)])
+                    rows.append({
+                        'fold': fold,
+                        'kind': kind,
+                        'train_start': panel.index[train_start],
+                        'test_start': panel.index[test_start],
+                        'test_end': panel.index[test_stop - 1],
+                        'params': params,
+                        'train_return': train_score,
+                        'test_return': float(objective(fitted).ravel()[0]),
+                        'test_hit_rate': float(hit_rate(fitted).ravel()[0]),
+                        'test_signals': int(fitted[..., 1].sum()),
+                        'baseline_return': float(objective(current).ravel()[0]),
+                        'baseline_hit_rate': float(hit_rate(current).ravel()[0]),
+                    })
+    finally:
+        for shm in (panel_shm, features_shm):
+            shm.close()
+            shm.unlink()
+    return pd.DataFrame(rows)
+
+
+def env_lines(kind, params):
+    if kind == 'score':
+        return [f"SCORE_TREND_WEIGHT={params['trend_weight']}", f"SCORE_OSC_WEIGHT={params['osc_weight']}",
+                f"SCORE_WEAK_CUTOFF={params['weak_cutoff']}", f"SCORE_STRONG_CUTOFF={params['strong_cutoff']}"]
+    return [f"MA_WEAK_FRACTION={params['weak_fraction']}", f"MA_STRONG_FRACTION={params['strong_fraction']}"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward dopasowanie wag i progów oceny łącznej")
+    parser.add_argument("tickers", nargs="*", help="tickery (domyślnie z TICKERS_* w ENV)")
+    parser.add_argument("--period", default="10y")
+    parser.add_argument("--train", type=int, default=TRAIN_BARS, help="świece w oknie treningowym")
+    parser.add_argument("--test", type=int, default=TEST_BARS, help="świece w oknie testowym")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON)
+    parser.add_argument("--kinds", default=",".join(DEFAULT_GRID), help="np. score,moving")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default=None, help="plik CSV z wynikami okien")
+    args = parser.parse_args()
+
+    tickers = args.tickers or env_tickers()
+    if not tickers:
+        raise SystemExit("Podaj tickery lub ustaw TICKERS_* w ENV.")
+    grid = {kind: DEFAULT_GRID[kind] for kind in args.kinds.split(",")}
+
+    start = time.time()
+    panel = OHLCVPanel.from_yfinance(download_with_retry(tickers, period=args.period), tickers)
+    print(f"📥 Pobrano {len(panel.symbols)}/{len(tickers)} tickerów, {len(panel)} świec "
+          f"({panel.nbytes / 1e6:.1f} MB) w {time.time() - start:.1f}s")
+
+    start = time.time()
+    report = run_walk_forward(panel, grid, args.train, args.test, args.horizon, workers=args.workers)
+    print(f"⚙️ Walk-forward w {time.time() - start:.1f}s")
+    if report.empty:
+        raise SystemExit("Za mało historii na choć jedno okno (zmniejsz --train / --test).")
+
+    for kind, rows in report.groupby('kind', sort=False):
+        print(f"\n=== {kind} ===")
+        for _, row in rows.iterrows():
+            print(f"  {row['test_start']:%Y-%m-%d}..{row['test_end']:%Y-%m-%d}  {row['params']}  "
+                  f"test {row['test_return']:+.4%} (trafność {row['test_hit_rate']:.2%})  "
+                  f"obecne {row['baseline_return']:+.4%} (trafność {row['baseline_hit_rate']:.2%})")
+        print(f"  Średnio poza próbą: dopasowane {rows['test_return'].mean():+.4%}, "
+              f"obecne {rows['baseline_return'].mean():+.4%}")
+        latest = rows.iloc[-1]['params']
+        print("  Parametry z ostatniego okna (ENV):")
+        for line in env_lines(kind, latest):
+            print(f"    {line}")
+
+    if args.out:
+        report.to_csv(args.out, index=False)
+        print(f"\n💾 Zapisano raport: {args.out}")
+
+
+if __name__ == "__main__":
+    main()